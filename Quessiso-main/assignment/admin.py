@@ -1,3 +1,28 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
-# Register your models here.
+from .models import Assignment, RegradeRun
+
+
+@admin.register(Assignment)
+class AssignmentAdmin(admin.ModelAdmin):
+    list_display = ('title', 'course', 'created_by', 'due_date', 'marks')
+    search_fields = ('title', 'course')
+    actions = ['regrade_submissions']
+
+    @admin.action(description="Re-grade all submissions")
+    def regrade_submissions(self, request, queryset):
+        # Queued for the regrade_assignments command, which grades them in a process pool
+        runs = RegradeRun.objects.bulk_create([
+            RegradeRun(assignment=assignment, requested_by=request.user) for assignment in queryset
+        ])
+        self.message_user(
+            request,
+            f"Queued a re-grade of {len(runs)} assignments; run manage.py regrade_assignments --queued to process them.",
+            messages.SUCCESS,
+        )
+
+
+@admin.register(RegradeRun)
+class RegradeRunAdmin(admin.ModelAdmin):
+    list_display = ('assignment', 'requested_by', 'requested_at', 'started_at', 'finished_at', 'done', 'total', 'changed')
+    readonly_fields = [field.name for field in RegradeRun._meta.fields]
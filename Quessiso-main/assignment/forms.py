@@ -8,7 +8,7 @@ import os  # For file extension handling
 class AssignmentForm(forms.ModelForm):
     class Meta:
         model = Assignment
-        fields = ['title', 'description', 'due_date', 'required_keywords','course','marks']  # Removed 'file'
+        fields = ['title', 'description', 'due_date', 'required_keywords','stem_keywords','course','marks','rubric']  # Removed 'file'
         widgets = {
             'due_date': forms.DateTimeInput(attrs={'type': 'datetime-local', 'class': 'form-control'}),
             'required_keywords': forms.TextInput(attrs={
@@ -19,6 +19,7 @@ class AssignmentForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
             'course': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Enter Course Name'}),
             'marks': forms.NumberInput(attrs={'class': 'form-control'}),
+            'rubric': forms.Textarea(attrs={'class': 'form-control', 'rows': 6, 'placeholder': '{"criteria": [...]}'}),
         }
 
 class SubmissionForm(forms.ModelForm):
@@ -0,0 +1,131 @@
+"""
+Matching of an assignment's required keywords against submission text.
+
+Keywords and text are compared as sequences of lower-cased words, so a keyword
+only matches whole words ("intro" does not match "introduction") and a keyword
+of several words matches them as a phrase. All keywords are found in a single
+pass over the text with an Aho-Corasick automaton over words.
+"""
+import re
+from collections import deque
+from functools import lru_cache
+
+WORD_RE = re.compile(r"\w+")
+
+# Suffixes stripped by stem(), longest first
+STEM_SUFFIXES = (
+    'ational', 'ization', 'fulness', 'ousness', 'iveness', 'ations', 'ation',
+    'ments', 'ment', 'ness', 'ing', 'ies', 'ied', 'ed', 'es', 'ly', 's',
+)
+STEM_MIN_LENGTH = 3
+
+
+def stem(word):
+    """
+    Strips a common English suffix, so that the inflections of a word compare
+    equal: "connects", "connected" and "connecting" all stem to "connect", and
+    "studies" and "studied" to "study". Deliberately light; stems only need to
+    agree, and derived words such as "conclusion" and "concluding" do not.
+    """
+    for suffix in STEM_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= STEM_MIN_LENGTH:
+            return word[:-len(suffix)] + ('y' if suffix in ('ies', 'ied') else '')
+    return word
+
+
+def iter_words(text, stemmed=False):
+    for match in WORD_RE.finditer(text.lower()):
+        yield stem(match.group()) if stemmed else match.group()
+
+
+class KeywordMatcher:
+    """
+    An Aho-Corasick automaton whose alphabet is words: each keyword is a path
+    of words through a trie, with failure links so that the text is read once.
+    """
+
+    __slots__ = ('keywords', 'stemmed', '_goto', '_fail', '_output')
+
+    def __init__(self, keywords, stemmed=False):
+        self.keywords = list(keywords)
+        self.stemmed = stemmed
+        self._goto = [{}]
+        self._output = [[]]
+        for index, keyword in enumerate(self.keywords):
+            state = 0
+            words = list(iter_words(keyword, stemmed))
+            if not words:
+                continue
+            for word in words:
+                if word not in self._goto[state]:
+                    self._goto.append({})
+                    self._output.append([])
+                    self._goto[state][word] = len(self._goto) - 1
+                state = self._goto[state][word]
+            self._output[state].append(index)
+
+        # Failure links, breadth first: the longest proper suffix of a state's path that is also in the trie
+        # Failure links of the root's children point at the root
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(word, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def scanner(self):
+        """Returns a KeywordScanner, to match text fed to it piece by piece."""
+        return KeywordScanner(self)
+
+    def count(self, text):
+        """Returns the number of occurrences of each keyword in `text`, in keyword order."""
+        return self.scanner().feed(text).counts
+
+    def missing(self, text):
+        """Returns the keywords that do not occur in `text`."""
+        return self.scanner().feed(text).missing()
+
+
+class KeywordScanner:
+    """
+    The running state of a KeywordMatcher over text that arrives in pieces,
+    such as the lines of a document. Phrases may span pieces.
+    """
+
+    __slots__ = ('matcher', 'state', 'counts')
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self.state = 0
+        self.counts = [0] * len(matcher.keywords)
+
+    def feed(self, text):
+        matcher = self.matcher
+        goto, fail, output, counts = matcher._goto, matcher._fail, matcher._output, self.counts
+        state = self.state
+        for word in iter_words(text, matcher.stemmed):
+            while state and word not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word, 0)
+            for index in output[state]:
+                counts[index] += 1
+        self.state = state
+        return self
+
+    def missing(self):
+        return [keyword for keyword, count in zip(self.matcher.keywords, self.counts) if not count]
+
+
+@lru_cache(maxsize=256)
+def compile_keywords(required_keywords, stemmed=False):
+    """
+    Returns the KeywordMatcher of a comma-separated keyword list. Compiled once
+    per process for each version of an assignment's keywords.
+    """
+    keywords = [kw.strip().lower() for kw in required_keywords.split(',') if kw.strip()]
+    return KeywordMatcher(keywords, stemmed)
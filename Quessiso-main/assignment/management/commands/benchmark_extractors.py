@@ -0,0 +1,118 @@
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import docx
+from django.core.management.base import BaseCommand, CommandError
+
+from assignment.utils import extract_text_docx, iter_docx_paragraphs
+
+# Roughly what a page of an essay holds
+PARAGRAPHS_PER_PAGE = 6
+WORDS_PER_PARAGRAPH = 80
+
+
+def extract_text_docx_object_model(file_path):
+    """The python-docx extractor extract_text_docx replaced, kept as the baseline."""
+    doc = docx.Document(file_path)
+    return "\n".join([para.text for para in doc.paragraphs])
+
+
+def generate_docx(path, pages, rng):
+    """Writes a DOCX of `pages` pages of random words, with a table, header and footer."""
+    vocabulary = [f"word{n}" for n in range(5000)]
+    document = docx.Document()
+    document.sections[0].header.paragraphs[0].text = "Sample header"
+    document.sections[0].footer.paragraphs[0].text = "Sample footer"
+    for _ in range(pages * PARAGRAPHS_PER_PAGE):
+        document.add_paragraph(' '.join(rng.choices(vocabulary, k=WORDS_PER_PARAGRAPH)))
+    table = document.add_table(rows=10, cols=3)
+    for cell in table._cells:
+        cell.text = ' '.join(rng.choices(vocabulary, k=5))
+    document.save(path)
+
+
+def count_streamed_words(path):
+    """Consumes the streaming extractor without keeping the text, as a word count would."""
+    return sum(len(paragraph.split()) for paragraph in iter_docx_paragraphs(path))
+
+
+def measure(extractor, path, repeat, streamed=None):
+    """
+    Returns (best seconds, peak traced bytes, words) of extracting `path`. The
+    memory is that of `streamed` when given, so it excludes the returned text.
+    tracemalloc does not see lxml's C allocations, which flatters python-docx.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = extractor(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    (streamed or extractor)(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, len(text.split())
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the streaming DOCX extractor against the python-docx one, on the given "
+        "files or directories, or on a generated corpus."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help="DOCX files, or directories searched for them.")
+        parser.add_argument('--generate', type=int, default=4, help="Documents to generate when no paths are given.")
+        parser.add_argument('--pages', type=int, default=200, help="Pages of the largest generated document.")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per file; the best time is kept.")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as corpus:
+            files = self.collect(options['paths']) if options['paths'] else self.generate(corpus, options)
+            if not files:
+                raise CommandError("No DOCX files to benchmark.")
+
+            self.stdout.write(f"{'file':<40} {'python-docx':>16} {'streaming':>16} {'speedup':>8}  words")
+            totals = [0.0, 0.0]
+            for path in files:
+                baseline = measure(extract_text_docx_object_model, path, options['repeat'])
+                streaming = measure(extract_text_docx, path, options['repeat'], count_streamed_words)
+                totals[0] += baseline[0]
+                totals[1] += streaming[0]
+                self.stdout.write(
+                    f"{os.path.basename(path)[:40]:<40} "
+                    f"{baseline[0] * 1000:7.1f}ms {baseline[1] / 2 ** 20:5.1f}MB "
+                    f"{streaming[0] * 1000:7.1f}ms {streaming[1] / 2 ** 20:5.1f}MB "
+                    f"{baseline[0] / streaming[0]:7.1f}x  {baseline[2]} / {streaming[2]}"
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(files)} files: python-docx {totals[0]:.2f}s, streaming {totals[1]:.2f}s "
+                f"({totals[0] / totals[1]:.1f}x faster)."
+            ))
+
+    def collect(self, paths):
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                for root, _, names in os.walk(path):
+                    files += [os.path.join(root, name) for name in sorted(names) if name.lower().endswith('.docx')]
+            elif os.path.isfile(path):
+                files.append(path)
+            else:
+                raise CommandError(f"{path} does not exist.")
+        return files
+
+    def generate(self, corpus, options):
+        rng = random.Random(0)
+        files = []
+        count = options['generate']
+        for n in range(count):
+            pages = max(1, options['pages'] * (n + 1) // count)
+            path = os.path.join(corpus, f"sample-{pages}-pages.docx")
+            generate_docx(path, pages, rng)
+            files.append(path)
+        return files
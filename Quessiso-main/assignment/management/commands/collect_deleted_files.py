@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from assignment.utils import collect_deleted_files
+
+
+class Command(BaseCommand):
+    help = "Removes the files of submissions deleted in bulk, off the request that deleted them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=30, help="Seconds to sleep when nothing is queued.")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--once', action='store_true', help="Collect what is queued now and exit.")
+
+    def handle(self, *args, **options):
+        while True:
+            collected = collect_deleted_files(options['batch_size'])
+            if collected:
+                self.stdout.write(f"Collected {collected} files.")
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,88 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from assignment.utils import (
+    claim_grading_jobs, fail_grading_job, finish_grading_job, grade_submission_file, requeue_stale_jobs
+)
+
+
+class Command(BaseCommand):
+    help = "Grades queued assignment submissions, extracting their text in a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of grading processes.")
+        parser.add_argument('--batch-size', type=int, default=None, help="Jobs claimed per pass, default 4 per worker.")
+        parser.add_argument('--interval', type=float, default=2, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--stale', type=int, default=300, help="Seconds after which a running job is requeued.")
+        parser.add_argument('--once', action='store_true', help="Grade what is queued now and exit.")
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        batch_size = options['batch_size'] or workers * 4
+        stale = timedelta(seconds=options['stale'])
+
+        # The worker processes only parse files; keep them from inheriting a database connection
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            while True:
+                requeue_stale_jobs(stale)
+                jobs = claim_grading_jobs(batch_size)
+                if jobs:
+                    crashed = self.grade(pool, jobs)
+                    if crashed:
+                        pool = self.restart(pool, workers)
+                    # One at a time, so a file that kills its grading process again fails only its own job
+                    for job in crashed:
+                        if self.grade(pool, [job]):
+                            fail_grading_job(job, "its grading process stopped unexpectedly")
+                            pool = self.restart(pool, workers)
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        finally:
+            pool.shutdown()
+
+    def restart(self, pool, workers):
+        pool.shutdown(wait=False, cancel_futures=True)
+        connections.close_all()
+        return ProcessPoolExecutor(max_workers=workers)
+
+    def grade(self, pool, jobs):
+        """
+        Grades `jobs` in the pool. Returns the jobs left ungraded because a
+        worker process died, which breaks the pool.
+        """
+        futures = {}
+        crashed = []
+        for job in jobs:
+            if job.submission is None:
+                fail_grading_job(job, "the submission was removed")
+                continue
+            try:
+                futures[pool.submit(grade_submission_file, job.submission.file.path, job.assignment)] = job
+            except BrokenProcessPool:
+                crashed.append(job)
+
+        graded = failed = 0
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                grade, feedback, rejected, signature, text = future.result()
+            except BrokenProcessPool:
+                crashed.append(job)
+            except Exception as error:
+                fail_grading_job(job, error)
+                failed += 1
+            else:
+                finish_grading_job(job, grade, feedback, rejected, signature, text)
+                graded += 1
+        self.stdout.write(f"Graded {graded} submissions ({failed} failed).")
+        return crashed
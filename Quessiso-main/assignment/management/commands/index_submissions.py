@@ -0,0 +1,48 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from assignment.models import Submission
+from assignment.search import search_backend
+from assignment.utils import read_submission_text
+
+
+class Command(BaseCommand):
+    help = (
+        "Adds the graded submissions missing from the full-text search index, such as those "
+        "graded before it existed, extracting their text in a pool of worker processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help="Empty the index and index every submission again.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of extraction processes.")
+        parser.add_argument('--batch-size', type=int, default=200, help="Submissions indexed per batch.")
+
+    def handle(self, *args, **options):
+        backend = search_backend()
+        if options['rebuild']:
+            backend.clear()
+        indexed = backend.indexed_ids()
+        pending = [
+            submission_id
+            for submission_id in Submission.objects.filter(status=Submission.GRADED).values_list('id', flat=True).iterator()
+            if submission_id not in indexed
+        ]
+
+        # The worker processes only parse files; keep them from inheriting a database connection
+        connections.close_all()
+        done = 0
+        batch_size = options['batch_size']
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            for start in range(0, len(pending), batch_size):
+                batch = list(Submission.objects.filter(id__in=pending[start:start + batch_size]).only('id', 'file'))
+                texts = pool.map(read_submission_text, [submission.file.path for submission in batch])
+                with transaction.atomic():
+                    for submission, text in zip(batch, texts):
+                        if text:
+                            backend.index(submission.id, text)
+                            done += 1
+                self.stdout.write(f"Indexed {done} of {len(pending)} submissions.")
+        self.stdout.write(self.style.SUCCESS(f"Indexed {done} submissions."))
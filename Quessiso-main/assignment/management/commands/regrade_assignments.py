@@ -0,0 +1,105 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from assignment.models import Assignment, RegradeRun, Submission
+from assignment.utils import regrade_submission_file
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-grades every graded submission of the given assignments, or of the re-grades queued "
+        "from the admin, in a pool of worker processes. Interrupted runs resume where they stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('assignment_ids', nargs='*', type=int)
+        parser.add_argument('--queued', action='store_true', help="Process the re-grades queued from the admin.")
+        parser.add_argument('--restart', action='store_true', help="Start over instead of resuming unfinished runs.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of grading processes.")
+        parser.add_argument('--batch-size', type=int, default=200, help="Submissions written per batch.")
+
+    def handle(self, *args, **options):
+        runs = []
+        for assignment_id in options['assignment_ids']:
+            try:
+                assignment = Assignment.objects.get(id=assignment_id)
+            except Assignment.DoesNotExist:
+                raise CommandError(f"Assignment {assignment_id} does not exist.")
+            run = None if options['restart'] else self.unfinished_runs().filter(assignment=assignment).last()
+            runs.append(run or RegradeRun.objects.create(assignment=assignment))
+        if options['queued']:
+            runs += [run for run in self.unfinished_runs() if run not in runs]
+        if not runs:
+            raise CommandError("Give assignment ids, or --queued to process the re-grades queued from the admin.")
+
+        # The worker processes only parse files; keep them from inheriting a database connection
+        connections.close_all()
+        self.workers = options['workers']
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            for run in runs:
+                self.regrade(pool, run, options['batch_size'])
+
+    def unfinished_runs(self):
+        return RegradeRun.objects.filter(finished_at__isnull=True).select_related('assignment').order_by('id')
+
+    def regrade(self, pool, run, batch_size):
+        assignment = run.assignment
+        submissions = (
+            Submission.objects.filter(assignment=assignment, status=Submission.GRADED)
+            .only('id', 'file', 'grade', 'feedback')
+            .order_by('id')
+        )
+        if run.started_at is None:
+            run.started_at = timezone.now()
+            run.total = submissions.count()
+            run.save(update_fields=['started_at', 'total'])
+        elif run.last_submission_id:
+            self.stdout.write(f"Resuming the re-grade of {assignment} after submission {run.last_submission_id}.")
+
+        while True:
+            batch = list(submissions.filter(id__gt=run.last_submission_id)[:batch_size])
+            if not batch:
+                break
+            chunksize = max(1, len(batch) // (self.workers * 4))
+            results = pool.map(
+                regrade_submission_file, [submission.file.path for submission in batch], repeat(assignment),
+                chunksize=chunksize,
+            )
+            changed = []
+            failed = 0
+            for submission, result in zip(batch, results):
+                if result is None:
+                    failed += 1
+                    continue
+                grade, feedback = result
+                if (submission.grade, submission.feedback) != (grade, feedback):
+                    submission.grade, submission.feedback = grade, feedback
+                    changed.append(submission)
+
+            # The progress is saved with the grades, so a resumed run never re-grades a written batch
+            with transaction.atomic():
+                Submission.objects.bulk_update(changed, ['grade', 'feedback'])
+                run.last_submission_id = batch[-1].id
+                run.done += len(batch)
+                run.changed += len(changed)
+                run.failed += failed
+                run.save(update_fields=['last_submission_id', 'done', 'changed', 'failed'])
+            self.stdout.write(
+                f"{assignment}: re-graded {run.done}/{run.total} submissions "
+                f"({run.changed} changed, {run.failed} unreadable)"
+            )
+
+        run.finished_at = timezone.now()
+        run.save(update_fields=['finished_at'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-graded {run.done} submissions of {assignment}, {run.changed} grades changed."
+        ))
+        if run.failed:
+            self.stdout.write(self.style.WARNING(
+                f"{run.failed} submissions of {assignment} could not be read and kept their grade."
+            ))
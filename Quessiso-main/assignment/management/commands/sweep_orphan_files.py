@@ -0,0 +1,81 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from assignment.models import DeferredFileDeletion, StoredBlob, Submission
+from student.models import Student
+from teacher.models import Teacher
+
+
+def iter_files(root):
+    """Yields the path of every file under `root`, walking the tree with os.scandir()."""
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+
+class Command(BaseCommand):
+    help = (
+        "Finds files under MEDIA_ROOT that no submission or profile refers to, and deletes "
+        "them with --delete. Only the given upload directories are swept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directories', nargs='*', default=['submissions'],
+                            help="Directories of MEDIA_ROOT to sweep (default: submissions).")
+        parser.add_argument('--min-age', type=int, default=24 * 60 * 60,
+                            help="Seconds a file must be old to count as orphaned, sparing uploads in progress.")
+        parser.add_argument('--delete', action='store_true', help="Delete the orphaned files instead of listing them.")
+
+    def handle(self, *args, **options):
+        referenced = self.referenced_names()
+        cutoff = time.time() - options['min_age']
+        orphans = size = 0
+        for directory in options['directories']:
+            for entry in iter_files(os.path.join(settings.MEDIA_ROOT, directory)):
+                name = os.path.relpath(entry.path, settings.MEDIA_ROOT).replace(os.sep, '/')
+                if name in referenced or entry.stat().st_mtime > cutoff:
+                    continue
+                orphans += 1
+                size += entry.stat().st_size
+                if options['delete']:
+                    os.remove(entry.path)
+                else:
+                    self.stdout.write(name)
+
+        # Blobs no submission refers to any more, whether or not their file was still there
+        stale_blobs = [
+            blob_id for blob_id, name in StoredBlob.objects.values_list('id', 'name').iterator() if name not in referenced
+        ]
+        if options['delete']:
+            for start in range(0, len(stale_blobs), 500):
+                StoredBlob.objects.filter(id__in=stale_blobs[start:start + 500]).delete()
+
+        verb = "Deleted" if options['delete'] else "Found"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {orphans} orphaned files ({size / 2 ** 20:.1f}MB) and {len(stale_blobs)} unreferenced blobs."
+        ))
+
+    def referenced_names(self):
+        """The set of file names the database refers to, including those queued for the collector."""
+        referenced = set()
+        sources = [
+            Submission.objects.exclude(file='').values_list('file', flat=True),
+            Student.objects.exclude(profile_pic='').values_list('profile_pic', flat=True),
+            Teacher.objects.exclude(profile_pic='').values_list('profile_pic', flat=True),
+            DeferredFileDeletion.objects.values_list('name', flat=True),
+        ]
+        for names in sources:
+            referenced.update(names.iterator())
+        return referenced
@@ -15,6 +15,6 @@ class Migration(migrations.Migration):
         migrations.AddField(
             model_name='assignment',
             name='course',
-            field=models.ForeignKey(default='c', on_delete=django.db.models.deletion.CASCADE, related_name='assignments', to='exam.course'),
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.CASCADE, related_name='assignments', to='exam.course'),
         ),
     ]
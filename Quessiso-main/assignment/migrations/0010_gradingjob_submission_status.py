@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('assignment', '0009_remove_submission_course'),
+    ]
+
+    operations = [
+        # Submissions made before the queue were graded on upload
+        migrations.AddField(
+            model_name='submission',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('graded', 'Graded')], default='graded', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('graded', 'Graded')], default='pending', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='GradingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('graded', 'Graded'), ('rejected', 'Rejected'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('grade', models.FloatField(blank=True, null=True)),
+                ('feedback', models.TextField(blank=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('assignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grading_jobs', to='assignment.assignment')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grading_jobs', to=settings.AUTH_USER_MODEL)),
+                ('submission', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='grading_jobs', to='assignment.submission')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='grading_job_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignment', '0010_gradingjob_submission_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='stem_keywords',
+            field=models.BooleanField(default=False, help_text="Also accept other forms of the keywords (e.g. 'conclusions' for 'conclusion')"),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignment', '0011_assignment_stem_keywords'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='minhash',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.CreateModel(
+            name='SimilarityMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('similarity', models.FloatField()),
+                ('found_at', models.DateTimeField(auto_now_add=True)),
+                ('matched', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_from', to='assignment.submission')),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='assignment.submission')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SubmissionBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('assignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='assignment.assignment')),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='assignment.submission')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['assignment', 'band', 'bucket'], name='submission_band_bucket_idx')],
+            },
+        ),
+    ]
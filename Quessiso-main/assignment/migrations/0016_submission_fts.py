@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:05
+
+from django.db import migrations
+
+CREATE_INDEX = [
+    "CREATE VIRTUAL TABLE assignment_submission_fts USING fts5(text, tokenize = 'porter unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER assignment_submission_fts_delete AFTER DELETE ON assignment_submission BEGIN "
+    "DELETE FROM assignment_submission_fts WHERE rowid = old.id; END",
+]
+DROP_INDEX = [
+    "DROP TRIGGER IF EXISTS assignment_submission_fts_delete",
+    "DROP TABLE IF EXISTS assignment_submission_fts",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # The FTS5 index only exists on SQLite; other databases need another SUBMISSION_SEARCH_BACKEND
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignment', '0015_deferredfiledeletion'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_INDEX), run(DROP_INDEX)),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignment', '0016_submission_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='rubric',
+            field=models.JSONField(blank=True, help_text='Grading criteria as JSON (see assignment/rubric.py); leave empty for the default checks', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignment', '0017_assignment_rubric'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='regraderun',
+            name='failed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -3,10 +3,14 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone 
-import os
+import json
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db.models.signals import pre_delete
 from django.dispatch import receiver
+from .keywords import WORD_RE, compile_keywords
+from .rubric import DEFAULT_RUBRIC, RubricError, compile_rubric
+from .storage import digest_from_name, submission_storage
 
 
 class Assignment(models.Model):
@@ -25,6 +29,15 @@ class Assignment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     course = models.CharField(max_length=100, null=True, blank=True)  
     marks = models.IntegerField(default=5)
+    stem_keywords = models.BooleanField(
+        default=False,
+        help_text="Also accept other forms of the keywords (e.g. 'conclusions' for 'conclusion')"
+    )
+    rubric = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Grading criteria as JSON (see assignment/rubric.py); leave empty for the default checks"
+    )
 
     def __str__(self):
         return self.title
@@ -35,7 +48,39 @@ class Assignment(models.Model):
         """
         return [kw.strip().lower() for kw in self.required_keywords.split(',') if kw.strip()]
 
+    def keyword_matcher(self):
+        """
+        Returns the compiled KeywordMatcher of the required keywords.
+        """
+        return compile_keywords(self.required_keywords, self.stem_keywords)
+
+    def rubric_evaluator(self):
+        """
+        Returns the compiled RubricEvaluator of the assignment's rubric.
+        """
+        rubric = json.dumps(self.rubric or DEFAULT_RUBRIC, sort_keys=True)
+        return compile_rubric(rubric, self.required_keywords, self.stem_keywords)
+
+    def clean(self):
+        # Keywords are matched as words, so one without any could never be found
+        unmatchable = [kw for kw in self.get_required_keywords_list() if not WORD_RE.search(kw)]
+        if unmatchable:
+            raise ValidationError({
+                'required_keywords': f"Keywords need at least one letter or digit: {', '.join(unmatchable)}."
+            })
+        try:
+            self.rubric_evaluator()
+        except RubricError as error:
+            raise ValidationError({'rubric': str(error)})
+
 class Submission(models.Model):
+    PENDING = 'pending'
+    GRADED = 'graded'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (GRADED, 'Graded'),
+    )
+
     assignment = models.ForeignKey(
         Assignment,
         on_delete=models.CASCADE,
@@ -47,24 +92,149 @@ class Submission(models.Model):
         related_name='submissions'
     )
     
-    file = models.FileField(upload_to='submissions/')
+    file = models.FileField(upload_to='submissions/', storage=submission_storage)
     submitted_at = models.DateTimeField(auto_now_add=True)
     grade = models.FloatField(null=True, blank=True)
     feedback = models.TextField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    minhash = models.BinaryField(null=True, editable=False)  # MinHash signature of the text, for plagiarism checks
 
     def __str__(self):
         return f"{self.assignment.title} - {self.student.username}"
     
+    @property
+    def digest(self):
+        """SHA-256 of the file, carried by its content-addressed name."""
+        return digest_from_name(self.file.name)
+
     def delete(self, *args, **kwargs):
-        # Delete the file from the filesystem
+        # Release the file; the storage removes it once no submission refers to it
         if self.file:
-            if os.path.isfile(self.file.path):
-                os.remove(self.file.path)
+            self.file.delete(save=False)
         # Call the superclass delete() to remove the instance
         super().delete(*args, **kwargs)
     
     @receiver(pre_delete, sender=Assignment)
     def delete_related_submissions(sender, instance, **kwargs):
-    # Delete all submissions related to the assignment
-        for submission in instance.submissions.all():
-            submission.delete()
+        # The submissions go with the assignment by cascade; hand their files to the collector
+        DeferredFileDeletion.objects.bulk_create([
+            DeferredFileDeletion(name=name)
+            for name in instance.submissions.exclude(file='').values_list('file', flat=True)
+        ])
+
+
+class GradingJob(models.Model):
+    """
+    A submission waiting to be graded by the grade_submissions worker. The job
+    outlives a submission rejected by grading, so the student can still poll
+    for its feedback.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    GRADED = 'graded'
+    REJECTED = 'rejected'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (GRADED, 'Graded'),
+        (REJECTED, 'Rejected'),
+        (FAILED, 'Failed'),
+    )
+
+    submission = models.ForeignKey(Submission, on_delete=models.SET_NULL, null=True, related_name='grading_jobs')
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='grading_jobs')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='grading_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    grade = models.FloatField(null=True, blank=True)
+    feedback = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='grading_job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Grading job {self.id} ({self.status})"
+
+
+class SubmissionBand(models.Model):
+    """
+    One band bucket of a submission's MinHash signature: the LSH index used to
+    find near-duplicate submissions of an assignment (see assignment.similarity).
+    """
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='+')
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='bands')
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['assignment', 'band', 'bucket'], name='submission_band_bucket_idx'),
+        ]
+
+
+class SimilarityMatch(models.Model):
+    """
+    A submission found to nearly duplicate an earlier submission of the same assignment.
+    """
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='similar_to')
+    matched = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='similar_from')
+    similarity = models.FloatField()
+    found_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.submission_id} ~ {self.matched_id} ({self.similarity:.0%})"
+
+
+class StoredBlob(models.Model):
+    """
+    A file of the content-addressed submission storage and the number of
+    submissions referring to it.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    digest = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
+
+
+class RegradeRun(models.Model):
+    """
+    A re-grade of every graded submission of an assignment, run by the
+    regrade_assignments command. Progress is saved with each batch, so an
+    interrupted run resumes after the last submission it wrote.
+    """
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='regrade_runs')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    requested_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_submission_id = models.BigIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    done = models.PositiveIntegerField(default=0)
+    changed = models.PositiveIntegerField(default=0)
+    # Submissions whose file was missing or could not be parsed, left with their grade
+    failed = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Re-grade of {self.assignment} ({self.done}/{self.total})"
+
+
+class DeferredFileDeletion(models.Model):
+    """
+    A submission file whose rows were deleted in bulk, waiting for the
+    collect_deleted_files command to release it from storage.
+    """
+    name = models.CharField(max_length=255)
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
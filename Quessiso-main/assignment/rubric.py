@@ -0,0 +1,333 @@
+"""
+Declarative grading rubrics.
+
+An assignment's rubric is a list of criteria, stored as JSON on Assignment.rubric:
+
+    {"criteria": [
+        {"type": "format", "points": 1, "required": true},
+        {"type": "word_count", "bands": [[500, 1], [1000, 2]], "required": true},
+        {"type": "keywords", "points": 2, "all": true},
+        {"type": "keywords", "weights": {"photosynthesis": 2, "chlorophyll": 1}},
+        {"type": "headings", "headings": ["Introduction", "Conclusion"], "points": 1},
+        {"type": "readability", "min": 30, "max": 70, "points": 1},
+        {"type": "points", "points": 1}
+    ]}
+
+compile_rubric() turns a rubric into a RubricEvaluator, once per process. The
+evaluator works out which statistics of the text its criteria need and gathers
+all of them in a single pass over the text, every keyword of every criterion
+going into one KeywordMatcher; each criterion is then scored from the
+statistics. More criteria add scoring, not passes. The points earned are
+scaled to Assignment.marks, and a submission failing a required criterion is
+rejected, graded 0, so that it can be submitted again.
+"""
+import io
+import json
+import re
+from functools import lru_cache
+
+from .keywords import WORD_RE, KeywordMatcher, iter_words
+
+# The checks validate_submission made before rubrics, for assignments without one
+DEFAULT_RUBRIC = {'criteria': [
+    {'type': 'format', 'points': 1, 'required': True},
+    {'type': 'word_count', 'bands': [[500, 1]], 'required': True},
+    {'type': 'keywords', 'points': 2, 'all': True},
+    {'type': 'points', 'points': 1},
+]}
+
+DEFAULT_EXTENSIONS = ('.pdf', '.docx')
+# Lines of at most this many words are considered as headings
+HEADING_MAX_WORDS = 8
+SENTENCE_END_RE = re.compile(r'[.!?]+(?=\s|$)')
+# Syllables are approximated by the groups of vowels of a line
+VOWEL_GROUP_RE = re.compile(r'[aeiouy]+')
+LEADING_NUMBER_RE = re.compile(r'^(\d+|[ivx]+)$')
+
+
+class RubricError(ValueError):
+    pass
+
+
+class TextStats:
+    """The statistics of a text that the criteria of a rubric are scored from."""
+
+    __slots__ = ('ext', 'words', 'sentences', 'syllables', 'keyword_counts', 'headings')
+
+    def __init__(self, ext):
+        self.ext = ext
+        self.words = 0
+        self.sentences = 0
+        self.syllables = 0
+        self.keyword_counts = []
+        self.headings = set()
+
+    @property
+    def reading_ease(self):
+        """The Flesch reading ease of the text, higher is easier."""
+        if not self.words:
+            return 0.0
+        return 206.835 - 1.015 * self.words / max(self.sentences, 1) - 84.6 * self.syllables / self.words
+
+
+def _number(spec, key, default=None):
+    value = spec.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise RubricError(f"'{key}' of a {spec['type']} criterion must be a positive number.")
+    return value
+
+
+class Criterion:
+    """
+    One criterion of a rubric. Subclasses set `type` and `needs` (the
+    statistics they read) and implement score(stats), returning
+    (points earned, passed, feedback).
+    """
+
+    type = None
+    needs = frozenset()
+
+    def __init__(self, spec):
+        self.points = _number(spec, 'points', 1)
+        self.required = bool(spec.get('required', False))
+
+    def score(self, stats):
+        raise NotImplementedError
+
+
+class FormatCriterion(Criterion):
+    type = 'format'
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.extensions = tuple(ext.lower() for ext in spec.get('extensions', DEFAULT_EXTENSIONS))
+
+    def score(self, stats):
+        if stats.ext in self.extensions:
+            return self.points, True, ""
+        names = ' and '.join(ext.lstrip('.').upper() for ext in self.extensions)
+        return 0, False, f"Unsupported file format. Only {names} files are allowed. "
+
+
+class WordCountCriterion(Criterion):
+    """Points by band: the points of the highest minimum word count reached."""
+
+    type = 'word_count'
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        try:
+            self.bands = sorted((int(words), float(points)) for words, points in spec['bands'])
+        except (KeyError, TypeError, ValueError):
+            raise RubricError("A word_count criterion needs 'bands', a list of [minimum words, points].")
+        if not self.bands:
+            raise RubricError("A word_count criterion needs at least one band.")
+        self.points = max(points for words, points in self.bands)
+
+    def score(self, stats):
+        reached = [points for words, points in self.bands if stats.words >= words]
+        if not reached:
+            return 0, False, f"Word count is below {self.bands[0][0]}. Current count: {stats.words}. "
+        if len(reached) == len(self.bands):
+            return reached[-1], True, f"Word count is sufficient ({stats.words} words). "
+        return reached[-1], True, f"Word count is {stats.words}; {self.bands[len(reached)][0]} words earn more. "
+
+
+class KeywordsCriterion(Criterion):
+    """
+    Keywords given as a list, as {keyword: weight}, or by default the
+    assignment's required keywords. Points are shared by weight, or with
+    "all" only given when every keyword is present.
+    """
+
+    type = 'keywords'
+    needs = frozenset({'keywords'})
+
+    def __init__(self, spec, default_keywords=()):
+        super().__init__(spec)
+        if 'weights' in spec:
+            weights = spec['weights']
+            if not isinstance(weights, dict):
+                raise RubricError("'weights' of a keywords criterion must map keywords to weights.")
+            self.keywords = [keyword.strip().lower() for keyword in weights]
+            try:
+                self.weights = [float(weight) for weight in weights.values()]
+            except (TypeError, ValueError):
+                raise RubricError("The weights of a keywords criterion must be numbers.")
+            if any(weight < 0 for weight in self.weights):
+                raise RubricError("The weights of a keywords criterion must be positive.")
+            if 'points' not in spec:
+                self.points = sum(self.weights)
+        else:
+            keywords = spec.get('keywords', default_keywords)
+            if isinstance(keywords, str):
+                keywords = keywords.split(',')
+            self.keywords = [keyword.strip().lower() for keyword in keywords if keyword.strip()]
+            self.weights = [1.0] * len(self.keywords)
+        unmatchable = [keyword for keyword in self.keywords if not WORD_RE.search(keyword)]
+        if unmatchable:
+            raise RubricError(f"Keywords need at least one letter or digit: {', '.join(unmatchable)}.")
+        self.all = bool(spec.get('all', False))
+        self.offset = 0  # Index of the first keyword in the evaluator's matcher
+
+    def score(self, stats):
+        counts = stats.keyword_counts[self.offset:self.offset + len(self.keywords)]
+        missing = [keyword for keyword, count in zip(self.keywords, counts) if not count]
+        if not missing:
+            return self.points, True, "All required keywords are present. "
+        feedback = f"Missing keywords: {', '.join(missing)}. "
+        if self.all:
+            return 0, False, feedback
+        found = sum(weight for weight, count in zip(self.weights, counts) if count)
+        return self.points * found / (sum(self.weights) or 1), found > 0, feedback
+
+
+class HeadingsCriterion(Criterion):
+    """Section headings, matched against short lines of the text, case and numbering aside."""
+
+    type = 'headings'
+    needs = frozenset({'headings'})
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        headings = spec.get('headings')
+        if not isinstance(headings, list) or not headings:
+            raise RubricError("A headings criterion needs 'headings', a list of section titles.")
+        self.headings = [str(heading) for heading in headings]
+        self.keys = [heading_key(heading) for heading in self.headings]
+
+    def score(self, stats):
+        missing = [heading for heading, key in zip(self.headings, self.keys) if key not in stats.headings]
+        if not missing:
+            return self.points, True, "All required headings are present. "
+        found = len(self.headings) - len(missing)
+        return self.points * found / len(self.headings), found > 0, f"Missing headings: {', '.join(missing)}. "
+
+
+class ReadabilityCriterion(Criterion):
+    """The Flesch reading ease of the text, within [min, max]."""
+
+    type = 'readability'
+    needs = frozenset({'readability'})
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.min = _number(spec, 'min', 0)
+        self.max = _number(spec, 'max', 100)
+
+    def score(self, stats):
+        ease = stats.reading_ease
+        if self.min <= ease <= self.max:
+            return self.points, True, f"Readability ({ease:.0f}) is within {self.min}-{self.max}. "
+        return 0, False, f"Readability ({ease:.0f}) is outside {self.min}-{self.max}. "
+
+
+class PointsCriterion(Criterion):
+    """Points given to every submission, such as a discretionary mark."""
+
+    type = 'points'
+
+    def score(self, stats):
+        return self.points, True, ""
+
+
+CRITERIA = {criterion.type: criterion for criterion in (
+    FormatCriterion, WordCountCriterion, KeywordsCriterion, HeadingsCriterion, ReadabilityCriterion, PointsCriterion,
+)}
+
+
+def heading_key(line):
+    """The words of a heading, lower-cased, without a leading section number."""
+    words = list(iter_words(line))
+    while words and LEADING_NUMBER_RE.match(words[0]):
+        words.pop(0)
+    return ' '.join(words)
+
+
+class RubricEvaluator:
+    """A compiled rubric: its criteria and what their statistics need."""
+
+    def __init__(self, criteria, stemmed=False):
+        self.criteria = criteria
+        self.total = sum(criterion.points for criterion in criteria)
+        needs = set().union(*(criterion.needs for criterion in criteria))
+
+        keywords = []
+        for criterion in criteria:
+            if isinstance(criterion, KeywordsCriterion):
+                criterion.offset = len(keywords)
+                keywords += criterion.keywords
+        self.matcher = KeywordMatcher(keywords, stemmed) if 'keywords' in needs else None
+        self.heading_keys = {
+            key for criterion in criteria if isinstance(criterion, HeadingsCriterion) for key in criterion.keys
+        }
+        self.readability = 'readability' in needs
+
+    def statistics(self, text, ext):
+        """Gathers the statistics of `text` every criterion needs, reading it line by line once."""
+        stats = TextStats(ext)
+        scanner = self.matcher.scanner() if self.matcher is not None else None
+        heading_keys, readability = self.heading_keys, self.readability
+        for line in io.StringIO(text):
+            tokens = line.split()
+            stats.words += len(tokens)
+            if scanner is not None:
+                scanner.feed(line)
+            if heading_keys and 0 < len(tokens) <= HEADING_MAX_WORDS:
+                key = heading_key(line)
+                if key in heading_keys:
+                    stats.headings.add(key)
+            if readability:
+                stats.sentences += len(SENTENCE_END_RE.findall(line))
+                stats.syllables += len(VOWEL_GROUP_RE.findall(line.lower()))
+        if scanner is not None:
+            stats.keyword_counts = scanner.counts
+        return stats
+
+    def evaluate(self, text, ext, marks):
+        """
+        Returns (grade, feedback, rejected) for a text with file extension
+        `ext`, the points earned scaled to `marks`. `rejected` is whether a
+        required criterion failed, which also grades 0; a submission passing
+        them all may still earn 0.
+        """
+        stats = self.statistics(text, ext)
+        earned = 0
+        feedback = []
+        rejected = []
+        for criterion in self.criteria:
+            points, passed, message = criterion.score(stats)
+            earned += points
+            feedback.append(message)
+            if criterion.required and not passed:
+                rejected.append(message)
+        if rejected:
+            return 0, "".join(rejected), True
+        if not self.total:
+            return 0, "".join(feedback), False
+        grade = earned * marks / self.total if marks > 0 else earned
+        return round(grade, 2), "".join(feedback), False
+
+
+def parse_rubric(rubric, default_keywords=(), stemmed=False):
+    """Builds the RubricEvaluator of a rubric, raising RubricError when it is malformed."""
+    if not isinstance(rubric, dict) or not isinstance(rubric.get('criteria'), list):
+        raise RubricError('A rubric needs "criteria", a list of criteria.')
+    criteria = []
+    for spec in rubric['criteria']:
+        if not isinstance(spec, dict) or spec.get('type') not in CRITERIA:
+            raise RubricError(f"Unknown criterion {spec!r}; the types are {', '.join(CRITERIA)}.")
+        if spec['type'] == 'keywords':
+            criteria.append(KeywordsCriterion(spec, default_keywords))
+        else:
+            criteria.append(CRITERIA[spec['type']](spec))
+    return RubricEvaluator(criteria, stemmed)
+
+
+@lru_cache(maxsize=256)
+def compile_rubric(rubric_json, required_keywords, stemmed=False):
+    """
+    Returns the RubricEvaluator of a rubric given as JSON. Compiled once per
+    process for each version of an assignment's rubric and keywords.
+    """
+    return parse_rubric(json.loads(rubric_json), required_keywords.split(','), stemmed)
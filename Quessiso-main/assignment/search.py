@@ -0,0 +1,114 @@
+"""
+Full-text search over the text of graded submissions.
+
+The text extracted while grading is indexed into the backend named by
+settings.SUBMISSION_SEARCH_BACKEND. The default, FTS5Backend, keeps it in the
+SQLite FTS5 table assignment_submission_fts (migration 0016), whose rowid is the
+submission id; a trigger on assignment_submission removes the text of deleted
+submissions, however they are deleted. Queries are ranked with bm25 and scoped
+to the assignments of one teacher by joining the index with its submissions.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+from .keywords import WORD_RE
+
+SEARCH_PAGE_SIZE = 20
+SNIPPET_WORDS = 24
+# Marks around the matched words in snippets, swapped for <mark> once the text is escaped
+_HIT_START, _HIT_END = '\x02', '\x03'
+# A quoted phrase or a single term of a user's query
+QUERY_TERM_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+SearchHit = namedtuple('SearchHit', 'submission_id snippet')
+
+
+def match_expression(query):
+    """
+    Turns what a user typed into an FTS5 query matching every term, with
+    "quoted" parts as phrases and a trailing * as a prefix search. Each term is
+    quoted, so FTS5 operators in the input are searched as words rather than
+    parsed. Returns '' for no terms.
+    """
+    terms = []
+    for phrase, word in QUERY_TERM_RE.findall(query):
+        words = WORD_RE.findall((phrase or word).lower())
+        if words:
+            terms.append('"%s"%s' % (' '.join(words), ' *' if word.endswith('*') else ''))
+    return ' '.join(terms)
+
+
+def highlight(snippet):
+    """Escapes a snippet and wraps its matched words in <mark>."""
+    return mark_safe(escape(snippet).replace(_HIT_START, '<mark>').replace(_HIT_END, '</mark>'))
+
+
+class FTS5Backend:
+    """Submission texts in the SQLite FTS5 table created by migration 0016."""
+
+    table = 'assignment_submission_fts'
+
+    def index(self, submission_id, text):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [submission_id])
+            cursor.execute(f'INSERT INTO {self.table} (rowid, text) VALUES (%s, %s)', [submission_id, text])
+
+    def indexed_ids(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {self.table}')
+            return {row[0] for row in cursor.fetchall()}
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    def search(self, expression, teacher_id, assignment_id=None, offset=0, limit=SEARCH_PAGE_SIZE):
+        """Returns up to `limit` SearchHits for the submissions to `teacher_id`'s assignments, best first."""
+        sql = (
+            f"SELECT f.rowid, snippet({self.table}, 0, %s, %s, '…', %s) "
+            f"FROM {self.table} f "
+            "JOIN assignment_submission s ON s.id = f.rowid "
+            "JOIN assignment_assignment a ON a.id = s.assignment_id "
+            f"WHERE {self.table} MATCH %s AND a.created_by_id = %s"
+        )
+        params = [_HIT_START, _HIT_END, SNIPPET_WORDS, expression, teacher_id]
+        if assignment_id is not None:
+            sql += " AND s.assignment_id = %s"
+            params.append(assignment_id)
+        sql += f" ORDER BY bm25({self.table}), f.rowid LIMIT %s OFFSET %s"
+        params += [limit, offset]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [SearchHit(submission_id, highlight(snippet)) for submission_id, snippet in cursor.fetchall()]
+
+
+@lru_cache(maxsize=None)
+def search_backend():
+    return import_string(settings.SUBMISSION_SEARCH_BACKEND)()
+
+
+def index_submission_text(submission_id, text):
+    """Indexes (or re-indexes) the extracted text of a submission."""
+    search_backend().index(submission_id, text)
+
+
+def search_submissions(query, teacher_id, assignment_id=None, page=1, page_size=SEARCH_PAGE_SIZE):
+    """
+    Returns (hits, has_next) for one page of the submissions to `teacher_id`'s
+    assignments matching `query`. Results are ranked, so pages are taken by
+    offset; one extra hit is fetched to tell whether another page follows.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return [], False
+    hits = search_backend().search(
+        expression, teacher_id, assignment_id, offset=(page - 1) * page_size, limit=page_size + 1,
+    )
+    return hits[:page_size], len(hits) > page_size
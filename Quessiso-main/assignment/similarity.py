@@ -0,0 +1,130 @@
+"""
+Near-duplicate detection between the submissions of an assignment.
+
+Each graded submission gets a MinHash signature of its word shingles. The
+signature is cut into bands, and the hash of every band is stored in an index
+per assignment (SubmissionBand). A new submission is only compared with the
+earlier ones sharing at least one band bucket, so checking it does not depend
+on the number of submissions. With 16 bands of 8 rows, pairs about 70% similar
+or more become candidates.
+"""
+import hashlib
+import zlib
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+
+from .keywords import iter_words
+from .models import SimilarityMatch, Submission, SubmissionBand
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 128
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+SIMILARITY_THRESHOLD = 0.8
+
+# Universal hashing (a * x + b) mod p of the 32-bit shingle hashes; a < 2**32 keeps a * x within 64 bits
+_PRIME = np.uint64(4294967311)
+_random = np.random.RandomState(20241026)
+_A = _random.randint(1, 2 ** 32, size=(NUM_PERMUTATIONS, 1), dtype=np.uint64)
+_B = _random.randint(0, 2 ** 32, size=(NUM_PERMUTATIONS, 1), dtype=np.uint64)
+
+
+def shingle_hashes(text):
+    """Returns the 32-bit hashes of the distinct SHINGLE_SIZE-word shingles of `text`."""
+    words = list(iter_words(text))
+    if len(words) < SHINGLE_SIZE:
+        shingles = {' '.join(words)} if words else set()
+    else:
+        shingles = {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles), dtype=np.uint64)
+
+
+def minhash_signature(text):
+    """
+    Returns the MinHash signature of `text` as bytes (NUM_PERMUTATIONS uint32),
+    or None when the text has no words.
+    """
+    hashes = shingle_hashes(text)
+    if not len(hashes):
+        return None
+    permuted = (_A * hashes % _PRIME + _B) % _PRIME
+    return permuted.min(axis=1).astype(np.uint32).tobytes()
+
+
+def signature_buckets(signature):
+    """Returns the bucket of each band of a signature, as signed 64-bit ints."""
+    rows = np.frombuffer(signature, dtype=np.uint32).reshape(BANDS, ROWS_PER_BAND)
+    return [
+        int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8).digest(), 'big', signed=True)
+        for band in rows
+    ]
+
+
+def estimate_similarity(signature, other):
+    """Estimates the Jaccard similarity of two texts from their signatures."""
+    return float(np.mean(np.frombuffer(signature, dtype=np.uint32) == np.frombuffer(other, dtype=np.uint32)))
+
+
+def forget_submission(submission_id):
+    """Removes a submission from the index and its matches, before it is graded again."""
+    SubmissionBand.objects.filter(submission_id=submission_id).delete()
+    SimilarityMatch.objects.filter(Q(submission_id=submission_id) | Q(matched_id=submission_id)).delete()
+
+
+def index_submission(submission, signature):
+    """
+    Stores the signature of a graded submission, records the earlier submissions
+    of the assignment it nearly duplicates, and adds it to the index.
+    Returns the new SimilarityMatch rows.
+    """
+    if signature is None:
+        return []
+    buckets = signature_buckets(signature)
+    candidates = (
+        SubmissionBand.objects
+        .filter(assignment_id=submission.assignment_id)
+        .filter(Q(*[Q(band=band, bucket=bucket) for band, bucket in enumerate(buckets)], _connector=Q.OR))
+        .exclude(submission_id=submission.id)
+        .values_list('submission_id', flat=True)
+        .distinct()
+    )
+    others = Submission.objects.filter(id__in=list(candidates), minhash__isnull=False).values_list('id', 'minhash')
+    matches = [
+        SimilarityMatch(submission_id=submission.id, matched_id=other_id, similarity=similarity)
+        for other_id, other in others
+        for similarity in [estimate_similarity(signature, bytes(other))]
+        if similarity >= SIMILARITY_THRESHOLD
+    ]
+
+    with transaction.atomic():
+        Submission.objects.filter(id=submission.id).update(minhash=signature)
+        SubmissionBand.objects.bulk_create([
+            SubmissionBand(assignment_id=submission.assignment_id, submission_id=submission.id, band=band, bucket=bucket)
+            for band, bucket in enumerate(buckets)
+        ])
+        SimilarityMatch.objects.bulk_create(matches)
+    return matches
+
+
+def similarity_matches(submission_ids):
+    """
+    Returns {submission id: [(similarity, other submission's student username), ...]}
+    for the given submissions, most similar first.
+    """
+    found = {submission_id: [] for submission_id in submission_ids}
+    pairs = (
+        SimilarityMatch.objects
+        .filter(Q(submission_id__in=submission_ids) | Q(matched_id__in=submission_ids))
+        .values_list('submission_id', 'submission__student__username', 'matched_id',
+                     'matched__student__username', 'similarity')
+    )
+    for submission_id, username, matched_id, matched_username, similarity in pairs:
+        if submission_id in found:
+            found[submission_id].append((similarity, matched_username))
+        if matched_id in found:
+            found[matched_id].append((similarity, username))
+    for matches in found.values():
+        matches.sort(reverse=True)
+    return found
@@ -0,0 +1,95 @@
+"""
+Content-addressed storage for submitted files.
+
+Uploads are hashed with SHA-256 while they are written to disk and stored as
+<upload_to>/<ab>/<cd>/<digest><ext>, so identical files are kept once however
+many submissions refer to them. Each blob is reference counted in StoredBlob and
+removed from disk when its last submission lets go of it.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+DIGEST_NAME_RE = re.compile(r'^([0-9a-f]{64})(\.\w+)?$')
+
+
+def digest_from_name(name):
+    """Returns the SHA-256 digest a content-addressed file name carries, or None."""
+    match = DIGEST_NAME_RE.match(os.path.basename(name or ''))
+    return match.group(1) if match else None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    A FileSystemStorage whose file names are the digests of their contents.
+    save() of bytes already stored only takes another reference to them.
+    """
+
+    def _save(self, name, content):
+        from .models import StoredBlob
+
+        directory = posixpath.dirname(name)
+        ext = os.path.splitext(name)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+
+        # Hash the upload as it streams to a temporary file next to its final place
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.path(directory), suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+            digest = digest.hexdigest()
+            blob_name = posixpath.join(directory, digest[:2], digest[2:4], digest + ext)
+
+            with transaction.atomic():
+                blob, _ = StoredBlob.objects.get_or_create(name=blob_name, defaults={'digest': digest, 'size': size})
+                StoredBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1)
+                path = self.path(blob_name)
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(tmp_path, path)
+                    self._set_permissions(path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return blob_name
+
+    def _set_permissions(self, path):
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is chosen by _save() from the content
+        return name
+
+    def delete(self, name):
+        """Drops one reference to the file; the file itself goes with the last one."""
+        from .models import StoredBlob
+
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(name=name).first()
+            if blob is not None and blob.refcount > 1:
+                StoredBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') - 1)
+                return
+            if blob is not None:
+                blob.delete()
+            # Removed while the blob's row is locked: a concurrent save of the same bytes either
+            # took its reference first, or finds no blob once this commits and writes the file again.
+            # Files stored before content addressing have no blob and are removed directly
+            super().delete(name)
+
+
+def submission_storage():
+    return ContentAddressedStorage()
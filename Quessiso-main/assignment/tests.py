@@ -1,3 +1,582 @@
-from django.test import TestCase
+import io
+import os
+import random
+import tempfile
+from datetime import timedelta
+from functools import partial
+from unittest import mock
 
-# Create your tests here.
+import docx
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from exam.tests import TEST_CACHES
+from exam.utils import LIST_PAGE_SIZE, delete_in_chunks
+from student.models import Student
+from teacher.models import Teacher
+from .forms import AssignmentForm
+from .keywords import KeywordMatcher, compile_keywords, stem
+from .models import (
+    Assignment, DeferredFileDeletion, GradingJob, RegradeRun, SimilarityMatch, StoredBlob, Submission,
+)
+from .views import SUBMISSION_SORTS
+from .rubric import DEFAULT_RUBRIC, RubricError, parse_rubric
+from .search import index_submission_text, match_expression, search_submissions
+from .similarity import (
+    SIMILARITY_THRESHOLD, estimate_similarity, index_submission, minhash_signature, shingle_hashes, similarity_matches,
+)
+from . import utils
+from .utils import (
+    GRADING_MAX_ATTEMPTS, claim_grading_jobs, fail_grading_job, finish_grading_job, requeue_stale_jobs
+)
+
+
+# Files whose grading process dies, as one killed for running out of memory would
+CRASHING_FILES = set()
+
+
+def grade_or_crash(file_path, assignment):
+    if file_path in CRASHING_FILES:
+        os._exit(1)
+    return utils.grade_submission_file(file_path, assignment)
+
+
+def make_assignment(created_by, **fields):
+    fields = {'title': 'Essay', 'description': 'd', 'due_date': timezone.now() + timedelta(days=1), **fields}
+    return Assignment.objects.create(created_by=created_by, **fields)
+
+
+def make_submission(assignment, student, content, name='essay.docx'):
+    return Submission.objects.create(assignment=assignment, student=student, file=SimpleUploadedFile(name, content))
+
+
+def make_docx(words):
+    document = docx.Document()
+    document.add_paragraph(' '.join(words))
+    content = io.BytesIO()
+    document.save(content)
+    return content.getvalue()
+
+
+@override_settings(CACHES=TEST_CACHES, MEDIA_ROOT=tempfile.mkdtemp(), SUBMISSION_TEXT_CACHE_DIR=tempfile.mkdtemp())
+class GradingFailureTests(TestCase):
+    """A submission whose grading fails for good must not block the student from submitting again."""
+
+    def setUp(self):
+        cache.clear()
+        teacher = User.objects.create_user('teacher')
+        self.assignment = Assignment.objects.create(
+            title='Essay', description='d', due_date=timezone.now() + timedelta(days=1),
+            required_keywords='alpha', created_by=teacher,
+        )
+        self.student = User.objects.create_user('student')
+        self.student.groups.add(Group.objects.get_or_create(name='STUDENT')[0])
+        Student.objects.create(user=self.student, address='x', mobile='1')
+        self.client.force_login(self.student)
+
+    def upload(self):
+        return self.client.post(f'/student/student-submit/{self.assignment.id}/', {
+            'file': SimpleUploadedFile('essay.docx', make_docx(['alpha'] * 600)),
+        })
+
+    def claim(self):
+        jobs = claim_grading_jobs(10)
+        self.assertEqual(len(jobs), 1)
+        return jobs[0]
+
+    def test_failed_job_releases_submission(self):
+        self.upload()
+        for attempt in range(GRADING_MAX_ATTEMPTS):
+            fail_grading_job(self.claim(), "corrupt file")
+        job = GradingJob.objects.get()
+        self.assertEqual(job.status, GradingJob.FAILED)
+        self.assertIsNone(job.submission_id)
+        self.assertFalse(Submission.objects.exists())
+
+        self.upload()
+        self.assertEqual(Submission.objects.get().status, Submission.PENDING)
+        self.assertEqual(GradingJob.objects.filter(status=GradingJob.QUEUED).count(), 1)
+
+    def test_stale_job_out_of_attempts_fails(self):
+        self.upload()
+        job = self.claim()
+        GradingJob.objects.filter(id=job.id).update(
+            attempts=GRADING_MAX_ATTEMPTS, started_at=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(requeue_stale_jobs(timedelta(minutes=5)), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, GradingJob.FAILED)
+        self.assertFalse(Submission.objects.exists())
+
+    def test_graded_zero_is_kept(self):
+        # Earning no points is a grade, not a failed required criterion
+        self.upload()
+        finish_grading_job(self.claim(), 0, "Missing keywords: alpha. ", rejected=False)
+        self.assertEqual(GradingJob.objects.get().status, GradingJob.GRADED)
+        self.assertEqual(Submission.objects.get().grade, 0)
+
+    def test_rejected_submission_is_deleted(self):
+        self.upload()
+        finish_grading_job(self.claim(), 0, "Word count is below 500. ", rejected=True)
+        self.assertEqual(GradingJob.objects.get().status, GradingJob.REJECTED)
+        self.assertFalse(Submission.objects.exists())
+
+    def test_crashed_worker_fails_only_its_job(self):
+        self.upload()
+        crashing = Submission.objects.get()
+        other = User.objects.create_user('other')
+        other.groups.add(Group.objects.get_or_create(name='STUDENT')[0])
+        Student.objects.create(user=other, address='x', mobile='1')
+        self.client.force_login(other)
+        self.client.post(f'/student/student-submit/{self.assignment.id}/', {
+            'file': SimpleUploadedFile('essay.docx', make_docx(['alpha'] * 601)),
+        })
+
+        CRASHING_FILES.add(crashing.file.path)
+        self.addCleanup(CRASHING_FILES.clear)
+        with mock.patch('assignment.management.commands.grade_submissions.grade_submission_file', grade_or_crash):
+            call_command('grade_submissions', '--once', '--workers=2', stdout=io.StringIO())
+        jobs = dict(GradingJob.objects.values_list('student__username', 'status'))
+        self.assertEqual(jobs, {'student': GradingJob.FAILED, 'other': GradingJob.GRADED})
+        self.assertEqual(Submission.objects.get().student, other)
+
+    def test_stale_job_with_attempts_left_is_requeued(self):
+        self.upload()
+        job = self.claim()
+        GradingJob.objects.filter(id=job.id).update(started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale_jobs(timedelta(minutes=5)), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, GradingJob.QUEUED)
+        self.assertTrue(Submission.objects.exists())
+
+
+@override_settings(CACHES=TEST_CACHES, MEDIA_ROOT=tempfile.mkdtemp(), SUBMISSION_TEXT_CACHE_DIR=tempfile.mkdtemp())
+class RegradeTests(TestCase):
+    """A submission whose file cannot be parsed must not stop the re-grade of the others."""
+
+    def test_corrupt_file_is_counted_and_skipped(self):
+        cache.clear()
+        teacher = User.objects.create_user('teacher')
+        student = User.objects.create_user('student')
+        assignment = Assignment.objects.create(
+            title='Essay', description='d', due_date=timezone.now() + timedelta(days=1),
+            required_keywords='alpha', created_by=teacher,
+        )
+        files = [
+            SimpleUploadedFile('good.docx', make_docx(['alpha'] * 600)),
+            SimpleUploadedFile('corrupt.docx', b'not a zip archive'),
+            SimpleUploadedFile('corrupt.pdf', b'%PDF-1.4 truncated'),
+            SimpleUploadedFile('late.docx', make_docx(['alpha'] * 600)),
+        ]
+        submissions = [
+            Submission.objects.create(
+                assignment=assignment, student=student, file=file, status=Submission.GRADED, grade=1,
+            )
+            for file in files
+        ]
+
+        call_command('regrade_assignments', assignment.id, workers=1, stdout=io.StringIO())
+        run = RegradeRun.objects.get()
+        self.assertIsNotNone(run.finished_at)
+        self.assertEqual((run.done, run.changed, run.failed), (4, 2, 2))
+        grades = dict(Submission.objects.values_list('id', 'grade'))
+        self.assertEqual([grades[submission.id] for submission in submissions], [5, 1, 1, 5])
+
+
+class TextCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        cache_settings = override_settings(SUBMISSION_TEXT_CACHE_DIR=self.cache_dir)
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+        # Each test starts from a process that has not seen the cache yet
+        usage = mock.patch.object(utils, '_text_cache_usage', utils._TextCacheUsage())
+        usage.start()
+        self.addCleanup(usage.stop)
+
+    def cached_files(self):
+        return [os.path.join(root, name) for root, _, names in os.walk(self.cache_dir) for name in names]
+
+    def test_writes_walk_the_cache_only_when_needed(self):
+        with override_settings(SUBMISSION_TEXT_CACHE_MAX_BYTES=10 ** 9), \
+                mock.patch.object(utils, 'evict_text_cache', wraps=utils.evict_text_cache) as evict:
+            for n in range(utils.TEXT_CACHE_RESCAN_WRITES):
+                utils._write_cached_text(f'{n:064x}', 'text')
+        # Once to learn the size, once to rescan
+        self.assertEqual(evict.call_count, 2)
+
+    def test_cache_is_kept_under_its_limit(self):
+        with override_settings(SUBMISSION_TEXT_CACHE_MAX_BYTES=2000):
+            for n in range(100):
+                utils._write_cached_text(f'{n:064x}', f'text {n}')
+        self.assertLessEqual(sum(os.path.getsize(path) for path in self.cached_files()), 2000)
+        self.assertEqual(utils._read_cached_text(f'{99:064x}'), 'text 99')
+
+    def test_failed_write_leaves_no_temporary_file(self):
+        with mock.patch('os.replace', side_effect=OSError):
+            with self.assertRaises(OSError):
+                utils._write_cached_text('0' * 64, 'text')
+        self.assertEqual(self.cached_files(), [])
+
+
+class DocxExtractionTests(SimpleTestCase):
+    """DOCX text covers the body and its tables, then headers, footers and notes."""
+
+    def test_tables_headers_and_footers_are_read(self):
+        document = docx.Document()
+        document.add_paragraph('body text')
+        table = document.add_table(rows=2, cols=2)
+        for n, cell in enumerate(table._cells):
+            cell.text = f'cell{n}'
+        document.add_paragraph('closing\tline')
+        section = document.sections[0]
+        section.header.paragraphs[0].text = 'running header'
+        section.footer.paragraphs[0].text = 'page footer'
+        path = os.path.join(tempfile.mkdtemp(), 'essay.docx')
+        document.save(path)
+
+        paragraphs = list(utils.iter_docx_paragraphs(path))
+        body = ['body text', 'cell0', 'cell1', 'cell2', 'cell3', 'closing\tline']
+        self.assertEqual([paragraph for paragraph in paragraphs if paragraph][:len(body)], body)
+        self.assertIn('running header', paragraphs)
+        self.assertIn('page footer', paragraphs)
+        self.assertEqual(utils.extract_text_docx(path), '\n'.join(paragraphs))
+
+
+class KeywordMatcherTests(SimpleTestCase):
+    def test_whole_words_and_phrases(self):
+        matcher = KeywordMatcher(['intro', 'cell wall', 'wall'])
+        self.assertEqual(matcher.count("The introduction. A cell wall, and another WALL."), [0, 1, 2])
+
+    def test_overlapping_phrases(self):
+        # "b c" is found through the failure link out of the partial match of "a b d"
+        matcher = KeywordMatcher(['a b d', 'b c', 'c'])
+        self.assertEqual(matcher.count('a b c a b d'), [1, 1, 1])
+
+    def test_phrase_across_pieces(self):
+        scanner = KeywordMatcher(['light reaction', 'dark']).scanner()
+        scanner.feed('the light')
+        self.assertEqual(scanner.missing(), ['light reaction', 'dark'])
+        scanner.feed('reaction in the dark')
+        self.assertEqual(scanner.missing(), [])
+
+    def test_stemmed(self):
+        self.assertEqual([stem(word) for word in ('connects', 'connected', 'connecting')], ['connect'] * 3)
+        self.assertEqual([stem(word) for word in ('studies', 'studied')], ['study'] * 2)
+        matcher = compile_keywords('connection, study', stemmed=True)
+        self.assertEqual(matcher.missing('Connections were studied.'), [])
+        self.assertEqual(compile_keywords('connection, study').missing('Connections were studied.'),
+                         ['connection', 'study'])
+
+    def test_keyword_without_words_is_rejected(self):
+        form = AssignmentForm({
+            'title': 'Essay', 'description': 'd', 'due_date': '2030-01-01T00:00', 'marks': 5,
+            'required_keywords': 'photosynthesis, ---',
+        })
+        self.assertFalse(form.is_valid())
+        self.assertIn('required_keywords', form.errors)
+        with self.assertRaises(RubricError):
+            parse_rubric({'criteria': [{'type': 'keywords', 'keywords': ['+++']}]})
+
+
+@override_settings(CACHES=TEST_CACHES, MEDIA_ROOT=tempfile.mkdtemp())
+class ContentAddressedStorageTests(TestCase):
+    """Identical uploads share one file, kept until the last submission referring to it is deleted."""
+
+    def setUp(self):
+        self.assignment = make_assignment(User.objects.create_user('teacher'))
+        self.students = [User.objects.create_user(f'student{n}') for n in range(3)]
+
+    def test_duplicate_uploads_take_references(self):
+        first, second = (make_submission(self.assignment, student, b'same essay') for student in self.students[:2])
+        other = make_submission(self.assignment, self.students[2], b'another essay')
+
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertNotEqual(first.file.name, other.file.name)
+        self.assertEqual(
+            dict(StoredBlob.objects.values_list('name', 'refcount')), {first.file.name: 2, other.file.name: 1}
+        )
+        self.assertEqual(len(os.listdir(os.path.dirname(first.file.path))), 1)
+
+    def test_blob_outlives_all_but_its_last_reference(self):
+        first, second = (make_submission(self.assignment, student, b'same essay') for student in self.students[:2])
+        name, path = first.file.name, first.file.path
+
+        first.delete()
+        self.assertEqual(StoredBlob.objects.get(name=name).refcount, 1)
+        self.assertTrue(os.path.exists(path))
+        with second.file.open('rb') as f:
+            self.assertEqual(f.read(), b'same essay')
+
+        second.delete()
+        self.assertFalse(StoredBlob.objects.filter(name=name).exists())
+        self.assertFalse(os.path.exists(path))
+
+
+@override_settings(CACHES=TEST_CACHES, MEDIA_ROOT=tempfile.mkdtemp())
+class DeletionPipelineTests(TestCase):
+    """Bulk deletes leave files to the collector, which keeps any another submission still shares."""
+
+    def test_shared_file_survives(self):
+        teacher = User.objects.create_user('teacher')
+        deleted, kept = make_assignment(teacher), make_assignment(teacher, title='Kept')
+        students = [User.objects.create_user(f'student{n}') for n in range(4)]
+        shared = make_submission(kept, students[0], b'shared essay')
+        doomed = [make_submission(deleted, student, b'essay %d' % n) for n, student in enumerate(students[1:])]
+        doomed.append(make_submission(deleted, students[0], b'shared essay'))
+        doomed_paths = [submission.file.path for submission in doomed[:-1]]
+        orphan = os.path.join(os.path.dirname(doomed_paths[0]), 'orphan.pdf')
+        with open(orphan, 'wb') as f:
+            f.write(b'left behind')
+
+        with mock.patch('assignment.utils.delete_in_chunks', partial(delete_in_chunks, chunk_size=2)):
+            utils.delete_assignment(deleted)
+        self.assertFalse(Assignment.objects.filter(id=deleted.id).exists())
+        self.assertEqual(DeferredFileDeletion.objects.count(), 4)
+        self.assertTrue(all(os.path.exists(path) for path in doomed_paths))
+
+        call_command('collect_deleted_files', '--once', stdout=io.StringIO())
+        self.assertFalse(DeferredFileDeletion.objects.exists())
+        self.assertFalse(any(os.path.exists(path) for path in doomed_paths))
+        self.assertEqual(list(StoredBlob.objects.values_list('name', 'refcount')), [(shared.file.name, 1)])
+
+        call_command('sweep_orphan_files', '--delete', '--min-age=0', stdout=io.StringIO())
+        self.assertFalse(os.path.exists(orphan))
+        with shared.file.open('rb') as f:
+            self.assertEqual(f.read(), b'shared essay')
+
+
+@override_settings(CACHES=TEST_CACHES, MEDIA_ROOT=tempfile.mkdtemp())
+class SearchTests(TestCase):
+    """Search finds the teacher's own submissions, treats the query as words and highlights them."""
+
+    texts = {
+        'plants': 'Photosynthesis turns light into sugar near the <b>chloroplast</b>.',
+        'near': 'Alpha near beta, in a row.',
+        'apart': 'Alpha comes first and beta comes later.',
+        'elsewhere': 'Photosynthesis, as written for another teacher.',
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.teacher, other = (self.new_teacher(name) for name in ('teacher', 'other'))
+        assignment, other_assignment = make_assignment(self.teacher), make_assignment(other)
+        self.submissions = {}
+        for name, text in self.texts.items():
+            submission = make_submission(
+                other_assignment if name == 'elsewhere' else assignment, User.objects.create_user(name), name.encode(),
+            )
+            index_submission_text(submission.id, text)
+            self.submissions[name] = submission.id
+
+    def new_teacher(self, username):
+        user = User.objects.create_user(username)
+        user.groups.add(Group.objects.get_or_create(name='TEACHER')[0])
+        Teacher.objects.create(user=user, address='x', mobile='1', status=True)
+        return user
+
+    def found(self, query):
+        hit_ids = {hit.submission_id for hit in search_submissions(query, self.teacher.id)[0]}
+        return {name for name, submission_id in self.submissions.items() if submission_id in hit_ids}
+
+    def test_results_are_scoped_to_the_teacher(self):
+        self.assertEqual(self.found('photosynthesis'), {'plants'})
+        self.client.force_login(self.teacher)
+        response = self.client.get('/teacher/teacher-search-submissions', {'q': 'photosynthesis'})
+        self.assertEqual([submission.id for submission, _ in response.context['results']], [self.submissions['plants']])
+
+    def test_query_syntax_is_searched_as_words(self):
+        self.assertEqual(match_expression('alpha NEAR beta'), '"alpha" "near" "beta"')
+        self.assertEqual(self.found('alpha NEAR beta'), {'near'})
+        self.assertEqual(self.found('"alpha near" beta'), {'near'})
+        self.assertEqual(self.found('"alpha'), {'near', 'apart'})
+        self.assertEqual(self.found('alpha OR photosynthesis'), set())
+        self.assertEqual(self.found('photo*'), {'plants'})
+        self.assertEqual(self.found('* ^ ( ) :'), set())
+        self.assertEqual(search_submissions('*', self.teacher.id), ([], False))
+
+    def test_snippet_is_escaped_and_highlighted(self):
+        hits, _ = search_submissions('chloroplast', self.teacher.id)
+        self.assertIn('&lt;b&gt;<mark>chloroplast</mark>&lt;/b&gt;', hits[0].snippet)
+
+
+@override_settings(CACHES=TEST_CACHES, MEDIA_ROOT=tempfile.mkdtemp())
+class SimilarityTests(TestCase):
+    """Near duplicates within an assignment are matched; unrelated texts and other assignments are not."""
+
+    def setUp(self):
+        rng = random.Random(17)
+        self.text = [f'word{rng.randrange(5000)}' for _ in range(400)]
+        self.unrelated = [f'word{rng.randrange(5000)}' for _ in range(400)]
+        teacher = User.objects.create_user('teacher')
+        self.assignment, self.other_assignment = make_assignment(teacher), make_assignment(teacher, title='Other')
+        self.count = 0
+
+    def index(self, words, assignment=None):
+        self.count += 1
+        student = User.objects.create_user(f'student{self.count}')
+        submission = make_submission(assignment or self.assignment, student, b'essay %d' % self.count)
+        return submission, index_submission(submission, minhash_signature(' '.join(words)))
+
+    def test_near_duplicate_is_matched(self):
+        original, _ = self.index(self.text)
+        copy = list(self.text)
+        copy[100], copy[300] = 'changed', 'words'
+        duplicate, matches = self.index(copy)
+
+        self.assertEqual([match.matched_id for match in matches], [original.id])
+        self.assertGreaterEqual(matches[0].similarity, SIMILARITY_THRESHOLD)
+        found = similarity_matches([original.id, duplicate.id])
+        self.assertEqual([username for _, username in found[original.id]], [duplicate.student.username])
+        self.assertEqual([username for _, username in found[duplicate.id]], [original.student.username])
+
+    def test_unrelated_text_is_not_matched(self):
+        self.index(self.text)
+        self.assertEqual(self.index(self.unrelated)[1], [])
+        self.assertFalse(SimilarityMatch.objects.exists())
+
+    def test_other_assignment_is_not_matched(self):
+        self.index(self.text)
+        self.assertEqual(self.index(self.text, self.other_assignment)[1], [])
+
+    def test_estimate_is_close_to_jaccard(self):
+        copy = self.text[:300] + self.unrelated[:100]
+        shingles, other = set(shingle_hashes(' '.join(self.text))), set(shingle_hashes(' '.join(copy)))
+        jaccard = len(shingles & other) / len(shingles | other)
+        estimate = estimate_similarity(minhash_signature(' '.join(self.text)), minhash_signature(' '.join(copy)))
+        self.assertAlmostEqual(estimate, jaccard, delta=0.1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SubmissionPaginationTests(TestCase):
+    """Walking the pages of the submissions list must visit every submission once."""
+
+    def test_every_sort_visits_every_row(self):
+        cache.clear()
+        teacher = User.objects.create_user('teacher')
+        teacher.groups.add(Group.objects.get_or_create(name='TEACHER')[0])
+        Teacher.objects.create(user=teacher, address='x', mobile='1', status=True)
+        student = User.objects.create_user('student')
+        assignments = Assignment.objects.bulk_create([
+            Assignment(title=f'Essay {n}', description='d', due_date=timezone.now(), required_keywords='a',
+                       created_by=teacher)
+            for n in range(2)
+        ])
+        total = LIST_PAGE_SIZE * 2 + 7
+        submissions = Submission.objects.bulk_create([
+            Submission(assignment=assignments[n % 2], student=student, file='submissions/essay.docx')
+            for n in range(total)
+        ])
+        # Many rows within one millisecond, as bulk-created rows are
+        base = timezone.now().replace(microsecond=0)
+        for n, submission in enumerate(submissions):
+            submission.submitted_at = base + timedelta(microseconds=n // 3)
+        Submission.objects.bulk_update(submissions, ['submitted_at'])
+
+        self.client.force_login(teacher)
+        for sort, label, ordering in SUBMISSION_SORTS:
+            with self.subTest(sort=sort):
+                seen = []
+                url = f'/teacher/teacher-view-submissions?sort={sort}'
+                while url:
+                    # A cursor that loses precision can revisit rows forever
+                    self.assertLessEqual(len(seen), total)
+                    response = self.client.get(url)
+                    seen += [submission.id for submission in response.context['submissions']]
+                    next_url = response.context['page'].next_url
+                    url = f'/teacher/teacher-view-submissions{next_url}' if next_url else None
+                self.assertEqual(len(seen), total)
+                self.assertEqual(set(seen), {submission.id for submission in submissions})
+
+
+def legacy_grade(text, ext, required_keywords):
+    """validate_submission before rubrics, as DEFAULT_RUBRIC must reproduce it."""
+    grade = 0
+    feedback = ""
+    if ext not in ['.pdf', '.docx']:
+        feedback += "Unsupported file format. Only PDF and DOCX files are allowed. "
+    else:
+        grade += 1
+    word_count = len(text.split())
+    if word_count >= 500:
+        grade += 1
+        feedback += f"Word count is sufficient ({word_count} words). "
+    else:
+        feedback += f"Word count is below 500. Current count: {word_count}. "
+        return grade, feedback
+    missing_keywords = compile_keywords(required_keywords).missing(text)
+    if not missing_keywords:
+        grade += 2
+        feedback += "All required keywords are present. "
+    else:
+        feedback += f"Missing keywords: {', '.join(missing_keywords)}. "
+    if grade <= 4:
+        grade += 1
+    return grade, feedback
+
+
+class RubricTests(SimpleTestCase):
+
+    def evaluate(self, criteria, text, ext='.docx', marks=10, keywords=()):
+        return parse_rubric({'criteria': criteria}, keywords).evaluate(text, ext, marks)
+
+    def test_default_rubric_matches_legacy_grading(self):
+        keywords = 'alpha,beta gamma'
+        long_text = ' '.join(['word'] * 600)
+        cases = [
+            (long_text + ' alpha\nbeta gamma', '.docx'),
+            (long_text + ' alpha', '.pdf'),
+            (long_text, '.docx'),
+            ('alpha beta gamma', '.docx'),
+            # extract_text() gives no text for other formats
+            ('', '.txt'),
+        ]
+        evaluator = parse_rubric(DEFAULT_RUBRIC, keywords.split(','))
+        for text, ext in cases:
+            with self.subTest(text=text[-20:], ext=ext):
+                grade, feedback = legacy_grade(text, ext, keywords)
+                new_grade, new_feedback, rejected = evaluator.evaluate(text, ext, 5)
+                # The old grading rejected (deleted) submissions graded 1 or less
+                self.assertEqual(rejected, grade <= 1)
+                self.assertEqual(new_feedback, feedback)
+                if not rejected:
+                    self.assertEqual(new_grade, grade)
+
+    def test_word_count_bands(self):
+        criteria = [{'type': 'word_count', 'bands': [[100, 1], [500, 3]]}]
+        self.assertEqual(self.evaluate(criteria, 'w ' * 50, marks=3)[0], 0)
+        self.assertEqual(self.evaluate(criteria, 'w ' * 200, marks=3)[0], 1)
+        self.assertEqual(self.evaluate(criteria, 'w ' * 600, marks=3)[0], 3)
+
+    def test_keyword_weights(self):
+        criteria = [{'type': 'keywords', 'weights': {'alpha': 2, 'beta': 1}}]
+        self.assertEqual(self.evaluate(criteria, 'alpha only', marks=3)[:1], (2,))
+        self.assertEqual(self.evaluate(criteria, 'beta and alpha', marks=3)[0], 3)
+
+    def test_zero_points_is_not_rejected(self):
+        criteria = [{'type': 'keywords', 'weights': {'alpha': 2, 'beta': 1}}]
+        self.assertEqual(self.evaluate(criteria, 'nothing relevant'), (0, "Missing keywords: alpha, beta. ", False))
+        self.assertFalse(self.evaluate([{'type': 'points', 'points': 0}], 'text')[2])
+
+    def test_required_criterion_rejects(self):
+        criteria = [{'type': 'word_count', 'bands': [[100, 1]], 'required': True}, {'type': 'points', 'points': 5}]
+        grade, feedback, rejected = self.evaluate(criteria, 'too short')
+        self.assertTrue(rejected)
+        self.assertEqual(grade, 0)
+
+    def test_headings(self):
+        criteria = [{'type': 'headings', 'headings': ['Introduction', 'Method', 'Conclusion'], 'points': 3}]
+        text = "1. Introduction\nSome text about the method used here.\nII CONCLUSION\n"
+        grade, feedback, rejected = self.evaluate(criteria, text, marks=3)
+        self.assertEqual(grade, 2)
+        self.assertEqual(feedback, "Missing headings: Method. ")
+
+    def test_malformed_rubrics(self):
+        for rubric in [[], {'criteria': [{'type': 'unknown'}]}, {'criteria': [{'type': 'word_count'}]},
+                       {'criteria': [{'type': 'keywords', 'weights': {'a': 'heavy'}}]}]:
+            with self.subTest(rubric=rubric), self.assertRaises(RubricError):
+                parse_rubric(rubric)
@@ -1,76 +1,473 @@
+import hashlib
 import os
+import re
+import signal
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from xml.etree import ElementTree
 import PyPDF2
-import docx
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 
-def validate_submission(file_path, assignment):
-    allowed_extensions = ['.pdf', '.docx']
-    _, ext = os.path.splitext(file_path)
-    grade = 0
-    feedback = ""
+from exam.profiling import profile_section
+from exam.utils import delete_in_chunks
+from .models import DeferredFileDeletion, GradingJob, Submission
+from .search import index_submission_text
+from .similarity import forget_submission, index_submission, minhash_signature
+from .storage import digest_from_name, submission_storage
+
+GRADING_MAX_ATTEMPTS = 3
+
+# Bump when the extractors change, so text cached by the old ones is not reused
+TEXT_CACHE_VERSION = 2
+TEXT_CACHE_SUFFIX = f'.v{TEXT_CACHE_VERSION}.txt.z'
+# Evict down to this share of SUBMISSION_TEXT_CACHE_MAX_BYTES, so eviction is not run on every write
+TEXT_CACHE_LOW_WATER = 0.9
+# Writes of a process between walks of the cache, which pick up what other processes wrote
+TEXT_CACHE_RESCAN_WRITES = 200
+DIGEST_CHUNK_SIZE = 1024 * 1024
+
+# Limits on PDF extraction, so a huge or hostile PDF cannot stall a worker
+PDF_PAGE_TIMEOUT = 5  # seconds per page
+PDF_TOTAL_TIMEOUT = 60  # seconds per document
+PDF_PAGE_MAX_CHARS = 100000
+PDF_MAX_PAGES = 1000
+# What reading a missing or corrupt PDF or DOCX file raises
+EXTRACTION_ERRORS = (
+    OSError, ValueError, KeyError, zipfile.BadZipFile, ElementTree.ParseError, PyPDF2.errors.PyPdfError,
+)
 
-    # 1. File format check
-    if ext.lower() not in allowed_extensions:
-        feedback += "Unsupported file format. Only PDF and DOCX files are allowed. "
-    else:
-        grade += 1  # Award 1 mark for correct file format
+WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+# Parts of a DOCX holding text, after the body: headers, footers, footnotes and endnotes
+DOCX_EXTRA_PARTS_RE = re.compile(r'^word/(header\d*|footer\d*|footnotes|endnotes)\.xml$')
+
+def validate_submission(file_path, assignment):
+    """
+    Grades a submitted file against the assignment's rubric, in one pass over
+    its text. Returns (grade, feedback, rejected); the grade is out of
+    assignment.marks, and `rejected` tells whether a required criterion failed.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
 
     # Extract text based on file type
-    if ext.lower() == '.pdf':
-        text = extract_text_pdf(file_path)
-    elif ext.lower() == '.docx':
-        text = extract_text_docx(file_path)
-    else:
-        text = ""  # Default to empty string if extraction fails
-
-    # 2. Word count check
-    word_count = len(text.split())
-    required_word_count = 500
-    if word_count >= required_word_count:
-        grade += 1  # Award 1 mark for sufficient word count
-        feedback += f"Word count is sufficient ({word_count} words). "
-    else:
-        feedback += f"Word count is below {required_word_count}. Current count: {word_count}. "
-        return grade, feedback  # Early exit to allow resubmission
-
-    # 3. Keyword check
-    keywords = assignment.get_required_keywords_list()
-    keyword_present = all(keyword in text.lower() for keyword in keywords)
-    if keyword_present:
-        grade += 2  # Award 2 marks if all required keywords are present
-        feedback += "All required keywords are present. "
-    else:
-        missing_keywords = [kw for kw in keywords if kw not in text.lower()]
-        feedback += f"Missing keywords: {', '.join(missing_keywords)}. "
-
-    # Final mark for other evaluation criteria (discretionary 1 mark)
-    if grade <= 4:
-        grade += 1  # Award 1 discretionary mark if other criteria met
+    with profile_section('extract_text'):
+        text = extract_text(file_path)
 
-    return grade, feedback
+    with profile_section('rubric'):
+        return assignment.rubric_evaluator().evaluate(text, ext, assignment.marks)
 
-def extract_text_pdf(file_path):
+
+def file_digest(file_path):
+    """Returns the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(DIGEST_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stored_digest(file_path):
+    """Returns the SHA-256 of a file, free for content-addressed submission files."""
+    return digest_from_name(file_path) or file_digest(file_path)
+
+
+def _text_cache_path(digest):
+    return os.path.join(settings.SUBMISSION_TEXT_CACHE_DIR, digest[:2], digest + TEXT_CACHE_SUFFIX)
+
+
+def _read_cached_text(digest):
+    path = _text_cache_path(digest)
+    try:
+        with open(path, 'rb') as f:
+            text = zlib.decompress(f.read()).decode('utf-8')
+    except (OSError, zlib.error, UnicodeDecodeError):
+        return None
+    # The modification time orders entries for LRU eviction
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return text
+
+
+class _TextCacheUsage:
+    """
+    This process's estimate of the size of the text cache, so that writes do
+    not walk the whole cache. It adds what the process writes, and is reset to
+    the real size whenever evict_text_cache() walks the cache: once the
+    estimate passes the limit, and every TEXT_CACHE_RESCAN_WRITES writes.
+    """
+
+    def __init__(self):
+        self.bytes = None  # Unknown until the first walk
+        self.writes = 0
+
+
+_text_cache_usage = _TextCacheUsage()
+
+
+def _write_cached_text(digest, text):
+    path = _text_cache_path(digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = zlib.compress(text.encode('utf-8'))
+    # Written under a temporary name and renamed, so readers never see a partial entry
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    usage = _text_cache_usage
+    usage.writes += 1
+    if usage.bytes is not None:
+        usage.bytes += len(data)
+    if (usage.bytes is None or usage.bytes > settings.SUBMISSION_TEXT_CACHE_MAX_BYTES
+            or usage.writes % TEXT_CACHE_RESCAN_WRITES == 0):
+        evict_text_cache()
+
+
+def evict_text_cache(max_bytes=None):
+    """
+    Deletes the least recently used cached texts once the cache is larger than
+    SUBMISSION_TEXT_CACHE_MAX_BYTES, down to TEXT_CACHE_LOW_WATER of it.
+    """
+    max_bytes = max_bytes or settings.SUBMISSION_TEXT_CACHE_MAX_BYTES
+    entries = []
+    total = 0
+    for root, _, names in os.walk(settings.SUBMISSION_TEXT_CACHE_DIR):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    if total <= max_bytes:
+        _text_cache_usage.bytes = total
+        return 0
+
+    evicted = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes * TEXT_CACHE_LOW_WATER:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        evicted += 1
+    _text_cache_usage.bytes = total
+    return evicted
+
+
+def extract_text(file_path):
+    """
+    Returns the text of a PDF or DOCX file, or an empty string for other files.
+    Texts are cached on disk by the SHA-256 of the file, so the same bytes are
+    only parsed once, whichever submission they were uploaded as.
+    """
+    extractor = TEXT_EXTRACTORS.get(os.path.splitext(file_path)[1].lower())
+    if extractor is None:
+        return ""
+    digest = stored_digest(file_path)
+    text = _read_cached_text(digest)
+    if text is None:
+        text = extractor(file_path)
+        try:
+            _write_cached_text(digest, text)
+        except OSError:
+            pass  # The cache is an optimization; grading goes on without it
+    return text
+
+
+class PdfPageTimeout(Exception):
+    pass
+
+
+@contextmanager
+def _time_limit(seconds):
+    """
+    Raises PdfPageTimeout in the block after `seconds`. Only enforced in the
+    main thread (as in the grading worker processes), where SIGALRM can be used.
+    """
+    if not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def timeout(signum, frame):
+        raise PdfPageTimeout
+
+    previous = signal.signal(signal.SIGALRM, timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def iter_pdf_pages(file_path, page_timeout=PDF_PAGE_TIMEOUT, total_timeout=PDF_TOTAL_TIMEOUT,
+                   max_chars=PDF_PAGE_MAX_CHARS, max_pages=PDF_MAX_PAGES):
+    """
+    Yields the text of each page of a PDF. A page taking longer than
+    `page_timeout` to extract is skipped, its text is cut at `max_chars`, and
+    extraction stops after `max_pages` pages or `total_timeout` seconds.
+    """
+    started = time.monotonic()
     with open(file_path, 'rb') as f:
         reader = PyPDF2.PdfReader(f)
-        text = ""
-        for page in reader.pages:
-            extracted = page.extract_text()
+        for number, page in enumerate(reader.pages):
+            if number >= max_pages or time.monotonic() - started > total_timeout:
+                return
+            try:
+                with _time_limit(page_timeout):
+                    extracted = page.extract_text()
+            except PdfPageTimeout:
+                continue
             if extracted:
-                text += extracted + " "
-    return text
+                yield extracted[:max_chars]
+
+
+def extract_text_pdf(file_path):
+    # Joined once, rather than concatenated page by page
+    return " ".join(iter_pdf_pages(file_path))
+
+def iter_docx_xml_paragraphs(part):
+    """
+    Yields the text of every paragraph of a WordprocessingML part, including
+    those in tables. Each top-level element of the part is cleared once read,
+    so memory does not grow with the length of the document.
+    """
+    pieces = []
+    depth = 0
+    container = None
+    for event, elem in ElementTree.iterparse(part, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if depth == 2:
+                container = elem  # w:body, w:hdr, w:ftr, w:footnotes...
+            continue
+        depth -= 1
+        tag = elem.tag
+        if tag == WORD_NS + 't':
+            pieces.append(elem.text or '')
+        elif tag == WORD_NS + 'tab':
+            pieces.append('\t')
+        elif tag in (WORD_NS + 'br', WORD_NS + 'cr'):
+            pieces.append('\n')
+        elif tag == WORD_NS + 'p':
+            yield ''.join(pieces)
+            pieces.clear()
+        if depth == 2 and container is not None:
+            container.clear()
+
+
+def iter_docx_paragraphs(file_path):
+    """Yields the paragraphs of the body of a DOCX file, then of its headers, footers and notes."""
+    with zipfile.ZipFile(file_path) as archive:
+        names = archive.namelist()
+        parts = ['word/document.xml'] + sorted(name for name in names if DOCX_EXTRA_PARTS_RE.match(name))
+        for name in parts:
+            if name in names:
+                with archive.open(name) as part:
+                    yield from iter_docx_xml_paragraphs(part)
+
 
 def extract_text_docx(file_path):
-    doc = docx.Document(file_path)
-    text = "\n".join([para.text for para in doc.paragraphs])
-    return text
+    return "\n".join(iter_docx_paragraphs(file_path))
+
+TEXT_EXTRACTORS = {
+    '.pdf': extract_text_pdf,
+    '.docx': extract_text_docx,
+}
 
 def compare_files(expected_path, uploaded_path):
     """
     Compare the content of the expected solution and uploaded file.
-    For simplicity, this checks byte-by-byte equality.
+    Files are equal when their SHA-256 digests are: taken from the name of
+    content-addressed files, and otherwise hashed in chunks, never read whole.
     You can add more sophisticated logic like comparing text content or applying rules for grading.
     """
     try:
-        with open(expected_path, 'rb') as expected_file, open(uploaded_path, 'rb') as uploaded_file:
-            return expected_file.read() == uploaded_file.read()
-    except Exception as e:
+        return stored_digest(expected_path) == stored_digest(uploaded_path)
+    except OSError:
         return False
+
+
+def enqueue_grading(submission):
+    """
+    Marks a saved submission pending and queues a job for the grade_submissions
+    worker to grade it.
+    """
+    submission.status = Submission.PENDING
+    submission.grade = None
+    submission.feedback = None
+    submission.save(update_fields=['status', 'grade', 'feedback'])
+    # A resubmission replaces the file, so whatever it matched before no longer applies
+    forget_submission(submission.id)
+    return GradingJob.objects.create(
+        submission=submission, assignment_id=submission.assignment_id, student_id=submission.student_id,
+    )
+
+
+def claim_grading_jobs(limit):
+    """
+    Marks up to `limit` queued jobs as running and returns them, oldest first.
+    A job is only ever claimed by one worker.
+    """
+    now = timezone.now()
+    job_ids = list(
+        GradingJob.objects.filter(status=GradingJob.QUEUED).order_by('id').values_list('id', flat=True)[:limit]
+    )
+    GradingJob.objects.filter(id__in=job_ids, status=GradingJob.QUEUED).update(
+        status=GradingJob.RUNNING, started_at=now, attempts=F('attempts') + 1,
+    )
+    return list(
+        GradingJob.objects.filter(id__in=job_ids, status=GradingJob.RUNNING, started_at=now)
+        .select_related('submission', 'assignment')
+        .order_by('id')
+    )
+
+
+def requeue_stale_jobs(timeout):
+    """
+    Requeues running jobs started more than `timeout` ago, whose worker died.
+    Those out of attempts fail, releasing their submission.
+    """
+    stale = GradingJob.objects.filter(status=GradingJob.RUNNING, started_at__lt=timezone.now() - timeout)
+    for job in stale.filter(attempts__gte=GRADING_MAX_ATTEMPTS).select_related('submission'):
+        fail_grading_job(job, "the grader stopped responding")
+    return stale.filter(attempts__lt=GRADING_MAX_ATTEMPTS).update(status=GradingJob.QUEUED)
+
+
+def grade_submission_file(file_path, assignment):
+    """
+    Grades a submitted file and computes the MinHash signature of its text.
+    Returns (grade, feedback, rejected, signature, text); run in the grading
+    worker processes.
+    """
+    grade, feedback, rejected = validate_submission(file_path, assignment)
+    # Served from the text cache filled by validate_submission
+    text = extract_text(file_path)
+    return grade, feedback, rejected, minhash_signature(text), text
+
+
+def regrade_submission_file(file_path, assignment):
+    """
+    Grades a submitted file again, for regrade_assignments. Returns (grade,
+    feedback), or None when the file is missing or cannot be parsed.
+    """
+    try:
+        grade, feedback, rejected = validate_submission(file_path, assignment)
+    except EXTRACTION_ERRORS:
+        return None
+    return grade, feedback
+
+
+def read_submission_text(file_path):
+    """Returns the text of a submitted file for the search index, or None when it is missing or cannot be parsed."""
+    try:
+        return extract_text(file_path)
+    except EXTRACTION_ERRORS:
+        return None
+
+
+def finish_grading_job(job, grade, feedback, rejected=False, signature=None, text=None):
+    """
+    Records the grade of a job on its submission. A rejected submission
+    failed a required criterion and is deleted so the student can submit again;
+    the job keeps its feedback. Graded submissions are checked against the
+    earlier submissions of the assignment for near duplicates, and their
+    text is added to the search index.
+    """
+    with transaction.atomic():
+        job.grade = grade
+        job.feedback = feedback
+        job.finished_at = timezone.now()
+        submission = job.submission
+        if rejected:
+            job.status = GradingJob.REJECTED
+            if submission is not None:
+                submission.delete()
+                job.submission = None
+        else:
+            job.status = GradingJob.GRADED
+            if submission is not None:
+                submission.grade = grade
+                submission.feedback = feedback
+                submission.status = Submission.GRADED
+                submission.save(update_fields=['grade', 'feedback', 'status'])
+                index_submission(submission, signature)
+                if text:
+                    index_submission_text(submission.id, text)
+        job.save()
+
+
+def fail_grading_job(job, error):
+    """
+    Requeues a job whose grading raised, until it runs out of attempts. A job
+    that fails for good deletes its submission, as a rejected one does, so
+    the student can submit again.
+    """
+    job.feedback = f"Grading failed: {error}"
+    if job.attempts < GRADING_MAX_ATTEMPTS:
+        job.status = GradingJob.QUEUED
+        job.save(update_fields=['status', 'feedback'])
+        return
+    with transaction.atomic():
+        job.status = GradingJob.FAILED
+        job.finished_at = timezone.now()
+        if job.submission is not None:
+            job.submission.delete()
+            job.submission = None
+        job.save(update_fields=['status', 'feedback', 'finished_at', 'submission'])
+
+
+def _defer_submission_files(submission_ids):
+    DeferredFileDeletion.objects.bulk_create([
+        DeferredFileDeletion(name=name)
+        for name in Submission.objects.filter(id__in=submission_ids).exclude(file='').values_list('file', flat=True)
+    ])
+
+
+def delete_submissions(queryset):
+    """
+    Deletes submissions in chunks, leaving their files to collect_deleted_files.
+    Returns the number of submissions deleted.
+    """
+    return delete_in_chunks(queryset, on_chunk=_defer_submission_files)
+
+
+def delete_assignment(assignment):
+    """Deletes an assignment, its submissions first and in chunks."""
+    delete_submissions(assignment.submissions.all())
+    assignment.delete()
+
+
+def collect_deleted_files(limit):
+    """
+    Releases up to `limit` files queued by bulk deletes from storage, which
+    removes each from disk once no submission refers to it. Returns how many.
+    """
+    storage = submission_storage()
+    queued = list(DeferredFileDeletion.objects.order_by('id')[:limit])
+    for entry in queued:
+        try:
+            storage.delete(entry.name)
+        except OSError:
+            pass  # Already gone; sweep_orphan_files reports anything left behind
+    DeferredFileDeletion.objects.filter(id__in=[entry.id for entry in queued]).delete()
+    return len(queued)
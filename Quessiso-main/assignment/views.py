@@ -2,22 +2,32 @@ import os
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, JsonResponse
+from urllib.parse import urlencode
 from django.utils import timezone
-from .models import Assignment, Submission
+from .models import Assignment, GradingJob, Submission
 from .forms import AssignmentForm, SubmissionForm
-from .utils import validate_submission
+from .search import search_submissions
+from .similarity import similarity_matches
+from .utils import delete_assignment, enqueue_grading
 from student.models import Student
+from exam.utils import STUDENT, TEACHER, keyset_page, resolve_role
+
+SUBMISSION_SORTS = [
+    ('newest', 'Newest first', ('-submitted_at',)),
+    ('oldest', 'Oldest first', ('submitted_at',)),
+    ('assignment', 'Assignment', ('assignment__title', 'submitted_at')),
+]
 
 # Helper functions to check user roles
 def is_admin(user):
     return user.is_superuser
 
 def is_teacher(user):
-    return user.groups.filter(name='TEACHER').exists()
+    return resolve_role(user).name == TEACHER
 
 def is_student(user):
-    return not user.is_staff and not user.is_superuser
+    return resolve_role(user).name == STUDENT
 
 # -----------------------
 # Admin Views
@@ -66,7 +76,7 @@ def admin_delete_assignment_view(request, pk):
     try:
         assignment = get_object_or_404(Assignment, id=pk, created_by=request.user)
         print(assignment)  # Debug: Check if the assignment is being retrieved correctly
-        assignment.delete()
+        delete_assignment(assignment)
         messages.success(request, "Assignment deleted successfully!")
     except Exception as e:
         print(f"Error: {e}")  # Debug any potential errors
@@ -78,7 +88,7 @@ def admin_view_student_grades_view(request):
     """
     Lists all students for viewing assignment marks.
     """
-    students = Student.objects.all()
+    students = Student.objects.select_related('user')
     return render(request, 'exam/admin_view_student_grades.html', {'students': students})
 
 
@@ -164,7 +174,7 @@ def teacher_delete_assignment_view(request, pk):
     try:
         assignment = get_object_or_404(Assignment, id=pk, created_by=request.user)
         print(assignment)  # Debug: Check if the assignment is being retrieved correctly
-        assignment.delete()
+        delete_assignment(assignment)
         messages.success(request, "Assignment deleted successfully!")
     except Exception as e:
         print(f"Error: {e}")  # Debug any potential errors
@@ -175,10 +185,57 @@ def teacher_delete_assignment_view(request, pk):
 @user_passes_test(is_teacher)
 def teacher_view_submissions_view(request):
     """
-    Allows teachers to view submissions for their assignments.
+    Allows teachers to view submissions for their assignments, with the
+    other submissions each one nearly duplicates.
+    """
+    submissions = (
+        Submission.objects.filter(assignment__created_by=request.user)
+        .select_related('assignment', 'student')
+        .only('file', 'submitted_at', 'grade', 'feedback', 'assignment__title', 'student__username')
+    )
+    page = keyset_page(request, submissions, SUBMISSION_SORTS, ('assignment__title', 'student__username'))
+    matches = similarity_matches([submission.id for submission in page.items])
+    for submission in page.items:
+        submission.matches = matches[submission.id]
+    return render(request, 'teacher/teacher_view_submissions.html', {'submissions': page.items, 'page': page})
+
+@login_required(login_url='teacherlogin')
+@user_passes_test(is_teacher)
+def teacher_search_submissions_view(request):
+    """
+    Full-text search over the submissions to the teacher's assignments,
+    best matches first, with the matched words highlighted.
     """
-    submissions = Submission.objects.filter(assignment__created_by=request.user).order_by('-submitted_at')
-    return render(request, 'teacher/teacher_view_submissions.html', {'submissions': submissions})
+    query = request.GET.get('q', '').strip()
+    assignments = list(Assignment.objects.filter(created_by=request.user).order_by('-created_at').only('id', 'title'))
+    assignment_id = request.GET.get('assignment')
+    assignment_id = int(assignment_id) if assignment_id and assignment_id.isdigit() else None
+    if assignment_id not in {assignment.id for assignment in assignments}:
+        assignment_id = None
+    page = request.GET.get('page', '')
+    page = max(int(page), 1) if page.isdigit() else 1
+
+    hits, has_next = search_submissions(query, request.user.id, assignment_id, page) if query else ([], False)
+    submissions = (
+        Submission.objects.filter(id__in=[hit.submission_id for hit in hits])
+        .select_related('assignment', 'student')
+        .only('file', 'submitted_at', 'grade', 'assignment__title', 'student__username')
+        .in_bulk()
+    )
+    results = [(submissions[hit.submission_id], hit.snippet) for hit in hits if hit.submission_id in submissions]
+
+    def page_url(number):
+        return '?' + urlencode({'q': query, 'assignment': assignment_id or '', 'page': number})
+
+    return render(request, 'teacher/teacher_search_submissions.html', {
+        'query': query,
+        'assignments': assignments,
+        'assignment_id': assignment_id,
+        'results': results,
+        'page': page,
+        'previous_url': page_url(page - 1) if page > 1 else None,
+        'next_url': page_url(page + 1) if has_next else None,
+    })
 
 # -----------------------
 # Student Views
@@ -204,6 +261,8 @@ def upload_submission_view(request, pk):
     If the due date has passed, they will be informed that the due date has passed, 
     and they can no longer submit. Students can only resubmit if their submission fails
     due to invalid file format or insufficient word count.
+    Uploads are graded in the background by the grade_submissions command; the page
+    polls grading_status_view until the grade is ready.
     """
     assignment = get_object_or_404(Assignment, id=pk)
     student = request.user
@@ -216,16 +275,24 @@ def upload_submission_view(request, pk):
 
     # Check if the student has already submitted this assignment
     submission = Submission.objects.filter(student=student, assignment=assignment).first()
-    if submission and submission.grade is not None and submission.grade > 0:
+    if submission and submission.status == Submission.GRADED:
         messages.info(request, "You have already submitted this assignment and received a grade.")
         return redirect('view-assignment-results')
 
-    if request.method == 'POST':
+    job = GradingJob.objects.filter(student=student, assignment=assignment).order_by('-id').first()
+    if submission and submission.status == Submission.PENDING:
+        # Wait for the queued grading before accepting another upload
+        if request.method == 'POST':
+            messages.info(request, "Your previous upload is still being graded.")
+        form = SubmissionForm()
+    elif request.method == 'POST':
         form = SubmissionForm(request.POST, request.FILES)
         if form.is_valid():
             # Handle new or resubmission case
             file = form.cleaned_data['file']
             if submission:
+                # Release the replaced upload before taking the new one
+                submission.file.delete(save=False)
                 submission.file = file
                 submission.submitted_at = timezone.now()
             else:
@@ -235,30 +302,32 @@ def upload_submission_view(request, pk):
 
             submission.save()
 
-            # Perform validation and grading
-            file_path = submission.file.path
-            grade, feedback = validate_submission(file_path, assignment)
-
-            submission.grade = grade
-            submission.feedback = feedback
-            submission.save()
-
-            print(f"DEBUG: Grade = {grade}, Feedback = {feedback}")
-
-            # Allow resubmission only if file format or word count is insufficient
-            if grade <= 1.0:
-                messages.error(request, f"Assignment validation failed: {feedback}")
-                Submission.objects.filter(student=student, assignment=assignment).delete()
-                return render(request, 'student/upload_submission.html', {'form': form, 'assignment': assignment})
-
-            messages.success(request, f"Assignment submitted and graded successfully! Grade: {grade}/5")
-            return redirect('student-assignment-view')
+            # Validation and grading happen off the request; a failed validation
+            # deletes the submission when the job finishes, allowing a retry
+            enqueue_grading(submission)
+            messages.info(request, "Assignment submitted. It is being graded, this page will show your grade shortly.")
+            return redirect('upload-submission', pk=assignment.id)
         else:
             messages.error(request, "There was an error uploading the assignment.")
     else:
         form = SubmissionForm()
 
-    return render(request, 'student/upload_submission.html', {'form': form, 'assignment': assignment})
+    return render(request, 'student/upload_submission.html', {'form': form, 'assignment': assignment, 'job': job})
+
+
+@login_required(login_url='studentlogin')
+@user_passes_test(is_student)
+def grading_status_view(request, pk):
+    """
+    Returns the status of one of the student's grading jobs, polled by the
+    upload page until the grade is ready.
+    """
+    job = GradingJob.objects.filter(id=pk, student=request.user).values('status', 'grade', 'feedback').first()
+    if job is None:
+        return JsonResponse({'error': "No such grading job."}, status=404)
+    return JsonResponse(job)
+
+
 @login_required(login_url='studentlogin')
 @user_passes_test(is_student)
 def check_submission_view(request, pk):
@@ -273,7 +342,7 @@ def check_submission_view(request, pk):
 @user_passes_test(is_student)
 def my_marks_view(request):
     student = request.user  
-    submissions = Submission.objects.filter(student=student).order_by('-submitted_at')  # For assignment submissions
+    submissions = Submission.objects.filter(student=student).select_related('assignment').order_by('-submitted_at')  # For assignment submissions
 
     context = {
         'submissions': submissions
@@ -1,6 +1,8 @@
 from django import forms
 from django.contrib.auth.models import User
+import os
 from . import models
+from .utils import QUESTION_BANK_FORMATS
 
 
 class ContactusForm(forms.Form):
@@ -25,12 +27,13 @@ class TeacherSalaryForm(forms.Form):
 class CourseForm(forms.ModelForm):
     class Meta:
         model=models.Course
-        fields=['course_name','question_number','total_marks','duration']
+        fields=['course_name','question_number','total_marks','duration','shuffle_options']
         widgets = {
             'course_name': forms.TextInput(attrs={'class': 'form-control'}),
             'question_number': forms.NumberInput(attrs={'class': 'form-control'}),
             'total_marks': forms.NumberInput(attrs={'class': 'form-control'}),
             'duration': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Duration in minutes'}),
+            'shuffle_options': forms.CheckboxInput(),
         }
 
 class QuestionForm(forms.ModelForm):
@@ -44,3 +47,22 @@ class QuestionForm(forms.ModelForm):
         widgets = {
             'question': forms.Textarea(attrs={'rows': 3, 'cols': 50})
         }
+
+class QuestionRowForm(forms.ModelForm):
+    # validates one row of an imported question bank
+    class Meta:
+        model=models.Question
+        fields=['marks','question','option1','option2','option3','option4','answer']
+
+class QuestionBankForm(forms.Form):
+    courseID=forms.ModelChoiceField(queryset=models.Course.objects.all(),empty_label="Course Name", to_field_name="id")
+    file=forms.FileField(
+        help_text="CSV with a header row, or JSON Lines, with the columns marks, question, option1-option4 and answer (Option1-Option4)",
+        widget=forms.ClearableFileInput(attrs={'accept': '.csv,.jsonl'})
+    )
+
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        if os.path.splitext(file.name)[1].lower() not in QUESTION_BANK_FORMATS:
+            raise forms.ValidationError("Unsupported file extension. Please upload a CSV or JSONL file.")
+        return file
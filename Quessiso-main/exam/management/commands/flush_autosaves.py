@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from exam.utils import cache_is_shared, flush_autosaves
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes buffered exam autosaves to the database. Run it against the same "
+        "shared cache (e.g. Memcached or Redis) as the web workers."
+    )
+
+    def handle(self, *args, **options):
+        if not cache_is_shared():
+            self.stdout.write("The default cache is not shared, so autosaves are written straight to the database.")
+            return
+        written = flush_autosaves()
+        self.stdout.write(self.style.SUCCESS(f"Flushed autosaved answers of {written} attempts."))
@@ -0,0 +1,37 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from exam.models import Course
+from exam.utils import QUESTION_BANK_FORMATS, import_questions
+
+
+class Command(BaseCommand):
+    help = "Imports a CSV or JSONL question bank into a course."
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id', type=int)
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=sorted(set(QUESTION_BANK_FORMATS.values())),
+                            help="Defaults to the file extension.")
+
+    def handle(self, *args, **options):
+        try:
+            course = Course.objects.get(id=options['course_id'])
+        except Course.DoesNotExist:
+            raise CommandError(f"Course {options['course_id']} does not exist.")
+
+        format = options['format'] or QUESTION_BANK_FORMATS.get(os.path.splitext(options['path'])[1].lower())
+        if format is None:
+            raise CommandError("Unknown file format, pass --format.")
+
+        with open(options['path'], encoding='utf-8-sig', newline='') as lines:
+            created, failed, errors = import_questions(lines, format, course)
+
+        for line_number, error in errors:
+            self.stderr.write(f"Line {line_number}: {error}")
+        if failed > len(errors):
+            self.stderr.write(f"... and {failed - len(errors)} more invalid rows.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {created} questions into {course.course_name}, {failed} rows skipped."
+        ))
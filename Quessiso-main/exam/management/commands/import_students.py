@@ -0,0 +1,27 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from exam.utils import ROSTER_BATCH_SIZE, import_roster
+
+
+class Command(BaseCommand):
+    help = (
+        "Registers the students of a CSV roster (username, first_name, last_name, password, address, "
+        "mobile), hashing their passwords in a pool of worker processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of hashing processes.")
+        parser.add_argument('--batch-size', type=int, default=ROSTER_BATCH_SIZE, help="Students created per batch.")
+
+    def handle(self, *args, **options):
+        with open(options['path'], encoding='utf-8-sig', newline='') as lines:
+            created, failed, errors = import_roster(lines, options['workers'], options['batch_size'])
+
+        for line_number, error in errors:
+            self.stderr.write(f"Line {line_number}: {error}")
+        if failed > len(errors):
+            self.stderr.write(f"... and {failed - len(errors)} more skipped rows.")
+        self.stdout.write(self.style.SUCCESS(f"Registered {created} students, {failed} rows skipped."))
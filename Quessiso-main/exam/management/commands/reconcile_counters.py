@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from exam.utils import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = "Recounts the dashboard counters and corrects any drift."
+
+    def handle(self, *args, **options):
+        drifted = reconcile_counters()
+        for name, stored, value in sorted(drifted):
+            self.stdout.write(f"{name}: {stored} -> {value}")
+        self.stdout.write(self.style.SUCCESS(f"Corrected {len(drifted)} counters."))
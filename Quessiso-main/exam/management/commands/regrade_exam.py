@@ -0,0 +1,77 @@
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from exam.models import Course, ExamAttempt, ExamResponse
+from exam.utils import build_answer_key
+
+
+def score_batch(batch, key_ids, key_answers, key_marks):
+    """
+    Returns the marks of every (attempt_id, marks_obtained, question_ids, answers)
+    row of `batch` against the answer key arrays, computed for the whole batch at once.
+    """
+    lengths = np.fromiter((len(row[3]) for row in batch), dtype=np.int64, count=len(batch))
+    question_ids = np.frombuffer(b''.join(bytes(row[2]) for row in batch), dtype=np.int32)
+    answers = np.frombuffer(b''.join(bytes(row[3]) for row in batch), dtype=np.uint8)
+    if len(key_ids) == 0 or len(answers) == 0:
+        return np.zeros(len(batch), dtype=np.int64)
+
+    # Row of each answer within the batch, and position of its question in the key
+    owner = np.repeat(np.arange(len(batch)), lengths)
+    position = np.minimum(np.searchsorted(key_ids, question_ids), len(key_ids) - 1)
+    correct = (key_ids[position] == question_ids) & (answers != 0) & (key_answers[position] == answers)
+    marks = np.bincount(owner[correct], weights=key_marks[position[correct]], minlength=len(batch))
+    return marks.astype(np.int64)
+
+
+class Command(BaseCommand):
+    help = "Re-grades every completed attempt of a course from its stored responses."
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id', type=int)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        try:
+            course = Course.objects.get(id=options['course_id'])
+        except Course.DoesNotExist:
+            raise CommandError(f"Course {options['course_id']} does not exist.")
+        batch_size = options['batch_size']
+
+        # Built from the questions as they are now, not from a cached key the fix may not have reached
+        answer_key = build_answer_key(course.id)
+        key_ids = np.asarray(answer_key.question_ids, dtype=np.int32)
+        key_answers = np.asarray(answer_key.answers, dtype=np.uint8)
+        key_marks = np.asarray(answer_key.marks, dtype=np.int64)
+
+        responses = (
+            ExamResponse.objects
+            .filter(attempt__exam=course, attempt__completed=True)
+            .order_by('attempt_id')
+            .values_list('attempt_id', 'attempt__marks_obtained', 'question_ids', 'answers')
+        )
+
+        graded = changed = 0
+        last_id = 0
+        # Walk the attempts by primary key so the writes never disturb an open cursor
+        while True:
+            batch = list(responses.filter(attempt_id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            marks = score_batch(batch, key_ids, key_answers, key_marks)
+            attempts = [
+                ExamAttempt(id=row[0], marks_obtained=int(mark))
+                for row, mark in zip(batch, marks)
+                if row[1] != mark
+            ]
+            with transaction.atomic():
+                ExamAttempt.objects.bulk_update(attempts, ['marks_obtained'], batch_size=batch_size)
+            graded += len(batch)
+            changed += len(attempts)
+            self.stdout.write(f"Re-graded {graded} attempts ({changed} changed)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-graded {graded} attempts of {course.course_name}, {changed} marks changed."
+        ))
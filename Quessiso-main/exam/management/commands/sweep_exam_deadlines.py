@@ -0,0 +1,58 @@
+import heapq
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from exam.models import ExamAttempt
+from exam.utils import AUTOSAVE_FLUSH_INTERVAL, cache_is_shared, finalize_attempts, flush_autosaves
+
+
+class Command(BaseCommand):
+    help = "Finalizes exam attempts whose time is up, grading them from their autosaved answers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=5, help="Seconds to sleep when nothing is due.")
+        parser.add_argument('--grace', type=int, default=60, help="Seconds allowed past the deadline for late submits.")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--once', action='store_true', help="Finalize what is due now and exit.")
+
+    def handle(self, *args, **options):
+        # Autosaves buffered in a shared cache are written out while the sweeper runs
+        buffered = cache_is_shared()
+        next_flush = 0
+        grace = timedelta(seconds=options['grace'])
+        batch_size = options['batch_size']
+        deadlines = []  # heap of (deadline, attempt id)
+        last_id = 0
+
+        while True:
+            # Only attempts started since the last pass are read, through the in-progress index
+            new_attempts = (
+                ExamAttempt.objects.filter(id__gt=last_id, completed=False)
+                .order_by('id')
+                .values_list('id', 'attempt_time', 'exam__duration')
+            )
+            for attempt_id, attempt_time, duration in new_attempts:
+                heapq.heappush(deadlines, (attempt_time + timedelta(minutes=duration) + grace, attempt_id))
+                last_id = attempt_id
+
+            if buffered and time.monotonic() >= next_flush:
+                flush_autosaves()
+                next_flush = time.monotonic() + AUTOSAVE_FLUSH_INTERVAL
+
+            now = timezone.now()
+            due = {}
+            while deadlines and deadlines[0][0] <= now and len(due) < batch_size:
+                deadline, attempt_id = heapq.heappop(deadlines)
+                due[attempt_id] = deadline - grace
+            if due:
+                finalized = finalize_attempts(due)
+                self.stdout.write(f"Finalized {finalized} expired attempts.")
+
+            if deadlines and deadlines[0][0] <= now:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
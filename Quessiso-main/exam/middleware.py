@@ -0,0 +1,50 @@
+import random
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .profiling import RequestProfile, configure_slow_request_log, install_template_timer, log_slow_request
+from .utils import resolve_role
+
+
+class RoleMiddleware:
+    """
+    Sets request.role (a UserRole) and request.profile (the user's Student or
+    Teacher, or None), resolved once per user and cached.
+    Must come after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.role = resolve_role(request.user)
+        request.profile = request.role.profile
+        return self.get_response(request)
+
+
+class ProfilingMiddleware:
+    """
+    Times the SQL, template rendering and profile_section() blocks of each
+    request and reports them in a Server-Timing header. Requests slower than
+    REQUEST_PROFILING_SLOW_MS are sampled into the JSON slow-request log.
+    Only active when REQUEST_PROFILING is set; put it first in MIDDLEWARE.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_seconds = settings.REQUEST_PROFILING_SLOW_MS / 1000
+        self.sample_rate = settings.REQUEST_PROFILING_SAMPLE_RATE
+        install_template_timer()
+        configure_slow_request_log()
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        with profile.activate():
+            response = self.get_response(request)
+        response['Server-Timing'] = profile.server_timing()
+        if profile.elapsed >= self.slow_seconds and random.random() < self.sample_rate:
+            log_slow_request(request, response, profile)
+        return response
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0007_auto_20241013_1132'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamResponse',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_ids', models.BinaryField()),
+                ('answers', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('attempt', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='response', to='exam.examattempt')),
+            ],
+        ),
+    ]
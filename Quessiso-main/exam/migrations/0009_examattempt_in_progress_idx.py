@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0008_examresponse'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='examattempt',
+            index=models.Index(condition=models.Q(('completed', False)), fields=['id'], name='exam_attempt_in_progress_idx'),
+        ),
+    ]
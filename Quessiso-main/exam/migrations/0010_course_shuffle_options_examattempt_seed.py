@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:15
+
+from django.db import migrations, models
+import exam.utils
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0009_examattempt_in_progress_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='shuffle_options',
+            field=models.BooleanField(default=False, help_text='Show the options of each question in a per-student order'),
+        ),
+        migrations.AddField(
+            model_name='examattempt',
+            name='seed',
+            field=models.PositiveIntegerField(default=exam.utils.new_attempt_seed),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0011_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examattempt',
+            name='question_ids',
+            field=models.BinaryField(null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:32
+
+from array import array
+
+from django.db import migrations, models
+
+
+def bound_drawn_papers(apps, schema_editor):
+    # Attempts that stored their drawn questions keep later questions off their paper
+    ExamAttempt = apps.get_model('exam', 'ExamAttempt')
+    attempts = []
+    for attempt in ExamAttempt.objects.filter(question_ids__isnull=False).only('id', 'question_ids').iterator():
+        question_ids = array('i')
+        question_ids.frombytes(bytes(attempt.question_ids))
+        if question_ids:
+            attempt.question_bound = max(question_ids)
+            attempts.append(attempt)
+    ExamAttempt.objects.bulk_update(attempts, ['question_bound'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0012_examattempt_question_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examattempt',
+            name='question_bound',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(bound_drawn_papers, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='examattempt',
+            name='question_ids',
+        ),
+    ]
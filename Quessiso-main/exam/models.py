@@ -1,12 +1,22 @@
 # models.py
 from django.db import models
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
 from student.models import Student
+from teacher.models import Teacher
+from assignment.models import Assignment
+from .utils import (
+    adjust_counter, assignment_counter, bump_question_set_version, invalidate_role,
+    new_attempt_seed, refresh_counter
+)
 
 class Course(models.Model):
     course_name = models.CharField(max_length=50)
     question_number = models.PositiveIntegerField()
     total_marks = models.PositiveIntegerField()
     duration = models.PositiveIntegerField(help_text="Duration of the exam in minutes",default=30)  # New Field
+    shuffle_options = models.BooleanField(default=False, help_text="Show the options of each question in a per-student order")
 
     def __str__(self):
         return self.course_name
@@ -30,6 +40,12 @@ class Question(models.Model):
     def __str__(self):
         return self.question
 
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_question_set(sender, instance, **kwargs):
+    # Anything cached per course (answer key, ...) is keyed by this version
+    bump_question_set_version(instance.course_id)
+
 class ExamAttempt(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='exam_attempts')
     exam = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='attempts')
@@ -37,10 +53,115 @@ class ExamAttempt(models.Model):
     completed = models.BooleanField(default=False)
     marks_obtained = models.PositiveIntegerField(null=True, blank=True)
     submission_time = models.DateTimeField(null=True, blank=True)  # Optional: Track submission time
+    seed = models.PositiveIntegerField(default=new_attempt_seed)  # Reproduces the drawn paper
+    # The course's highest question id when the attempt started; questions added since are
+    # left off its paper (exam.utils.draw_exam_paper). Null for attempts started before it was kept
+    question_bound = models.PositiveIntegerField(null=True, editable=False)
 
     class Meta:
         unique_together = ('student', 'exam')  # Ensures one attempt per student per exam
+        indexes = [
+            # Lets the deadline sweeper find in-progress attempts without a full table scan
+            models.Index(fields=['id'], condition=models.Q(completed=False), name='exam_attempt_in_progress_idx'),
+        ]
 
     def __str__(self):
         status = 'Completed' if self.completed else 'In Progress'
         return f"{self.student} - {self.exam} - {status}"
+
+class ExamResponse(models.Model):
+    """
+    Answers of an exam attempt packed into a single row: the question ids
+    and the selected option indexes (0 for unanswered), aligned by position.
+    """
+    attempt = models.OneToOneField(ExamAttempt, on_delete=models.CASCADE, related_name='response')
+    question_ids = models.BinaryField()
+    answers = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Responses for {self.attempt}"
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_group_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # user.groups changed
+        if action.startswith('post_'):
+            invalidate_role(instance.pk)
+    elif action in ('post_add', 'post_remove'):
+        # group.user_set changed: pk_set holds the users
+        for user_id in pk_set:
+            invalidate_role(user_id)
+    elif action == 'pre_clear':
+        for user_id in instance.user_set.values_list('id', flat=True):
+            invalidate_role(user_id)
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+def invalidate_profile_role(sender, instance, **kwargs):
+    # Cached roles hold the profile and the approval status
+    invalidate_role(instance.user_id)
+
+class Counter(models.Model):
+    """
+    Denormalized row count shown on the dashboards, kept up to date by signals
+    (see exam.utils.get_counters) and corrected by the reconcile_counters command.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    value = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+@receiver(post_save, sender=Student)
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Question)
+@receiver(post_save, sender=Assignment)
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        adjust_counter(sender._meta.model_name, 1)
+        if sender is Assignment:
+            adjust_counter(assignment_counter(instance.created_by_id), 1)
+
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Question)
+@receiver(post_delete, sender=Assignment)
+def count_deleted(sender, instance, **kwargs):
+    adjust_counter(sender._meta.model_name, -1)
+    if sender is Assignment:
+        adjust_counter(assignment_counter(instance.created_by_id), -1)
+
+def _teacher_counter(status):
+    return 'teacher' if status else 'pending_teacher'
+
+@receiver(post_init, sender=Teacher)
+def remember_teacher_status(sender, instance, **kwargs):
+    # The approval status the teacher is counted under; None when it was not loaded
+    instance._counted_status = instance.__dict__.get('status') if instance.pk else None
+
+@receiver(post_save, sender=Teacher)
+def count_saved_teacher(sender, instance, created, **kwargs):
+    status = instance.__dict__.get('status')
+    if created:
+        adjust_counter(_teacher_counter(status), 1)
+    elif status is not None and instance._counted_status is None:
+        # Set on a teacher loaded without its status: where it was counted is unknown
+        refresh_counter('teacher')
+        refresh_counter('pending_teacher')
+    elif status is not None and status != instance._counted_status:
+        # Approval moves a teacher between the counts
+        adjust_counter(_teacher_counter(instance._counted_status), -1)
+        adjust_counter(_teacher_counter(status), 1)
+    if status is not None:
+        instance._counted_status = status
+
+@receiver(post_delete, sender=Teacher)
+def count_deleted_teacher(sender, instance, **kwargs):
+    if instance._counted_status is None:
+        refresh_counter('teacher')
+        refresh_counter('pending_teacher')
+    else:
+        adjust_counter(_teacher_counter(instance._counted_status), -1)
@@ -0,0 +1,150 @@
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends import django as django_backend
+
+logger = logging.getLogger('exam.profiling')
+
+PROFILING_LOG_MAX_BYTES = 5 * 1024 * 1024
+PROFILING_LOG_BACKUPS = 5
+PROFILING_TOP_QUERIES = 5
+
+_current_profile = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """
+    Time spent by one request in SQL, template rendering and named sections.
+    """
+
+    __slots__ = ('started', 'finished', 'sections', 'queries')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.sections = defaultdict(float)
+        # SQL text -> [executions, seconds]
+        self.queries = defaultdict(lambda: [0, 0.0])
+
+    def time_query(self, execute, sql, params, many, context):
+        """A connection.execute_wrapper() that times every statement."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            entry = self.queries[sql]
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def query_count(self):
+        return sum(count for count, _ in self.queries.values())
+
+    @property
+    def db_time(self):
+        return sum(seconds for _, seconds in self.queries.values())
+
+    def top_queries(self, limit=PROFILING_TOP_QUERIES):
+        ranked = sorted(self.queries.items(), key=lambda item: item[1][1], reverse=True)
+        return [
+            {'sql': sql, 'count': count, 'ms': round(seconds * 1000, 2)}
+            for sql, (count, seconds) in ranked[:limit]
+        ]
+
+    def server_timing(self):
+        """Returns the value of the Server-Timing header."""
+        metrics = [f'db;dur={self.db_time * 1000:.1f};desc="{self.query_count} queries"']
+        metrics += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.sections.items()]
+        metrics.append(f'total;dur={self.elapsed * 1000:.1f}')
+        return ', '.join(metrics)
+
+    @contextmanager
+    def activate(self):
+        """Makes this the current profile and times the queries of every connection."""
+        token = _current_profile.set(self)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self.time_query))
+                yield self
+        finally:
+            self.finished = time.perf_counter()
+            _current_profile.reset(token)
+
+
+@contextmanager
+def profile_section(name):
+    """
+    Adds the time spent in the block to the section `name` of the current
+    request's profile. Does nothing when the request is not being profiled.
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.sections[name] += time.perf_counter() - start
+
+
+def install_template_timer():
+    """
+    Times every top-level template render as the 'template' section. Included
+    templates are rendered by the engine directly and count towards their parent.
+    """
+    template_class = django_backend.Template
+    if getattr(template_class.render, 'profiled', False):
+        return
+    render = template_class.render
+
+    def profiled_render(self, context=None, request=None):
+        with profile_section('template'):
+            return render(self, context, request)
+
+    profiled_render.profiled = True
+    template_class.render = profiled_render
+
+
+def configure_slow_request_log():
+    """Attaches the rotating JSON log file to the profiling logger, once."""
+    path = settings.REQUEST_PROFILING_LOG
+    if any(getattr(handler, 'baseFilename', None) == os.path.abspath(path) for handler in logger.handlers):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=PROFILING_LOG_MAX_BYTES, backupCount=PROFILING_LOG_BACKUPS)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def log_slow_request(request, response, profile):
+    """Writes a JSON line describing a slow request to the profiling log."""
+    match = getattr(request, 'resolver_match', None)
+    logger.info(json.dumps({
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'method': request.method,
+        'path': request.path,
+        'view': match.view_name if match else None,
+        'status': response.status_code,
+        'user_id': request.user.id if hasattr(request, 'user') else None,
+        'total_ms': round(profile.elapsed * 1000, 2),
+        'db_ms': round(profile.db_time * 1000, 2),
+        'queries': profile.query_count,
+        'sections': {name: round(seconds * 1000, 2) for name, seconds in profile.sections.items()},
+        'top_queries': profile.top_queries(),
+    }))
@@ -1,3 +1,572 @@
-from django.test import TestCase
+"""
+Query-count and latency benchmarks for every page of the site.
+
+The suite seeds a synthetic institution, requests every URL of onlinexam/urls.py,
+student/urls.py and teacher/urls.py with the test client and checks the SQL query
+count of each against BUDGETS. It then seeds the institution a second time, doubling
+every table, and fails when a view whose budget is marked constant issues a different
+number of queries, i.e. when a view picks up a per-row query.
+
+    BENCH_SCALE=4 python manage.py test exam
+
+BENCH_SCALE multiplies the seeded rows (default 1), BENCH_MAX_SECONDS fails any
+request slower than it, and BENCH_REPORT names a file to write the measured query
+counts, SQL time and wall time to as JSON.
+
+The tests of the exam app itself follow the benchmark.
+"""
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils import timezone
+
+from assignment.models import Assignment, GradingJob, Submission
+from assignment.search import index_submission_text
+from exam.management.commands.regrade_exam import score_batch
+from exam.profiling import logger as profiling_logger
+from exam.models import Course, ExamAttempt, ExamResponse, Question
+from exam.utils import (
+    build_answer_key, get_answer_key, get_exam_paper, pack_responses, reconcile_counters, unpack_responses,
+)
+from student.models import Student
+from teacher.models import Teacher
+
+BENCH_SCALE = int(os.environ.get('BENCH_SCALE', 1))
+BENCH_MAX_SECONDS = float(os.environ.get('BENCH_MAX_SECONDS', 0))
+BENCH_REPORT = os.environ.get('BENCH_REPORT')
+
+# The tests clear the cache, so they get their own rather than the one the site runs on
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'exam-tests'}}
+
+# Rows added per seeding round, multiplied by BENCH_SCALE
+STUDENTS = 40
+TEACHERS = 8
+COURSES = 6
+QUESTIONS_PER_COURSE = 20
+ATTEMPTS_PER_STUDENT = 3
+ASSIGNMENTS = 6
+SUBMISSIONS_PER_STUDENT = 2
+
+
+# role: which client requests the page ('admin', 'teacher', 'student' or None for anonymous)
+# args: name of the Institution method returning the URL kwargs, or None
+# method/data: 'get' or 'post', and the name of the Institution method building the post data
+# queries: the most queries the page may issue
+# constant: whether the query count must not depend on the number of rows
+# prepare: name of the Institution method to call with the client before the measured request
+Budget = namedtuple('Budget', 'role args method data queries constant prepare')
+Budget.__new__.__defaults__ = (None, 'get', None, 0, True, None)
+
+BUDGETS = {
+    '': Budget(None, queries=0),
+    'logout': Budget(None, queries=0),
+    'contactus': Budget(None, queries=0),
+    'afterlogin': Budget('student', queries=4),
+    'adminclick': Budget(None, queries=0),
+    'adminlogin': Budget(None, queries=0),
+    'admin-dashboard': Budget('admin', queries=4),
+    'admin-teacher': Budget('admin', queries=4),
+    'admin-view-teacher': Budget('admin', queries=4),
+    'update-teacher/<int:pk>': Budget('admin', 'teacher', queries=5),
+    'delete-teacher/<int:pk>': Budget('admin', 'new_teacher', queries=18),
+    'admin-view-pending-teacher': Budget('admin', queries=4),
+    'approve-teacher/<int:pk>': Budget('admin', 'pending_teacher', queries=3),
+    'reject-teacher/<int:pk>': Budget('admin', 'new_pending_teacher', queries=18),
+    'admin-student': Budget('admin', queries=4),
+    'admin-view-student': Budget('admin', queries=4),
+    'admin-import-student': Budget('admin', queries=3),
+    'admin-view-student-marks': Budget('admin', queries=4),
+    'admin-export-gradebook': Budget('admin', queries=5),
+    'admin-view-marks/<int:pk>': Budget('admin', 'student', queries=4),
+    'admin-check-marks/<int:pk>': Budget('admin', 'course', queries=7, prepare='student_cookie'),
+    'update-student/<int:pk>': Budget('admin', 'student', queries=5),
+    'delete-student/<int:pk>': Budget('admin', 'new_student', queries=19),
+    'admin-course': Budget('admin', queries=3),
+    'admin-add-course': Budget('admin', queries=3),
+    'admin-view-course': Budget('admin', queries=4),
+    'delete-course/<int:pk>': Budget('admin', 'new_course', queries=36),
+    'admin-question': Budget('admin', queries=3),
+    'admin-add-question': Budget('admin', queries=4),
+    'admin-import-question': Budget('admin', queries=4),
+    'admin-view-question': Budget('admin', queries=4),
+    'view-question/<int:pk>': Budget('admin', 'course', queries=4),
+    'delete-question/<int:pk>': Budget('admin', 'new_question', queries=6),
+    'admin-assignment': Budget('admin', queries=3),
+    'admin-add-assignment': Budget('admin', queries=3),
+    'admin-view-assignment': Budget('admin', queries=4),
+    'admin-delete-assignment/<int:pk>/': Budget('admin', 'new_admin_assignment', queries=16),
+    'admin-view-student-grades': Budget('admin', queries=4),
+    'admin-view-submissions/<int:pk>': Budget('admin', 'student', queries=4),
+    'admin-check-grades/<int:pk>': Budget('admin', 'assignment', queries=7, prepare='student_cookie'),
+
+    'teacher/teacherclick': Budget(None, queries=0),
+    'teacher/teacherlogin': Budget(None, queries=0),
+    'teacher/teachersignup': Budget(None, queries=0),
+    'teacher/teacher-dashboard': Budget('teacher', queries=5),
+    'teacher/teacher-exam': Budget('teacher', queries=4),
+    'teacher/teacher-add-exam': Budget('teacher', queries=4),
+    'teacher/teacher-view-exam': Budget('teacher', queries=5),
+    'teacher/delete-exam/<int:pk>': Budget('teacher', 'new_course', queries=37),
+    'teacher/teacher-view-student-marks/': Budget('teacher', queries=5),
+    'teacher/teacher-export-gradebook': Budget('teacher', queries=6),
+    'teacher/teacher-view-marks/<int:pk>/': Budget('teacher', 'student', queries=5),
+    'teacher/teacher-check-marks/<int:pk>/': Budget('teacher', 'course', queries=8, prepare='student_cookie'),
+    'teacher/teacher-question': Budget('teacher', queries=4),
+    'teacher/teacher-add-question': Budget('teacher', queries=5),
+    'teacher/teacher-import-question': Budget('teacher', queries=5),
+    'teacher/teacher-view-question': Budget('teacher', queries=5),
+    'teacher/see-question/<int:pk>': Budget('teacher', 'course', queries=5),
+    'teacher/remove-question/<int:pk>': Budget('teacher', 'new_question', queries=7),
+    'teacher/teacher-assignment': Budget('teacher', queries=4),
+    'teacher/teacher-add-assignment': Budget('teacher', queries=4),
+    'teacher/teacher-view-assignment': Budget('teacher', queries=6),
+    'teacher/teacher-delete-assignment/<int:pk>/': Budget('teacher', 'new_assignment', queries=17),
+    'teacher/teacher-view-submissions': Budget('teacher', queries=6),
+    'teacher/teacher-search-submissions': Budget('teacher', data='search_query', queries=7),
+
+    'student/studentclick': Budget(None, queries=0),
+    'student/studentlogin': Budget(None, queries=0),
+    'student/studentsignup': Budget(None, queries=0),
+    'student/student-dashboard': Budget('student', queries=5),
+    'student/student-exam': Budget('student', queries=5),
+    'student/take-exam/<int:pk>': Budget('student', 'course', queries=6),
+    'student/start-exam/<int:pk>': Budget('student', 'new_course', queries=15),
+    'student/autosave-exam': Budget('student', method='post', data='exam_answers', queries=10, prepare='start_exam'),
+    'student/calculate-marks': Budget('student', method='post', data='exam_answers', queries=19, prepare='start_exam'),
+    'student/view-result': Budget('student', queries=5),
+    'student/check-marks/<int:pk>': Budget('student', 'course', queries=7),
+    'student/student-marks': Budget('student', queries=5),
+    'student/student-assignment': Budget('student', queries=5),
+    'student/student-submit/<int:pk>/': Budget('student', 'assignment', queries=7),
+    'student/grading-status/<int:pk>': Budget('student', 'grading_job', queries=5),
+    'student/student-submissions/<int:pk>/': Budget('student', 'assignment', queries=5),
+    'student/student-grades': Budget('student', queries=5),
+    'student/view-assignment-results': Budget('student', queries=5),
+}
+
+
+def site_routes(resolver=None, prefix=''):
+    """Yields the route of every URL of the site, outside the Django admin."""
+    for pattern in (resolver or get_resolver()).url_patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            if route != 'admin/':
+                yield from site_routes(pattern, route)
+        elif isinstance(pattern, URLPattern):
+            yield route
+
+
+class Institution:
+    """
+    A synthetic school of students, teachers, courses, questions, attempts, assignments
+    and submissions, grown with seed() and used to build the URLs and data of BUDGETS.
+    """
+
+    password = make_password('bench')
+
+    def __init__(self):
+        self.rounds = 0
+        self.student_group, _ = Group.objects.get_or_create(name='STUDENT')
+        self.teacher_group, _ = Group.objects.get_or_create(name='TEACHER')
+        self.admin_user = User.objects.create_superuser('bench-admin', password='bench')
+        self.teacher_user = self._users('bench-teacher', 1, self.teacher_group)[0]
+        self.student_user = self._users('bench-student', 1, self.student_group)[0]
+        Teacher.objects.create(user=self.teacher_user, address='x', mobile='1', profile_pic='profile_pic/bench.png', status=True)
+        Student.objects.create(user=self.student_user, address='x', mobile='1', profile_pic='profile_pic/bench.png')
+
+    def _users(self, prefix, count, group):
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}-{self.rounds}-{n}', first_name=prefix, last_name=str(n), password=self.password)
+            for n in range(count)
+        ])
+        User.groups.through.objects.bulk_create([
+            User.groups.through(user_id=user.id, group_id=group.id) for user in users
+        ])
+        return users
+
+    def seed(self, scale=1):
+        """Adds one round of rows, `scale` times the base sizes."""
+        self.rounds += 1
+        now = timezone.now()
+        me = Student.objects.get(user=self.student_user)
+        students = Student.objects.bulk_create([
+            Student(user=user, address='x', mobile='1', profile_pic='profile_pic/bench.png')
+            for user in self._users('student', STUDENTS * scale, self.student_group)
+        ])
+        Teacher.objects.bulk_create([
+            Teacher(user=user, address='x', mobile='1', profile_pic='profile_pic/bench.png', status=n % 4 != 0)
+            for n, user in enumerate(self._users('teacher', TEACHERS * scale, self.teacher_group))
+        ])
+        courses = Course.objects.bulk_create([
+            Course(course_name=f'Course {self.rounds}-{n}', question_number=QUESTIONS_PER_COURSE,
+                   total_marks=QUESTIONS_PER_COURSE)
+            for n in range(COURSES * scale)
+        ])
+        questions = Question.objects.bulk_create([
+            Question(course=course, marks=1, question=f'Question {n}?', option1='a', option2='b',
+                     option3='c', option4='d', answer='Option1')
+            for course in courses for n in range(QUESTIONS_PER_COURSE)
+        ])
+        attempts = ExamAttempt.objects.bulk_create([
+            ExamAttempt(student=student, exam=courses[(s + n) % len(courses)], completed=True,
+                        marks_obtained=n, submission_time=now)
+            for s, student in enumerate(students + [me]) for n in range(ATTEMPTS_PER_STUDENT)
+        ])
+        by_course = {}
+        for question in questions:
+            by_course.setdefault(question.course_id, []).append(question.id)
+        ExamResponse.objects.bulk_create([
+            ExamResponse(attempt=attempt, **pack_responses(
+                by_course[attempt.exam_id], [1] * len(by_course[attempt.exam_id]),
+            ))
+            for attempt in attempts
+        ])
+        assignments = Assignment.objects.bulk_create([
+            Assignment(title=f'Assignment {self.rounds}-{n}', description='Essay', due_date=now + timedelta(days=7),
+                       required_keywords='alpha,beta', created_by=self.teacher_user, marks=5)
+            for n in range(ASSIGNMENTS * scale)
+        ])
+        submissions = Submission.objects.bulk_create([
+            Submission(assignment=assignments[(s + n) % len(assignments)], student=student.user,
+                       file='submissions/bench.txt', grade=3)
+            for s, student in enumerate(students + [me]) for n in range(SUBMISSIONS_PER_STUDENT)
+        ])
+        for submission in submissions:
+            index_submission_text(submission.id, f'An essay {submission.id} about alpha, beta and gamma rays.')
+        # bulk_create skips the signals that keep the dashboard counters
+        reconcile_counters()
+
+    # URL kwargs
+
+    def course(self):
+        return {'pk': Course.objects.order_by('id').first().id}
+
+    def new_course(self):
+        course = Course.objects.create(course_name='Fresh', question_number=QUESTIONS_PER_COURSE,
+                                       total_marks=QUESTIONS_PER_COURSE)
+        Question.objects.bulk_create([
+            Question(course=course, marks=1, question=f'Question {n}?', option1='a', option2='b',
+                     option3='c', option4='d', answer='Option2')
+            for n in range(QUESTIONS_PER_COURSE)
+        ])
+        return {'pk': course.id}
+
+    def new_question(self):
+        course = Course.objects.order_by('id').first()
+        question = Question.objects.create(course=course, marks=1, question='Spare?', option1='a',
+                                           option2='b', option3='c', option4='d', answer='Option3')
+        return {'pk': question.id}
+
+    def student(self):
+        return {'pk': Student.objects.get(user=self.student_user).id}
+
+    def teacher(self):
+        return {'pk': Teacher.objects.get(user=self.teacher_user).id}
+
+    def pending_teacher(self):
+        return {'pk': Teacher.objects.filter(status=False).order_by('id').first().id}
+
+    def new_student(self):
+        user = self._users('spare-student', 1, self.student_group)[0]
+        return {'pk': Student.objects.create(user=user, address='x', mobile='1', profile_pic='profile_pic/bench.png').id}
+
+    def new_teacher(self):
+        user = self._users('spare-teacher', 1, self.teacher_group)[0]
+        return {'pk': Teacher.objects.create(user=user, address='x', mobile='1', profile_pic='profile_pic/bench.png', status=True).id}
+
+    def new_pending_teacher(self):
+        user = self._users('spare-pending', 1, self.teacher_group)[0]
+        return {'pk': Teacher.objects.create(user=user, address='x', mobile='1', profile_pic='profile_pic/bench.png').id}
+
+    def assignment(self):
+        return {'pk': Assignment.objects.filter(created_by=self.teacher_user).order_by('id').first().id}
+
+    def new_assignment(self, created_by=None):
+        assignment = Assignment.objects.create(
+            title='Spare', description='Essay', due_date=timezone.now() + timedelta(days=7),
+            created_by=created_by or self.teacher_user,
+        )
+        return {'pk': assignment.id}
+
+    def grading_job(self):
+        submission = Submission.objects.filter(student=self.student_user).order_by('id').first()
+        job = GradingJob.objects.create(submission=submission, assignment_id=submission.assignment_id,
+                                        student=self.student_user)
+        return {'pk': job.id}
+
+    def new_admin_assignment(self):
+        return self.new_assignment(created_by=self.admin_user)
+
+    # Preparation and post data
+
+    def student_cookie(self, client):
+        client.cookies['student_id'] = str(self.student()['pk'])
+
+    def start_exam(self, client):
+        self._exam = self.new_course()
+        client.get(f"/student/start-exam/{self._exam['pk']}")
+
+    def search_query(self):
+        return {'q': 'alpha "gamma rays"'}
+
+    def exam_answers(self):
+        ids = Question.objects.filter(course_id=self._exam['pk']).values_list('id', flat=True)
+        return {str(qid): 'Option2' for qid in ids}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ViewBudgetTests(TestCase):
+    """Checks the query count of every page against BUDGETS, at two sizes of data."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.institution = Institution()
+
+    def setUp(self):
+        # Resolved roles and counters live in the cache, and SQLite reuses ids between tests
+        cache.clear()
+
+    def client_for(self, role):
+        if role is None:
+            return self.client_class()
+        client = self.client_class()
+        client.force_login({
+            'admin': self.institution.admin_user,
+            'teacher': self.institution.teacher_user,
+            'student': self.institution.student_user,
+        }[role])
+        return client
+
+    def measure(self, route, budget):
+        """Requests `route` with a cold cache and returns (status, queries, sql_seconds, wall_seconds)."""
+        institution = self.institution
+        client = self.client_for(budget.role)
+        if budget.prepare:
+            getattr(institution, budget.prepare)(client)
+        url = '/' + route
+        if budget.args:
+            url = url.replace('<int:pk>', str(getattr(institution, budget.args)()['pk']))
+        data = getattr(institution, budget.data)() if budget.data else {}
+
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(client, budget.method)(url, data)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            wall = time.perf_counter() - start
+        sql = sum(float(query['time']) for query in queries.captured_queries)
+        return response.status_code, len(queries), sql, wall
+
+    def measure_all(self):
+        return {route: self.measure(route, budget) for route, budget in BUDGETS.items()}
+
+    def test_every_url_has_a_budget(self):
+        missing = sorted(set(site_routes()) - set(BUDGETS))
+        stale = sorted(set(BUDGETS) - set(site_routes()))
+        self.assertEqual(missing, [], "URLs without a query budget")
+        self.assertEqual(stale, [], "Budgets for URLs that no longer exist")
+
+    def test_query_budgets(self):
+        self.institution.seed(BENCH_SCALE)
+        small = self.measure_all()
+        self.institution.seed(BENCH_SCALE)
+        large = self.measure_all()
+
+        if BENCH_REPORT:
+            with open(BENCH_REPORT, 'w') as report:
+                json.dump({
+                    route: {
+                        'status': status, 'queries': [small[route][1], count],
+                        'sql_seconds': [small[route][2], sql], 'wall_seconds': [small[route][3], wall],
+                    }
+                    for route, (status, count, sql, wall) in large.items()
+                }, report, indent=2)
+
+        for route, budget in BUDGETS.items():
+            with self.subTest(route=route):
+                status, count, sql, wall = large[route]
+                self.assertLess(status, 400, f"/{route} answered {status}")
+                self.assertLessEqual(count, budget.queries, f"/{route} issued {count} queries")
+                if budget.constant:
+                    self.assertEqual(
+                        small[route][1], count,
+                        f"/{route} went from {small[route][1]} to {count} queries when the data doubled",
+                    )
+                if BENCH_MAX_SECONDS:
+                    self.assertLessEqual(wall, BENCH_MAX_SECONDS, f"/{route} took {wall:.3f}s")
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ExamPaperCacheTests(TestCase):
+    """A cached paper and answer key are replaced once a question of their course is saved or deleted."""
+
+    def setUp(self):
+        cache.clear()
+        self.course, self.other_course = (
+            Course.objects.create(course_name=name, question_number=2, total_marks=2) for name in ('Physics', 'Maths')
+        )
+        self.questions = [
+            Question.objects.create(course=course, marks=1, question=f'{course.course_name} Q{n}', option1='a',
+                                    option2='b', option3='c', option4='d', answer='Option1')
+            for course in (self.course, self.other_course) for n in range(2)
+        ]
+
+    def papers(self):
+        return (
+            get_exam_paper(self.course.id),
+            get_exam_paper(self.course.id, [self.questions[0].id], [[3, 2, 1, 0]]),
+            get_answer_key(self.course.id),
+        )
+
+    def test_paper_is_cached(self):
+        self.papers()
+        get_exam_paper(self.other_course.id)
+        with self.assertNumQueries(0):
+            self.papers()
+            get_exam_paper(self.other_course.id)
+
+    def test_saved_question_replaces_the_paper(self):
+        self.papers()
+        other_paper = get_exam_paper(self.other_course.id)
+        question = self.questions[0]
+        question.question, question.answer = 'Edited question', 'Option3'
+        question.save()
+
+        paper, drawn, answer_key = self.papers()
+        for html in (paper, drawn):
+            self.assertIn('Edited question', html)
+            self.assertNotIn('Physics Q0', html)
+        self.assertEqual(answer_key.grade({str(question.id): 'Option3'}), 1)
+        # Other courses keep their cached paper
+        with self.assertNumQueries(0):
+            self.assertEqual(get_exam_paper(self.other_course.id), other_paper)
+
+    def test_deleted_question_leaves_the_paper(self):
+        self.papers()
+        self.questions[1].delete()
+        paper, _, answer_key = self.papers()
+        self.assertNotIn('Physics Q1', paper)
+        self.assertEqual(list(answer_key.question_ids), [self.questions[0].id])
+
+
+@override_settings(
+    CACHES=TEST_CACHES, REQUEST_PROFILING=True, REQUEST_PROFILING_SAMPLE_RATE=1.0,
+    REQUEST_PROFILING_LOG=os.path.join(tempfile.mkdtemp(), 'logs', 'slow_requests.log'),
+)
+class RequestProfilingTests(TestCase):
+    """Profiled responses carry a Server-Timing header, and requests over the threshold are logged."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(self.detach_log)
+
+    def detach_log(self):
+        for handler in list(profiling_logger.handlers):
+            profiling_logger.removeHandler(handler)
+            handler.close()
+
+    def logged(self):
+        try:
+            with open(settings.REQUEST_PROFILING_LOG) as log:
+                return [json.loads(line) for line in log]
+        except FileNotFoundError:
+            return []
+
+    @override_settings(REQUEST_PROFILING_SLOW_MS=60 * 1000)
+    def test_server_timing_header(self):
+        response = self.client.get('/')
+        metrics = dict(re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing']))
+        self.assertEqual(set(metrics), {'db', 'template', 'total'})
+        self.assertLessEqual(float(metrics['template']), float(metrics['total']))
+        self.assertEqual(self.logged(), [])
+
+    @override_settings(REQUEST_PROFILING_SLOW_MS=0)
+    def test_slow_request_is_logged(self):
+        self.client.force_login(User.objects.create_superuser('admin'))
+        self.client.get('/admin-dashboard')
+        [entry] = self.logged()
+        self.assertEqual((entry['method'], entry['path'], entry['status']), ('GET', '/admin-dashboard', 200))
+        self.assertEqual(entry['view'], 'admin-dashboard')
+        self.assertGreater(entry['queries'], 0)
+        self.assertIn('template', entry['sections'])
+        self.assertLessEqual(len(entry['top_queries']), 5)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RegradeExamTests(TestCase):
+    """regrade_exam scores attempts as AnswerKey.score does, against the questions as they are."""
+
+    def setUp(self):
+        cache.clear()
+        rng = random.Random(0)
+        self.course = Course.objects.create(course_name='Physics', question_number=6, total_marks=20)
+        for n in range(6):
+            Question.objects.create(
+                course=self.course, marks=n + 1, question=f'Q{n}', option1='a', option2='b', option3='c',
+                option4='d', answer=f'Option{rng.randint(1, 4)}',
+            )
+        question_ids = list(Question.objects.filter(course=self.course).values_list('id', flat=True))
+        for n in range(20):
+            user = User.objects.create_user(f'student{n}')
+            attempt = ExamAttempt.objects.create(
+                student=Student.objects.create(user=user, address='x', mobile='1'), exam=self.course,
+                completed=True, marks_obtained=0,
+            )
+            # Some questions left out, some unanswered (0), and one the key does not hold
+            answered = sorted(rng.sample(question_ids, rng.randint(0, 6)) + [question_ids[-1] + 100])
+            ExamResponse.objects.create(
+                attempt=attempt, **pack_responses(answered, [rng.randint(0, 4) for _ in answered])
+            )
+
+    def rows(self):
+        return list(
+            ExamResponse.objects.order_by('attempt_id')
+            .values_list('attempt_id', 'attempt__marks_obtained', 'question_ids', 'answers')
+        )
+
+    def expected(self, answer_key):
+        marks = {}
+        for response in ExamResponse.objects.all():
+            saved = unpack_responses(response)
+            marks[response.attempt_id] = answer_key.score(
+                [saved.get(question_id, 0) for question_id in answer_key.question_ids]
+            )
+        return marks
+
+    def test_score_batch_matches_answer_key(self):
+        answer_key = build_answer_key(self.course.id)
+        rows = self.rows()
+        marks = score_batch(
+            rows, np.asarray(answer_key.question_ids, dtype=np.int32),
+            np.asarray(answer_key.answers, dtype=np.uint8), np.asarray(answer_key.marks, dtype=np.int64),
+        )
+        self.assertEqual(dict(zip((row[0] for row in rows), marks.tolist())), self.expected(answer_key))
+
+    def test_regrade_reads_the_questions_not_the_cache(self):
+        get_answer_key(self.course.id)
+        # A fix made around the signals leaves the cached key as it was
+        Question.objects.filter(course=self.course).update(answer='Option2')
+        call_command('regrade_exam', self.course.id, '--batch-size=7', stdout=io.StringIO())
+        self.assertEqual(
+            dict(ExamAttempt.objects.values_list('id', 'marks_obtained')),
+            self.expected(build_answer_key(self.course.id)),
+        )
 
-# Create your tests here.
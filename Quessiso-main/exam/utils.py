@@ -0,0 +1,1076 @@
+import base64
+import codecs
+import csv
+import hashlib
+import heapq
+import json
+import operator
+import os
+import random
+import time
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from functools import reduce
+from urllib.parse import urlencode
+from array import array
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Count, F, Q
+from django.http import StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+ANSWER_KEY_TIMEOUT = 60 * 60 * 24
+EXAM_PAPER_TIMEOUT = 60 * 60 * 24
+
+# With a shared cache, autosaved answers are buffered there and written to the
+# database by the flush_autosaves command or the deadline sweeper, once per
+# interval and a batch of attempts at a time. Otherwise each save is written at once.
+AUTOSAVE_TIMEOUT = 60 * 60 * 12
+AUTOSAVE_FLUSH_INTERVAL = 15
+AUTOSAVE_FLUSH_BATCH = 500
+# How long an autosave waits for another save of the same attempt, and how long a lock may be held
+AUTOSAVE_LOCK_WAIT = 2
+AUTOSAVE_LOCK_TIMEOUT = 10
+
+QUESTION_BANK_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl'}
+QUESTION_IMPORT_CHUNK_SIZE = 500
+QUESTION_IMPORT_MAX_ERRORS = 200
+
+ROSTER_BATCH_SIZE = 500
+ROSTER_MAX_ERRORS = 200
+# Students an upload may register in the web request, hashing their passwords
+# there; larger rosters go through the import_students command
+ROSTER_UPLOAD_MAX_ROWS = 50
+
+# Roles are invalidated when groups or profiles change; the timeout bounds how long
+# a change made around the signals (a queryset update, a raw SQL fix) goes unseen
+ROLE_TIMEOUT = 60 * 5
+COUNTERS_TIMEOUT = 60 * 60
+STUDENT = 'STUDENT'
+TEACHER = 'TEACHER'
+
+LIST_PAGE_SIZE = 50
+PERSON_SORTS = [
+    ('newest', 'Newest first', ('-id',)),
+    ('oldest', 'Oldest first', ('id',)),
+    ('name', 'Name', ('user__first_name', 'user__last_name')),
+]
+PERSON_SEARCH_FIELDS = ('user__first_name', 'user__last_name', 'user__username')
+
+GRADEBOOK_CHUNK_SIZE = 2000
+GRADEBOOK_HEADER = ('Type', 'Username', 'Student', 'Exam / Assignment', 'Score', 'Out Of', 'Status', 'Submitted At')
+
+# Rows removed per transaction by delete_in_chunks()
+DELETE_CHUNK_SIZE = 500
+
+# Option values posted by the exam form, in the order of their 1-based index.
+# Index 0 is reserved for "not answered".
+OPTION_VALUES = ('Option1', 'Option2', 'Option3', 'Option4')
+
+# Stored responses pack question ids as native 32-bit ints (numpy int32)
+# and selected option indexes as single bytes.
+QUESTION_ID_TYPECODE = 'i'
+
+
+def option_index(value):
+    """
+    Returns the 1-based index of an option value such as 'Option3', or 0 if
+    the value is missing or not a valid option.
+    """
+    try:
+        return OPTION_VALUES.index(value) + 1
+    except ValueError:
+        return 0
+
+
+def _version_key(course_id):
+    return f"exam:course:{course_id}:question_version"
+
+
+def get_question_set_version(course_id):
+    """
+    Returns the current version of a course's question set.
+    The version is bumped whenever a question of the course is saved or deleted,
+    so anything cached under it is invalidated automatically.
+    """
+    key = _version_key(course_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from a time based value so a lost version key can never
+        # resurrect entries cached under an older version.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_question_set_version(course_id):
+    key = _version_key(course_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, None)
+        return version
+
+
+class AnswerKey:
+    """
+    Compiled answer key of a course: parallel arrays of question ids,
+    correct option indexes and marks, in question id order.
+    """
+    __slots__ = ('question_ids', 'answers', 'marks')
+
+    def __init__(self, question_ids, answers, marks):
+        self.question_ids = question_ids
+        self.answers = answers
+        self.marks = marks
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    @property
+    def total_marks(self):
+        return sum(self.marks)
+
+    def answer_indexes(self, responses):
+        """
+        Returns the selected option indexes aligned with `question_ids`, given
+        `responses`, a mapping of question id (as a string, like request.POST)
+        to the selected option value.
+        """
+        get = responses.get
+        return array('B', [option_index(get(str(question_id))) for question_id in self.question_ids])
+
+    def score(self, answer_indexes):
+        """
+        Returns the marks obtained for option indexes aligned with `question_ids`.
+        An unanswered question (index 0) scores nothing, even when its stored
+        answer is not a valid option either.
+        """
+        total = 0
+        for answer, selected, marks in zip(self.answers, answer_indexes, self.marks):
+            if selected and selected == answer:
+                total += marks
+        return total
+
+    def grade(self, responses):
+        return self.score(self.answer_indexes(responses))
+
+    def subset(self, question_ids):
+        """
+        Returns the answer key of just `question_ids`, in their order.
+        """
+        subset = AnswerKey(array(QUESTION_ID_TYPECODE), array('B'), array('l'))
+        for question_id in question_ids:
+            position = bisect_left(self.question_ids, question_id)
+            if position < len(self.question_ids) and self.question_ids[position] == question_id:
+                subset.question_ids.append(question_id)
+                subset.answers.append(self.answers[position])
+                subset.marks.append(self.marks[position])
+        return subset
+
+
+def build_answer_key(course_id):
+    from .models import Question
+
+    rows = Question.objects.filter(course_id=course_id).order_by('id').values_list('id', 'answer', 'marks')
+    question_ids = array(QUESTION_ID_TYPECODE)
+    answers = array('B')
+    marks = array('l')
+    for question_id, answer, mark in rows:
+        question_ids.append(question_id)
+        answers.append(option_index(answer))
+        marks.append(mark)
+    return AnswerKey(question_ids, answers, marks)
+
+
+def get_answer_key(course_id):
+    """
+    Returns the compiled answer key of a course, building and caching it
+    under the course's current question set version on a miss.
+    """
+    key = f"exam:course:{course_id}:answer_key:{get_question_set_version(course_id)}"
+    answer_key = cache.get(key)
+    if answer_key is None:
+        answer_key = build_answer_key(course_id)
+        cache.set(key, answer_key, ANSWER_KEY_TIMEOUT)
+    return answer_key
+
+
+def get_exam_questions(course_id, question_ids):
+    """
+    Returns the display data (never the answer) of the given questions of a
+    course as a {question id: dict} mapping. Each question is cached on its
+    own under the course's question set version, so fetching k questions
+    costs O(k) however large the pool is.
+    """
+    version = get_question_set_version(course_id)
+    keys = {question_id: f"exam:course:{course_id}:question:{question_id}:{version}" for question_id in question_ids}
+    cached = cache.get_many(keys.values())
+    questions = {question_id: cached[key] for question_id, key in keys.items() if key in cached}
+
+    missing = [question_id for question_id in question_ids if question_id not in questions]
+    if missing:
+        from .models import Question
+
+        rows = Question.objects.filter(course_id=course_id, id__in=missing).values(
+            'id', 'marks', 'question', 'option1', 'option2', 'option3', 'option4'
+        )
+        fetched = {
+            row['id']: {
+                'id': row['id'],
+                'marks': row['marks'],
+                'question': row['question'],
+                'options': [(value, row[value.lower()]) for value in OPTION_VALUES],
+            }
+            for row in rows
+        }
+        cache.set_many({keys[question_id]: question for question_id, question in fetched.items()}, EXAM_PAPER_TIMEOUT)
+        questions.update(fetched)
+    return questions
+
+
+def new_attempt_seed():
+    return random.randrange(2 ** 31)
+
+
+def _draw_rank(attempt, question_id):
+    return hashlib.blake2b(f"{attempt.id}:{attempt.seed}:{question_id}".encode(), digest_size=8).digest()
+
+
+def _draw_question_ids(course, attempt, pool):
+    """
+    Returns the question ids of an attempt's paper, in paper order, or None
+    when it is the whole of `pool` as is.
+    """
+    paper = pool
+    if attempt.question_bound is not None:
+        paper = pool[:bisect_right(pool, attempt.question_bound)]
+    if 0 < course.question_number < len(paper):
+        # Each question is ranked on its own, so removing one off the paper leaves the rest of the draw alone
+        return heapq.nsmallest(course.question_number, paper, key=lambda question_id: _draw_rank(attempt, question_id))
+    if len(paper) < len(pool) or course.shuffle_options:
+        return list(paper)
+    return None
+
+
+def draw_exam_paper(course, attempt):
+    """
+    Returns the (question ids, option orders) of an attempt's paper, or
+    (None, None) when the attempt gets the whole course paper as is.
+
+    When the pool holds more than Course.question_number questions, that many
+    are sampled; options are shuffled when Course.shuffle_options is set. The
+    paper is rebuilt from the attempt id, its seed and ExamAttempt.question_bound
+    rather than stored: questions added since the attempt started are left out,
+    so a resumed attempt and its grading see the paper it started with.
+    """
+    question_ids = _draw_question_ids(course, attempt, get_answer_key(course.id).question_ids)
+    option_orders = None
+    if course.shuffle_options:
+        option_orders = [
+            random.Random(f"{attempt.id}:{attempt.seed}:{question_id}:options").sample(
+                range(len(OPTION_VALUES)), len(OPTION_VALUES)
+            )
+            for question_id in question_ids
+        ]
+    return question_ids, option_orders
+
+
+def get_attempt_answer_key(course, attempt):
+    """
+    Returns the answer key of the questions on an attempt's paper.
+    """
+    answer_key = get_answer_key(course.id)
+    question_ids = _draw_question_ids(course, attempt, answer_key.question_ids)
+    return answer_key if question_ids is None else answer_key.subset(question_ids)
+
+
+def get_exam_paper(course_id, question_ids=None, option_orders=None):
+    """
+    Returns the rendered question paper body (questions and options, never
+    the answers). The whole course paper is rendered once and cached under
+    the course's question set version; a drawn paper is assembled from the
+    cached questions.
+    """
+    if question_ids is None and option_orders is None:
+        key = f"exam:course:{course_id}:paper:{get_question_set_version(course_id)}"
+        paper = cache.get(key)
+        if paper is None:
+            pool = get_answer_key(course_id).question_ids
+            questions = get_exam_questions(course_id, pool)
+            paper = str(render_to_string(
+                'student/exam_paper.html',
+                {'questions': [questions[question_id] for question_id in pool if question_id in questions]}
+            ))
+            cache.set(key, paper, EXAM_PAPER_TIMEOUT)
+        return mark_safe(paper)
+
+    questions_by_id = get_exam_questions(course_id, question_ids)
+    questions = []
+    for position, question_id in enumerate(question_ids):
+        question = questions_by_id.get(question_id)
+        if question is None:
+            continue
+        if option_orders:
+            question = dict(question, options=[question['options'][i] for i in option_orders[position]])
+        questions.append(question)
+    return mark_safe(render_to_string('student/exam_paper.html', {'questions': questions}))
+
+
+def pack_question_ids(question_ids):
+    return array(QUESTION_ID_TYPECODE, question_ids).tobytes()
+
+
+def unpack_question_ids(data):
+    question_ids = array(QUESTION_ID_TYPECODE)
+    question_ids.frombytes(bytes(data))
+    return question_ids.tolist()
+
+
+def pack_responses(question_ids, answer_indexes):
+    """
+    Returns the ExamResponse field values for aligned question ids and
+    selected option indexes.
+    """
+    return {
+        'question_ids': pack_question_ids(question_ids),
+        'answers': array('B', answer_indexes).tobytes(),
+    }
+
+
+def unpack_responses(response):
+    """
+    Returns a {question id: option index} dict for an ExamResponse.
+    """
+    return dict(zip(unpack_question_ids(response.question_ids), bytes(response.answers)))
+
+
+def _autosave_key(attempt_id):
+    return f"exam:attempt:{attempt_id}:autosave"
+
+
+def _autosave_flushed_key(attempt_id):
+    return f"exam:attempt:{attempt_id}:autosave_flushed"
+
+
+def _autosave_lock_key(attempt_id):
+    return f"exam:attempt:{attempt_id}:autosave_lock"
+
+
+def cache_is_shared():
+    """
+    Whether the default cache is a server seen by every process, with an atomic
+    add(), as Memcached and Redis are. Only then are autosaves buffered in it: a
+    per-process cache would hide them from the flush_autosaves command and the
+    sweeper, and a file cache would race on the attempt locks.
+    """
+    return isinstance(caches['default'], (BaseMemcachedCache, RedisCache))
+
+
+def _load_autosave(attempt_id):
+    buffered = cache.get(_autosave_key(attempt_id))
+    if buffered is None:
+        # Seed a new buffer from the database so a flush never drops older answers
+        from .models import ExamResponse
+
+        response = ExamResponse.objects.filter(attempt_id=attempt_id).first()
+        buffered = {'seq': 0, 'answers': unpack_responses(response) if response else {}}
+    return buffered
+
+
+def get_saved_answers(attempt_id):
+    """
+    Returns the autosaved {question id: option index} answers of an attempt.
+    """
+    return dict(_load_autosave(attempt_id)['answers'])
+
+
+def buffer_answers(attempt_id, deltas):
+    """
+    Merges answer changes ({question id: option index}) into the attempt's
+    autosave buffer, for flush_autosaves to write to the database. Saves of the
+    same attempt are merged one at a time; returns False, buffering nothing,
+    when another one held the attempt for longer than AUTOSAVE_LOCK_WAIT
+    seconds. Without a shared cache the changes are saved straight away.
+    """
+    if not cache_is_shared():
+        _save_answers(attempt_id, deltas)
+        return True
+    lock_key = _autosave_lock_key(attempt_id)
+    deadline = time.monotonic() + AUTOSAVE_LOCK_WAIT
+    while not cache.add(lock_key, True, AUTOSAVE_LOCK_TIMEOUT):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    try:
+        buffered = _load_autosave(attempt_id)
+        buffered['answers'].update(deltas)
+        buffered['seq'] += 1
+        cache.set(_autosave_key(attempt_id), buffered, AUTOSAVE_TIMEOUT)
+    finally:
+        cache.delete(lock_key)
+    return True
+
+
+def _save_answers(attempt_id, deltas):
+    """
+    Merges answer changes into the ExamResponse row of an in-progress attempt.
+    The attempt is locked while its row is written, which orders saves of the
+    same attempt and leaves a submitted attempt's answers alone.
+    """
+    from .models import ExamAttempt, ExamResponse
+
+    with transaction.atomic():
+        if not ExamAttempt.objects.select_for_update().filter(id=attempt_id, completed=False).exists():
+            return
+        response = ExamResponse.objects.filter(attempt_id=attempt_id).first()
+        answers = unpack_responses(response) if response else {}
+        answers.update(deltas)
+        question_ids = sorted(answers)
+        fields = pack_responses(question_ids, [answers[question_id] for question_id in question_ids])
+        if response:
+            response.question_ids, response.answers = fields['question_ids'], fields['answers']
+            response.save(update_fields=['question_ids', 'answers', 'updated_at'])
+        else:
+            ExamResponse.objects.create(attempt_id=attempt_id, **fields)
+
+
+def discard_autosave(attempt_id):
+    cache.delete_many([_autosave_key(attempt_id), _autosave_flushed_key(attempt_id)])
+
+
+def flush_autosaves(attempt_ids=None):
+    """
+    Writes the changed autosave buffers of in-progress attempts to their
+    ExamResponse rows in batches. Returns the number of attempts written.
+    Attempts are locked while their rows are written, so an attempt submitted
+    since its buffer was read keeps the answers it was graded on.
+    """
+    from .models import ExamAttempt, ExamResponse
+
+    if attempt_ids is None:
+        attempt_ids = list(ExamAttempt.objects.filter(completed=False).values_list('id', flat=True))
+
+    written = 0
+    for start in range(0, len(attempt_ids), AUTOSAVE_FLUSH_BATCH):
+        chunk = attempt_ids[start:start + AUTOSAVE_FLUSH_BATCH]
+        buffers = cache.get_many([_autosave_key(attempt_id) for attempt_id in chunk])
+        flushed = cache.get_many([_autosave_flushed_key(attempt_id) for attempt_id in chunk])
+        dirty = {}
+        for attempt_id in chunk:
+            buffered = buffers.get(_autosave_key(attempt_id))
+            if buffered and buffered['seq'] != flushed.get(_autosave_flushed_key(attempt_id)):
+                dirty[attempt_id] = buffered
+        if not dirty:
+            continue
+
+        now = timezone.now()
+        with transaction.atomic():
+            in_progress = set(
+                ExamAttempt.objects.select_for_update().filter(id__in=dirty, completed=False).values_list('id', flat=True)
+            )
+            dirty = {attempt_id: buffered for attempt_id, buffered in dirty.items() if attempt_id in in_progress}
+            existing = dict(ExamResponse.objects.filter(attempt_id__in=dirty).values_list('attempt_id', 'id'))
+            updates, creates = [], []
+            for attempt_id, buffered in dirty.items():
+                question_ids = sorted(buffered['answers'])
+                fields = pack_responses(question_ids, [buffered['answers'][q] for q in question_ids])
+                if attempt_id in existing:
+                    updates.append(ExamResponse(id=existing[attempt_id], attempt_id=attempt_id, updated_at=now, **fields))
+                else:
+                    creates.append(ExamResponse(attempt_id=attempt_id, **fields))
+            ExamResponse.objects.bulk_update(updates, ['question_ids', 'answers', 'updated_at'])
+            ExamResponse.objects.bulk_create(creates)
+        cache.set_many(
+            {_autosave_flushed_key(attempt_id): buffered['seq'] for attempt_id, buffered in dirty.items()},
+            AUTOSAVE_TIMEOUT
+        )
+        written += len(dirty)
+    return written
+
+
+def finalize_attempts(deadlines):
+    """
+    Completes the in-progress attempts in `deadlines` ({attempt id: deadline}),
+    grading them from their saved answers. Attempts submitted in the meantime
+    are left alone. Returns the number of attempts finalized.
+    """
+    from .models import ExamAttempt, ExamResponse
+
+    flush_autosaves(list(deadlines))
+    now = timezone.now()
+    with transaction.atomic():
+        attempts = list(
+            ExamAttempt.objects.select_for_update(of=('self',))
+            .filter(id__in=deadlines, completed=False)
+            .select_related('exam')
+            .only('id', 'seed', 'question_bound', 'exam__id', 'exam__question_number', 'exam__shuffle_options')
+        )
+        responses = {
+            response.attempt_id: response
+            for response in ExamResponse.objects.filter(attempt_id__in=[attempt.id for attempt in attempts])
+        }
+        updates, creates = [], []
+        for attempt in attempts:
+            # Graded on the attempt's paper, as a submit from the browser is
+            answer_key = get_attempt_answer_key(attempt.exam, attempt)
+            response = responses.get(attempt.id)
+            saved = unpack_responses(response) if response else {}
+            answer_indexes = [saved.get(question_id, 0) for question_id in answer_key.question_ids]
+            attempt.marks_obtained = answer_key.score(answer_indexes)
+            attempt.completed = True
+            attempt.submission_time = deadlines[attempt.id]
+            # Keep the answers to the paper alone, as a submit does, for regrade_exam
+            fields = pack_responses(answer_key.question_ids, answer_indexes)
+            if response:
+                response.question_ids, response.answers = fields['question_ids'], fields['answers']
+                response.updated_at = now
+                updates.append(response)
+            else:
+                creates.append(ExamResponse(attempt_id=attempt.id, **fields))
+        ExamAttempt.objects.bulk_update(attempts, ['marks_obtained', 'completed', 'submission_time'])
+        ExamResponse.objects.bulk_update(updates, ['question_ids', 'answers', 'updated_at'])
+        ExamResponse.objects.bulk_create(creates)
+    for attempt in attempts:
+        discard_autosave(attempt.id)
+    return len(attempts)
+
+
+def iter_question_rows(lines, format):
+    """
+    Yields (line number, row dict or None) for a question bank given as an
+    iterable of text lines, reading one line at a time. A None row is a line
+    that could not be parsed. Text that cannot be decoded raises
+    UnicodeDecodeError from `lines`, which ends the rows.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(lines)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error:
+                # Such as a NUL byte or an oversized field; the reader goes on from the next line
+                row = None
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+
+
+def import_questions(lines, format, course):
+    """
+    Streams a CSV or JSONL question bank into `course`. Rows are validated
+    against the Question schema and inserted with bulk_create, one transaction
+    per chunk. Returns (number of questions created, number of invalid rows,
+    list of (line number, error) for the first invalid rows). Text that is not
+    UTF-8 ends the import at that line, keeping the rows before it.
+    """
+    from .forms import QuestionRowForm
+    from .models import Question
+
+    created = failed = 0
+    errors = []
+    chunk = []
+
+    def save_chunk():
+        with transaction.atomic():
+            Question.objects.bulk_create(chunk)
+            adjust_counter('question', len(chunk))
+        # bulk_create sends no post_save, so invalidate the course's cached data here
+        bump_question_set_version(course.id)
+        chunk.clear()
+
+    def record(line_number, error):
+        nonlocal failed
+        failed += 1
+        if len(errors) < QUESTION_IMPORT_MAX_ERRORS:
+            errors.append((line_number, error))
+
+    line_number = 0
+    try:
+        for line_number, row in iter_question_rows(lines, format):
+            if row is None:
+                record(line_number, "Could not parse the row.")
+                continue
+            form = QuestionRowForm(row)
+            if not form.is_valid():
+                error = " ".join(f"{field}: {' '.join(messages)}" for field, messages in form.errors.items())
+                record(line_number, error)
+                continue
+            question = form.save(commit=False)
+            question.course = course
+            chunk.append(question)
+            if len(chunk) >= QUESTION_IMPORT_CHUNK_SIZE:
+                created += len(chunk)
+                save_chunk()
+    except UnicodeDecodeError:
+        record(line_number + 1, "The file is not UTF-8 text from here on; the rest of it was not imported.")
+
+    if chunk:
+        created += len(chunk)
+        save_chunk()
+    return created, failed, errors
+
+
+def import_question_bank(upload, course):
+    """
+    Imports an uploaded question bank file into `course`, streaming it line by
+    line. Returns a dict with the created count, failed count and row errors.
+    """
+    format = QUESTION_BANK_FORMATS[os.path.splitext(upload.name)[1].lower()]
+    lines = codecs.iterdecode(upload, 'utf-8-sig')
+    created, failed, errors = import_questions(lines, format, course)
+    return {'course': course, 'created': created, 'failed': failed, 'errors': errors}
+
+
+def _save_roster_batch(batch, hashes, group_id):
+    """
+    Creates the users, Student profiles and STUDENT memberships of a batch of
+    (line number, cleaned row) in one transaction. Returns (created, errors)
+    with an error for each row whose username is already taken.
+    """
+    from django.contrib.auth.models import User
+    from student.models import Student
+
+    errors = []
+    rows = list(zip(batch, hashes))
+    for attempt in range(2):
+        taken = set(User.objects.filter(username__in=[row['username'] for (_, row), _ in rows])
+                    .values_list('username', flat=True))
+        errors += [(line_number, f"username: {row['username']} is already registered.")
+                   for (line_number, row), _ in rows if row['username'] in taken]
+        rows = [entry for entry in rows if entry[0][1]['username'] not in taken]
+        if not rows:
+            return 0, errors
+        try:
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(username=row['username'], first_name=row['first_name'], last_name=row['last_name'],
+                         password=password)
+                    for (_, row), password in rows
+                ])
+                Student.objects.bulk_create([
+                    Student(user=user, address=row['address'], mobile=row['mobile'])
+                    for user, ((_, row), _) in zip(users, rows)
+                ])
+                User.groups.through.objects.bulk_create([
+                    User.groups.through(user_id=user.id, group_id=group_id) for user in users
+                ])
+                # bulk_create sends no post_save, so keep the dashboard counter here
+                adjust_counter('student', len(users))
+        except IntegrityError:
+            if attempt:
+                raise
+            # A username was registered since it was checked; check the batch again
+            continue
+        # Ids taken by a rolled-back transaction are handed out again, and a role
+        # may have been cached for the user that briefly had one
+        cache.delete_many([_role_key(user.id) for user in users])
+        return len(users), errors
+
+
+def import_roster(lines, workers=None, batch_size=ROSTER_BATCH_SIZE):
+    """
+    Streams a CSV roster of students into User, Student and STUDENT group
+    rows, created with bulk_create a batch at a time. Passwords are hashed in
+    a pool of `workers` processes, as each hash is deliberately slow, or in
+    this process when `workers` is 0. Returns (number of students created, number of rows skipped, list of
+    (line number, error) for the first skipped rows).
+    """
+    from django.contrib.auth.models import Group
+    from django.contrib.auth.hashers import make_password
+    from student.forms import RosterRowForm
+
+    group_id = Group.objects.get_or_create(name=STUDENT)[0].id
+    created = failed = 0
+    errors = []
+    seen = {}
+    batch = []
+
+    def record(line_number, error):
+        nonlocal failed
+        failed += 1
+        if len(errors) < ROSTER_MAX_ERRORS:
+            errors.append((line_number, error))
+
+    def save_batch():
+        nonlocal created
+        passwords = [row['password'] for _, row in batch]
+        if pool is None:
+            hashes = [make_password(password) for password in passwords]
+        else:
+            chunksize = max(1, len(batch) // ((workers or os.cpu_count()) * 4))
+            hashes = list(pool.map(make_password, passwords, chunksize=chunksize))
+        saved, batch_errors = _save_roster_batch(batch, hashes, group_id)
+        created += saved
+        for line_number, error in batch_errors:
+            record(line_number, error)
+        batch.clear()
+
+    if workers == 0:
+        pool_context = nullcontext()
+    else:
+        # The worker processes only hash passwords; keep them from inheriting a database connection
+        connections.close_all()
+        pool_context = ProcessPoolExecutor(max_workers=workers)
+    with pool_context as pool:
+        reader = csv.DictReader(lines)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                break
+            except csv.Error:
+                record(reader.line_num, "Could not parse the row.")
+                continue
+            except UnicodeDecodeError:
+                error = "The file is not UTF-8 text from here on; the rest of it was not imported."
+                record(reader.line_num + 1, error)
+                break
+            form = RosterRowForm(row)
+            if not form.is_valid():
+                record(reader.line_num, " ".join(
+                    f"{field}: {' '.join(messages)}" for field, messages in form.errors.items()
+                ))
+                continue
+            username = form.cleaned_data['username']
+            if username in seen:
+                record(reader.line_num, f"username: {username} is repeated from line {seen[username]}.")
+                continue
+            seen[username] = reader.line_num
+            batch.append((reader.line_num, form.cleaned_data))
+            if len(batch) >= batch_size:
+                save_batch()
+        if batch:
+            save_batch()
+    # Taken usernames are only found when their batch is saved
+    errors.sort()
+    return created, failed, errors
+
+
+def import_roster_upload(upload):
+    """
+    Imports an uploaded CSV roster of at most ROSTER_UPLOAD_MAX_ROWS students,
+    streaming it line by line and hashing the passwords in this process, so
+    the web request neither forks nor closes its database connections. Returns
+    a dict with the created count, failed count and row errors.
+    """
+    created, failed, errors = import_roster(codecs.iterdecode(upload, 'utf-8-sig'), workers=0)
+    return {'created': created, 'failed': failed, 'errors': errors}
+
+
+def iter_gradebook_rows(assignment_owner=None):
+    """
+    Yields the gradebook as rows: a header, then every exam attempt and every
+    assignment submission (only those of `assignment_owner`'s assignments when
+    given). Rows are read in chunks through .iterator(), so memory stays flat.
+    """
+    from assignment.models import Submission
+    from .models import ExamAttempt
+
+    yield GRADEBOOK_HEADER
+
+    attempts = (
+        ExamAttempt.objects.select_related('student__user', 'exam')
+        .only('completed', 'marks_obtained', 'submission_time', 'student__user__username',
+              'student__user__first_name', 'student__user__last_name', 'exam__course_name', 'exam__total_marks')
+        .order_by('id')
+    )
+    for attempt in attempts.iterator(chunk_size=GRADEBOOK_CHUNK_SIZE):
+        user = attempt.student.user
+        yield (
+            'Exam', user.username, f"{user.first_name} {user.last_name}".strip(), attempt.exam.course_name,
+            attempt.marks_obtained, attempt.exam.total_marks,
+            'Completed' if attempt.completed else 'In Progress',
+            attempt.submission_time.isoformat() if attempt.submission_time else '',
+        )
+
+    submissions = (
+        Submission.objects.select_related('student', 'assignment')
+        .only('grade', 'submitted_at', 'student__username', 'student__first_name', 'student__last_name',
+              'assignment__title', 'assignment__marks')
+        .order_by('id')
+    )
+    if assignment_owner is not None:
+        submissions = submissions.filter(assignment__created_by=assignment_owner)
+    for submission in submissions.iterator(chunk_size=GRADEBOOK_CHUNK_SIZE):
+        user = submission.student
+        yield (
+            'Assignment', user.username, f"{user.first_name} {user.last_name}".strip(), submission.assignment.title,
+            submission.grade, submission.assignment.marks,
+            'Graded' if submission.grade is not None else 'Pending',
+            submission.submitted_at.isoformat(),
+        )
+
+
+class _Echo:
+    # file-like object for csv.writer that hands each line back instead of buffering it
+    def write(self, value):
+        return value
+
+
+def gradebook_response(assignment_owner=None):
+    """
+    Returns a StreamingHttpResponse with the gradebook as CSV.
+    """
+    writer = csv.writer(_Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in iter_gradebook_rows(assignment_owner)),
+        content_type='text/csv'
+    )
+    response['Content-Disposition'] = 'attachment; filename="gradebook.csv"'
+    return response
+
+
+# Role of a user: the STUDENT/TEACHER group name (None for anyone else), whether
+# the account is approved, and the matching Student or Teacher profile.
+UserRole = namedtuple('UserRole', ['name', 'approved', 'profile'])
+ANONYMOUS_ROLE = UserRole(None, False, None)
+
+
+def _role_key(user_id):
+    return f"auth:user:{user_id}:role"
+
+
+def resolve_role(user):
+    """
+    Returns the UserRole of a user. It is resolved at most once per request
+    and kept in the cache until the user's groups or profile change.
+    """
+    if not user.is_authenticated:
+        return ANONYMOUS_ROLE
+    role = getattr(user, '_role', None)
+    if role is None:
+        role = cache.get(_role_key(user.id))
+        if role is None:
+            from student.models import Student
+            from teacher.models import Teacher
+
+            groups = set(user.groups.values_list('name', flat=True))
+            if STUDENT in groups:
+                role = UserRole(STUDENT, True, Student.objects.filter(user_id=user.id).first())
+            elif TEACHER in groups:
+                teacher = Teacher.objects.filter(user_id=user.id).first()
+                role = UserRole(TEACHER, bool(teacher and teacher.status), teacher)
+            else:
+                role = UserRole(None, True, None)
+            cache.set(_role_key(user.id), role, ROLE_TIMEOUT)
+        user._role = role
+    return role
+
+
+def invalidate_role(user_id):
+    cache.delete(_role_key(user_id))
+
+
+def _counted_querysets():
+    from assignment.models import Assignment
+    from student.models import Student
+    from teacher.models import Teacher
+    from .models import Course, Question
+
+    return {
+        'student': Student.objects.all(),
+        'teacher': Teacher.objects.filter(status=True),
+        'pending_teacher': Teacher.objects.filter(status=False),
+        'course': Course.objects.all(),
+        'question': Question.objects.all(),
+        'assignment': Assignment.objects.all(),
+    }
+
+
+def assignment_counter(user_id):
+    return f"assignment:user:{user_id}"
+
+
+def _count(name):
+    if name.startswith('assignment:user:'):
+        from assignment.models import Assignment
+
+        return Assignment.objects.filter(created_by_id=int(name.rsplit(':', 1)[1])).count()
+    return _counted_querysets()[name].count()
+
+
+def adjust_counter(name, delta):
+    from .models import Counter
+
+    if not Counter.objects.filter(name=name).update(value=F('value') + delta):
+        # First change since the counter was added: start from the real count
+        Counter.objects.update_or_create(name=name, defaults={'value': _count(name)})
+    cache.delete('exam:counters')
+
+
+def refresh_counter(name):
+    from .models import Counter
+
+    Counter.objects.update_or_create(name=name, defaults={'value': _count(name)})
+    cache.delete('exam:counters')
+
+
+def get_counters():
+    """
+    Returns every dashboard counter as a {name: value} dict from a single
+    cached lookup. Per-teacher assignment counts are named by assignment_counter().
+    """
+    counters = cache.get('exam:counters')
+    if counters is None:
+        from .models import Counter
+
+        counters = dict(Counter.objects.values_list('name', 'value'))
+        if any(name not in counters for name in _counted_querysets()):
+            reconcile_counters()
+            counters = dict(Counter.objects.values_list('name', 'value'))
+        cache.set('exam:counters', counters, COUNTERS_TIMEOUT)
+    return counters
+
+
+def reconcile_counters():
+    """
+    Recounts every counter and corrects the ones that drifted (for example
+    after bulk operations that send no signals). Returns a list of
+    (name, stored value, real value) for the corrected counters.
+    """
+    from assignment.models import Assignment
+    from .models import Counter
+
+    real = {name: queryset.count() for name, queryset in _counted_querysets().items()}
+    for user_id, total in Assignment.objects.values_list('created_by').annotate(total=Count('id')).order_by():
+        real[assignment_counter(user_id)] = total
+
+    stored = dict(Counter.objects.values_list('name', 'value'))
+    drifted = []
+    with transaction.atomic():
+        for name in set(real) | set(stored):
+            value = real.get(name, 0)
+            if stored.get(name) != value:
+                drifted.append((name, stored.get(name), value))
+                Counter.objects.update_or_create(name=name, defaults={'value': value})
+    cache.delete('exam:counters')
+    return drifted
+
+
+class KeysetPage:
+    """
+    One page of a list view: the items plus what the list templates need to
+    render the search box, sort choices and pager.
+    """
+
+    def __init__(self, items, sort, sort_choices, query, next_url, first_url):
+        self.items = items
+        self.sort = sort
+        self.sort_choices = sort_choices
+        self.query = query
+        self.next_url = next_url
+        self.first_url = first_url
+
+
+def _encode_cursor(values):
+    # DjangoJSONEncoder cuts datetimes to milliseconds, which would skip rows within the boundary's millisecond
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values, cls=DjangoJSONEncoder).encode()).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (AttributeError, ValueError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def _lookup(obj, path):
+    for name in path.split('__'):
+        obj = getattr(obj, name)
+    return obj
+
+
+def keyset_page(request, queryset, sorts, search_fields=(), page_size=LIST_PAGE_SIZE):
+    """
+    Returns a KeysetPage of `queryset` for the request's `q` (search),
+    `sort` and `after` (cursor) parameters.
+
+    `sorts` is a list of (value, label, ordering) choices, the first being the
+    default. Pages continue after the last row of the previous page instead
+    of using OFFSET, so every page costs the same however deep it is. The
+    queryset should already carry its select_related()/only() projections.
+    """
+    orderings = {value: ordering for value, label, ordering in sorts}
+    sort = request.GET.get('sort')
+    if sort not in orderings:
+        sort = sorts[0][0]
+    ordering = list(orderings[sort])
+    if ordering[-1].lstrip('-') != 'id':
+        # the primary key makes the ordering total, so no row is skipped or repeated
+        ordering.append('-id' if ordering[0].startswith('-') else 'id')
+
+    query = request.GET.get('q', '').strip()
+    if query and search_fields:
+        queryset = queryset.filter(reduce(operator.or_, (Q(**{f"{field}__icontains": query}) for field in search_fields)))
+
+    cursor = _decode_cursor(request.GET.get('after', ''))
+    if cursor is not None and len(cursor) == len(ordering):
+        after, equal = Q(), Q()
+        for field, value in zip(ordering, cursor):
+            name = field.lstrip('-')
+            after |= equal & Q(**{f"{name}__{'lt' if field.startswith('-') else 'gt'}": value})
+            equal &= Q(**{name: value})
+        queryset = queryset.filter(after)
+
+    items = list(queryset.order_by(*ordering)[:page_size + 1])
+    next_url = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        cursor = _encode_cursor([_lookup(items[-1], field.lstrip('-')) for field in ordering])
+        next_url = '?' + urlencode({'q': query, 'sort': sort, 'after': cursor})
+    first_url = '?' + urlencode({'q': query, 'sort': sort}) if 'after' in request.GET else None
+    return KeysetPage(items, sort, [(value, label) for value, label, ordering in sorts], query, next_url, first_url)
+
+
+def delete_in_chunks(queryset, chunk_size=DELETE_CHUNK_SIZE, on_chunk=None):
+    """
+    Deletes the rows of `queryset` a chunk at a time, each chunk in its own
+    transaction, so a large delete never holds the database write lock for long.
+    `on_chunk(ids)` is called inside each chunk's transaction, before its delete.
+    Returns the number of rows deleted.
+    """
+    model = queryset.model
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            if on_chunk is not None:
+                on_chunk(ids)
+            deleted += model.objects.filter(pk__in=ids).delete()[1].get(model._meta.label, 0)
+
+
+def delete_course(course):
+    """
+    Deletes a course with its attempts, responses and questions in chunks,
+    then the course itself.
+    """
+    from .models import ExamAttempt, ExamResponse, Question
+
+    delete_in_chunks(ExamResponse.objects.filter(attempt__exam=course))
+    delete_in_chunks(ExamAttempt.objects.filter(exam=course))
+    delete_in_chunks(Question.objects.filter(course=course))
+    course.delete()
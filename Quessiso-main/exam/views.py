@@ -12,7 +12,11 @@ from teacher import models as TMODEL
 from student import models as SMODEL
 from teacher import forms as TFORM
 from student import forms as SFORM
-from assignment.models import Assignment
+from assignment.utils import delete_assignment, delete_submissions
+from .utils import (
+    PERSON_SEARCH_FIELDS, PERSON_SORTS, STUDENT, TEACHER, delete_course, get_counters, gradebook_response,
+    import_question_bank, import_roster_upload, keyset_page, resolve_role
+)
 from django.contrib.auth.models import User
 
 
@@ -24,18 +28,17 @@ def home_view(request):
 
 
 def is_teacher(user):
-    return user.groups.filter(name='TEACHER').exists()
+    return resolve_role(user).name == TEACHER
 
 def is_student(user):
-    return user.groups.filter(name='STUDENT').exists()
+    return resolve_role(user).name == STUDENT
 
 def afterlogin_view(request):
-    if is_student(request.user):      
+    if request.role.name == STUDENT:
         return redirect('student/student-dashboard')
                 
-    elif is_teacher(request.user):
-        accountapproval=TMODEL.Teacher.objects.all().filter(user_id=request.user.id,status=True)
-        if accountapproval:
+    elif request.role.name == TEACHER:
+        if request.role.approved:
             return redirect('teacher/teacher-dashboard')
         else:
             return render(request,'teacher/teacher_wait_for_approval.html')
@@ -52,27 +55,33 @@ def adminclick_view(request):
 
 @login_required(login_url='adminlogin')
 def admin_dashboard_view(request):
+    counters=get_counters()
     dict={
-    'total_student':SMODEL.Student.objects.all().count(),
-    'total_teacher':TMODEL.Teacher.objects.all().filter(status=True).count(),
-    'total_course':models.Course.objects.all().count(),
-    'total_question':models.Question.objects.all().count(),
-    'total_assignment' : Assignment.objects.count()
+    'total_student':counters['student'],
+    'total_teacher':counters['teacher'],
+    'total_course':counters['course'],
+    'total_question':counters['question'],
+    'total_assignment' : counters['assignment']
     }
     return render(request,'exam/admin_dashboard.html',context=dict)
 
 @login_required(login_url='adminlogin')
 def admin_teacher_view(request):
+    counters=get_counters()
     dict={
-    'total_teacher':TMODEL.Teacher.objects.all().filter(status=True).count(),
-    'pending_teacher':TMODEL.Teacher.objects.all().filter(status=False).count(),
+    'total_teacher':counters['teacher'],
+    'pending_teacher':counters['pending_teacher'],
     }
     return render(request,'exam/admin_teacher.html',context=dict)
 
 @login_required(login_url='adminlogin')
 def admin_view_teacher_view(request):
-    teachers= TMODEL.Teacher.objects.all().filter(status=True)
-    return render(request,'exam/admin_view_teacher.html',{'teachers':teachers})
+    teachers= (
+        TMODEL.Teacher.objects.filter(status=True).select_related('user')
+        .only('profile_pic','mobile','address','designation','user__first_name','user__last_name')
+    )
+    page=keyset_page(request,teachers,PERSON_SORTS,PERSON_SEARCH_FIELDS)
+    return render(request,'exam/admin_view_teacher.html',{'teachers':page.items,'page':page})
 
 
 @login_required(login_url='adminlogin')
@@ -99,8 +108,9 @@ def update_teacher_view(request,pk):
 def delete_teacher_view(request,pk):
     teacher=TMODEL.Teacher.objects.get(id=pk)
     user=User.objects.get(id=teacher.user_id)
+    for assignment in user.assignments.all():
+        delete_assignment(assignment)
     user.delete()
-    teacher.delete()
     return HttpResponseRedirect('/admin-view-teacher')
 
 
@@ -108,7 +118,7 @@ def delete_teacher_view(request,pk):
 
 @login_required(login_url='adminlogin')
 def admin_view_pending_teacher_view(request):
-    teachers= TMODEL.Teacher.objects.all().filter(status=False)
+    teachers= TMODEL.Teacher.objects.filter(status=False).select_related('user')
     return render(request,'exam/admin_view_pending_teacher.html',{'teachers':teachers})
 
 
@@ -131,8 +141,9 @@ def approve_teacher_view(request,pk):
 def reject_teacher_view(request,pk):
     teacher=TMODEL.Teacher.objects.get(id=pk)
     user=User.objects.get(id=teacher.user_id)
+    for assignment in user.assignments.all():
+        delete_assignment(assignment)
     user.delete()
-    teacher.delete()
     return HttpResponseRedirect('/admin-view-pending-teacher')
 
 
@@ -142,14 +153,28 @@ def reject_teacher_view(request,pk):
 @login_required(login_url='adminlogin')
 def admin_student_view(request):
     dict={
-    'total_student':SMODEL.Student.objects.all().count(),
+    'total_student':get_counters()['student'],
     }
     return render(request,'exam/admin_student.html',context=dict)
 
+@login_required(login_url='adminlogin')
+def admin_import_student_view(request):
+    rosterForm=SFORM.RosterForm()
+    result=None
+    if request.method=='POST':
+        rosterForm=SFORM.RosterForm(request.POST,request.FILES)
+        if rosterForm.is_valid():
+            result=import_roster_upload(rosterForm.cleaned_data['file'])
+    return render(request,'exam/admin_import_student.html',{'rosterForm':rosterForm,'result':result})
+
 @login_required(login_url='adminlogin')
 def admin_view_student_view(request):
-    students= SMODEL.Student.objects.all()
-    return render(request,'exam/admin_view_student.html',{'students':students})
+    students= (
+        SMODEL.Student.objects.select_related('user')
+        .only('profile_pic','mobile','address','user__first_name','user__last_name')
+    )
+    page=keyset_page(request,students,PERSON_SORTS,PERSON_SEARCH_FIELDS)
+    return render(request,'exam/admin_view_student.html',{'students':page.items,'page':page})
 
 
 
@@ -177,8 +202,8 @@ def update_student_view(request,pk):
 def delete_student_view(request,pk):
     student=SMODEL.Student.objects.get(id=pk)
     user=User.objects.get(id=student.user_id)
+    delete_submissions(user.submissions.all())
     user.delete()
-    student.delete()
     return HttpResponseRedirect('/admin-view-student')
 
 
@@ -208,7 +233,7 @@ def admin_view_course_view(request):
 @login_required(login_url='adminlogin')
 def delete_course_view(request,pk):
     course=models.Course.objects.get(id=pk)
-    course.delete()
+    delete_course(course)
     return HttpResponseRedirect('/admin-view-course')
 
 
@@ -234,6 +259,17 @@ def admin_add_question_view(request):
     return render(request,'exam/admin_add_question.html',{'questionForm':questionForm})
 
 
+@login_required(login_url='adminlogin')
+def admin_import_question_view(request):
+    bankForm=forms.QuestionBankForm()
+    result=None
+    if request.method=='POST':
+        bankForm=forms.QuestionBankForm(request.POST,request.FILES)
+        if bankForm.is_valid():
+            result=import_question_bank(bankForm.cleaned_data['file'],bankForm.cleaned_data['courseID'])
+    return render(request,'exam/admin_import_question.html',{'bankForm':bankForm,'result':result})
+
+
 @login_required(login_url='adminlogin')
 def admin_view_question_view(request):
     courses= models.Course.objects.all()
@@ -252,8 +288,13 @@ def delete_question_view(request,pk):
 
 @login_required(login_url='adminlogin')
 def admin_view_student_marks_view(request):
-    students= SMODEL.Student.objects.all()
-    return render(request,'exam/admin_view_student_marks.html',{'students':students})
+    students= SMODEL.Student.objects.select_related('user').only('profile_pic','user__first_name','user__last_name')
+    page=keyset_page(request,students,PERSON_SORTS,PERSON_SEARCH_FIELDS)
+    return render(request,'exam/admin_view_student_marks.html',{'students':page.items,'page':page})
+
+@login_required(login_url='adminlogin')
+def admin_export_gradebook_view(request):
+    return gradebook_response()
 
 @login_required(login_url='adminlogin')
 def admin_view_marks_view(request,pk):
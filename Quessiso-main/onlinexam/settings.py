@@ -49,11 +49,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'exam.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     #'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'exam.middleware.RoleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -144,6 +146,32 @@ MESSAGE_TAGS = {
     message_constants.ERROR: 'danger',
 }
 
+# Request profiling: Server-Timing headers on every response and a sampled,
+# rotating JSON log of slow requests. Off unless REQUEST_PROFILING=1.
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING') == '1'
+REQUEST_PROFILING_SLOW_MS = int(os.environ.get('REQUEST_PROFILING_SLOW_MS', 500))
+REQUEST_PROFILING_SAMPLE_RATE = float(os.environ.get('REQUEST_PROFILING_SAMPLE_RATE', 1.0))
+REQUEST_PROFILING_LOG = os.path.join(BASE_DIR, 'logs', 'slow_requests.log')
+
+# Answer keys, exam papers, roles and counters are cached. Point every process at one
+# Memcached or Redis server in production, e.g. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# and CACHE_LOCATION=redis://127.0.0.1:6379/1; exam autosaves are then buffered there too
+# (exam.utils.cache_is_shared). The default is a cache local to each process, which only
+# suits a single process: another process would go on serving papers and counts it cached.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Text extracted from submitted files, cached by content hash (assignment.utils.extract_text)
+SUBMISSION_TEXT_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'submission_text')
+SUBMISSION_TEXT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Full-text index of graded submissions' text (assignment.search); FTS5 needs SQLite
+SUBMISSION_SEARCH_BACKEND = 'assignment.search.FTS5Backend'
+
 #for contact us give your gmail id and password
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
  # host email password required
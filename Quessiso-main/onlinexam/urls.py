@@ -32,7 +32,9 @@ urlpatterns = [
 
     path('admin-student', views.admin_student_view,name='admin-student'),
     path('admin-view-student', views.admin_view_student_view,name='admin-view-student'),
+    path('admin-import-student', views.admin_import_student_view,name='admin-import-student'),
     path('admin-view-student-marks', views.admin_view_student_marks_view,name='admin-view-student-marks'),
+    path('admin-export-gradebook', views.admin_export_gradebook_view,name='admin-export-gradebook'),
     path('admin-view-marks/<int:pk>', views.admin_view_marks_view,name='admin-view-marks'),
     path('admin-check-marks/<int:pk>', views.admin_check_marks_view,name='admin-check-marks'),
     path('update-student/<int:pk>', views.update_student_view,name='update-student'),
@@ -45,6 +47,7 @@ urlpatterns = [
 
     path('admin-question', views.admin_question_view,name='admin-question'),
     path('admin-add-question', views.admin_add_question_view,name='admin-add-question'),
+    path('admin-import-question', views.admin_import_question_view,name='admin-import-question'),
     path('admin-view-question', views.admin_view_question_view,name='admin-view-question'),
     path('view-question/<int:pk>', views.view_question_view,name='view-question'),
     path('delete-question/<int:pk>', views.delete_question_view,name='delete-question'),
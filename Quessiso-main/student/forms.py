@@ -1,7 +1,10 @@
 from django import forms
 from django.contrib.auth.models import User
+from django.contrib.auth.validators import UnicodeUsernameValidator
+import os
 from . import models
 from exam import models as QMODEL
+from exam.utils import ROSTER_UPLOAD_MAX_ROWS
 
 class StudentUserForm(forms.ModelForm):
     class Meta:
@@ -16,3 +19,35 @@ class StudentForm(forms.ModelForm):
         model=models.Student
         fields=['address','mobile','profile_pic']
 
+
+class RosterRowForm(forms.Form):
+    # validates one row of an imported student roster
+    username=forms.CharField(max_length=150,validators=[UnicodeUsernameValidator()])
+    first_name=forms.CharField(max_length=150)
+    last_name=forms.CharField(max_length=150,required=False)
+    password=forms.CharField(strip=False)
+    address=forms.CharField(max_length=40,required=False)
+    mobile=forms.CharField(max_length=20)
+
+class RosterForm(forms.Form):
+    file=forms.FileField(
+        help_text="CSV with a header row and the columns username, first_name, last_name, password, address and mobile",
+        widget=forms.ClearableFileInput(attrs={'accept': '.csv'})
+    )
+
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        if os.path.splitext(file.name)[1].lower() != '.csv':
+            raise forms.ValidationError("Unsupported file extension. Please upload a CSV file.")
+        # Every password takes a deliberately slow hash, so only small rosters are imported in the request
+        rows = -1  # The header
+        for line in file:
+            if line.strip():
+                rows += 1
+            if rows > ROSTER_UPLOAD_MAX_ROWS:
+                raise forms.ValidationError(
+                    f"Rosters of more than {ROSTER_UPLOAD_MAX_ROWS} students must be imported with "
+                    "manage.py import_students, which hashes their passwords in parallel."
+                )
+        file.seek(0)
+        return file
@@ -1,3 +1,218 @@
-from django.test import TestCase
+import io
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from exam.models import Course, ExamAttempt, ExamResponse, Question
+from exam.tests import TEST_CACHES
+from exam.utils import (
+    ROSTER_UPLOAD_MAX_ROWS, AnswerKey, buffer_answers, draw_exam_paper, flush_autosaves, get_saved_answers,
+    pack_responses, unpack_responses,
+)
+from .models import Student
+
+
+def shared_cache():
+    # The memory cache is shared within the single test process, and its add() is atomic
+    return mock.patch('exam.utils.cache_is_shared', lambda: True)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AutosaveTests(TestCase):
+    """Autosaved answers must never overwrite a submitted attempt's answers."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('student')
+        self.user.groups.add(Group.objects.get_or_create(name='STUDENT')[0])
+        self.student = Student.objects.create(user=self.user, address='x', mobile='1')
+        self.course = Course.objects.create(course_name='Physics', question_number=2, total_marks=2, duration=30)
+        self.questions = [
+            Question.objects.create(
+                course=self.course, marks=1, question=f'Q{n}', option1='a', option2='b', option3='c', option4='d',
+                answer='Option1',
+            )
+            for n in range(2)
+        ]
+        self.client.force_login(self.user)
+
+    def start(self):
+        self.client.get(f'/student/start-exam/{self.course.id}')
+        return ExamAttempt.objects.get()
+
+    def test_autosave_after_deadline_is_rejected(self):
+        attempt = self.start()
+        # The deadline is taken from the session, as the submit view does
+        session = self.client.session
+        session['exam_start_time'] = (attempt.attempt_time - timedelta(minutes=31)).isoformat()
+        session.save()
+
+        response = self.client.post('/student/autosave-exam', {str(self.questions[0].id): 'Option1'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(get_saved_answers(attempt.id), {})
+
+    @shared_cache()
+    def test_flush_leaves_submitted_attempt_alone(self):
+        attempt = self.start()
+        question_id = self.questions[0].id
+        # Buffered, then submitted with another answer before the next flush
+        buffer_answers(attempt.id, {question_id: 2})
+        ExamAttempt.objects.filter(id=attempt.id).update(completed=True, marks_obtained=1)
+        ExamResponse.objects.update_or_create(attempt=attempt, defaults=pack_responses([question_id], [1]))
+
+        self.assertEqual(flush_autosaves([attempt.id]), 0)
+        self.assertEqual(unpack_responses(ExamResponse.objects.get()), {question_id: 1})
+
+    @shared_cache()
+    def test_buffered_answers_wait_for_the_flush(self):
+        attempt = self.start()
+        self.client.post('/student/autosave-exam', {str(self.questions[0].id): 'Option2'})
+        self.assertFalse(ExamResponse.objects.exists())
+        self.assertEqual(get_saved_answers(attempt.id), {self.questions[0].id: 2})
+
+        with mock.patch('exam.management.commands.flush_autosaves.cache_is_shared', return_value=True):
+            call_command('flush_autosaves', stdout=io.StringIO())
+        self.assertEqual(unpack_responses(ExamResponse.objects.get()), {self.questions[0].id: 2})
+
+    @shared_cache()
+    def test_sweeper_grades_buffered_answers(self):
+        attempt = self.start()
+        buffer_answers(attempt.id, {self.questions[0].id: 1, self.questions[1].id: 2})
+        ExamAttempt.objects.filter(id=attempt.id).update(attempt_time=attempt.attempt_time - timedelta(hours=1))
+
+        call_command('sweep_exam_deadlines', '--once', '--grace=0', stdout=io.StringIO())
+        attempt.refresh_from_db()
+        self.assertTrue(attempt.completed)
+        self.assertEqual(attempt.marks_obtained, 1)
+
+    @shared_cache()
+    def test_busy_attempt_is_not_overwritten(self):
+        attempt = self.start()
+        cache.add(f'exam:attempt:{attempt.id}:autosave_lock', True)
+        with mock.patch('exam.utils.AUTOSAVE_LOCK_WAIT', 0):
+            response = self.client.post('/student/autosave-exam', {str(self.questions[0].id): 'Option1'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(get_saved_answers(attempt.id), {})
+
+    def test_unshared_cache_saves_at_once(self):
+        attempt = self.start()
+        self.client.post('/student/autosave-exam', {str(self.questions[0].id): 'Option2'})
+        self.client.post('/student/autosave-exam', {str(self.questions[1].id): 'Option3'})
+        self.assertEqual(
+            unpack_responses(ExamResponse.objects.get()), {self.questions[0].id: 2, self.questions[1].id: 3}
+        )
+
+        # A submitted attempt keeps the answers it was graded on
+        ExamAttempt.objects.filter(id=attempt.id).update(completed=True)
+        buffer_answers(attempt.id, {self.questions[0].id: 1})
+        self.assertEqual(unpack_responses(ExamResponse.objects.get())[self.questions[0].id], 2)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ExamPaperDrawTests(TestCase):
+    """A sampled paper is rebuilt from the attempt, out of the questions there were when it started."""
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('student')
+        user.groups.add(Group.objects.get_or_create(name='STUDENT')[0])
+        Student.objects.create(user=user, address='x', mobile='1')
+        self.course = Course.objects.create(
+            course_name='Physics', question_number=2, total_marks=2, duration=30, shuffle_options=True
+        )
+        self.questions = [self.new_question(f'Q{n}') for n in range(4)]
+        self.client.force_login(user)
+
+    def new_question(self, text):
+        return Question.objects.create(course=self.course, marks=1, question=text, option1='a', option2='b',
+                                       option3='c', option4='d', answer='Option1')
+
+    def start(self):
+        """Starts or resumes the exam and returns (attempt, drawn question ids, rendered paper)."""
+        response = self.client.get(f'/student/start-exam/{self.course.id}')
+        attempt = ExamAttempt.objects.get()
+        return attempt, draw_exam_paper(self.course, attempt)[0], response.context['paper']
+
+    def change_pool(self, drawn):
+        # One question off the paper is removed and a late one added
+        Question.objects.filter(id__in=[q.id for q in self.questions if q.id not in drawn][:1]).delete()
+        return self.new_question('Late')
+
+    def test_resumed_paper_is_unchanged(self):
+        attempt, drawn, paper = self.start()
+        self.assertEqual(len(drawn), 2)
+        self.change_pool(drawn)
+        self.assertEqual(self.start()[1:], (drawn, paper))
+
+    def test_submit_is_graded_on_the_paper(self):
+        attempt, drawn, _ = self.start()
+        late = self.change_pool(drawn)
+        answers = {str(question_id): 'Option1' for question_id in drawn + [late.id]}
+        self.client.post('/student/calculate-marks', answers)
+        attempt.refresh_from_db()
+        self.assertTrue(attempt.completed)
+        self.assertEqual(attempt.marks_obtained, 2)
+        self.assertEqual(sorted(unpack_responses(ExamResponse.objects.get())), sorted(drawn))
+
+    def test_sweeper_grades_on_the_paper(self):
+        attempt, drawn, _ = self.start()
+        late = self.change_pool(drawn)
+        buffer_answers(attempt.id, {question_id: 1 for question_id in drawn + [late.id]})
+        ExamAttempt.objects.filter(id=attempt.id).update(attempt_time=attempt.attempt_time - timedelta(hours=1))
+        call_command('sweep_exam_deadlines', '--once', '--grace=0', stdout=io.StringIO())
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.marks_obtained, 2)
+        self.assertEqual(sorted(unpack_responses(ExamResponse.objects.get())), sorted(drawn))
+
+
+class AnswerKeyTests(SimpleTestCase):
+    def test_unanswered_never_scores(self):
+        # The second question's stored answer is not a valid option
+        answer_key = AnswerKey([1, 2, 3], [1, 0, 4], [2, 3, 5])
+        self.assertEqual(answer_key.score([1, 0, 0]), 2)
+        self.assertEqual(answer_key.grade({'1': 'Option1', '2': 'Option9', '3': 'Option4'}), 7)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class StudentProfileTests(TestCase):
+    def test_student_group_without_profile_gets_404(self):
+        cache.clear()
+        user = User.objects.create_user('orphan')
+        user.groups.add(Group.objects.get_or_create(name='STUDENT')[0])
+        course = Course.objects.create(course_name='Physics', question_number=0, total_marks=0)
+        self.client.force_login(user)
+        for url in (f'/student/start-exam/{course.id}', '/student/view-result'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@override_settings(CACHES=TEST_CACHES, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RosterUploadTests(TestCase):
+    """Uploads register small rosters in the request and send large ones to import_students."""
+
+    header = b'username,first_name,last_name,password,address,mobile\n'
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser('admin'))
+
+    def upload(self, content):
+        return self.client.post('/admin-import-student', {'file': SimpleUploadedFile('roster.csv', content)})
+
+    def test_small_roster_is_imported(self):
+        rows = b''.join(b'pupil%d,Pupil,%d,secret,x,1\n' % (n, n) for n in range(3))
+        result = self.upload(self.header + rows + b'pupil\xff,Pupil,x,secret,x,1\n').context['result']
+        self.assertEqual((result['created'], result['failed']), (3, 1))
+        self.assertEqual(Student.objects.count(), 3)
+
+    def test_large_roster_is_refused(self):
+        rows = b''.join(b'pupil%d,Pupil,%d,secret,x,1\n' % (n, n) for n in range(ROSTER_UPLOAD_MAX_ROWS + 1))
+        response = self.upload(self.header + rows)
+        self.assertIsNone(response.context['result'])
+        self.assertIn('import_students', str(response.context['rosterForm'].errors))
+        self.assertFalse(Student.objects.exists())
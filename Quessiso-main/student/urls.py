@@ -12,6 +12,7 @@ path('student-dashboard', views.student_dashboard_view,name='student-dashboard')
 path('student-exam', views.student_exam_view,name='student-exam'),
 path('take-exam/<int:pk>', views.take_exam_view,name='take-exam'),
 path('start-exam/<int:pk>', views.start_exam_view,name='start-exam'),
+path('autosave-exam', views.autosave_exam_view,name='autosave-exam'),
 
 path('calculate-marks', views.calculate_marks_view,name='calculate-marks'),
 path('view-result', views.view_result_view,name='view-result'),
@@ -20,6 +21,7 @@ path('student-marks', views.student_marks_view,name='student-marks'),
 
 path('student-assignment', assignment_views.student_assignment_view, name='student-assignment-view'),
 path('student-submit/<int:pk>/', assignment_views.upload_submission_view, name='upload-submission'),
+path('grading-status/<int:pk>', assignment_views.grading_status_view, name='grading-status'),
 path('student-submissions/<int:pk>/', assignment_views.check_submission_view, name='check-submission'),
 path('student-grades',assignment_views.my_marks_view,name='student-grades'),
 path('view-assignment-results',assignment_views.view_assignment_results, name='view-assignment-results'),
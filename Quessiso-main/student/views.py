@@ -1,15 +1,18 @@
 from django.shortcuts import render,redirect,get_object_or_404
-from . import forms,models
+from . import forms
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Sum
 from django.contrib.auth.models import Group
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponseRedirect, JsonResponse
 from django.contrib.auth.decorators import login_required,user_passes_test
 from django.conf import settings
 from exam import models as QMODEL
+from exam.profiling import profile_section
+from exam.utils import (
+    OPTION_VALUES, STUDENT, buffer_answers, discard_autosave, draw_exam_paper, get_answer_key,
+    get_attempt_answer_key, get_counters, get_exam_paper, get_saved_answers, option_index, pack_responses, resolve_role
+)
 from teacher import models as TMODEL
-from assignment.models import Assignment
 import datetime
 from django.urls import reverse
 from django.db import transaction
@@ -42,16 +45,23 @@ def student_signup_view(request):
     return render(request,'student/studentsignup.html',context=mydict)
 
 def is_student(user):
-    return user.groups.filter(name='STUDENT').exists()
+    return resolve_role(user).name == STUDENT
+
+def get_student(request):
+    # A user can be in the STUDENT group without a Student row
+    if request.profile is None:
+        raise Http404("No Student matches the given query.")
+    return request.profile
 
 @login_required(login_url='studentlogin')
 @user_passes_test(is_student)
 def student_dashboard_view(request):
+    counters=get_counters()
     dict={
     
-    'total_course':QMODEL.Course.objects.all().count(),
-    'total_question':QMODEL.Question.objects.all().count(),
-    'total_assignment' :Assignment.objects.count(),
+    'total_course':counters['course'],
+    'total_question':counters['question'],
+    'total_assignment' :counters['assignment'],
     }
     return render(request,'student/student_dashboard.html',context=dict)
 
@@ -65,9 +75,14 @@ def student_exam_view(request):
 @user_passes_test(is_student)
 def take_exam_view(request, pk):
     course = get_object_or_404(QMODEL.Course, id=pk)
-    total_questions = QMODEL.Question.objects.filter(course=course).count()
-    questions = QMODEL.Question.objects.filter(course=course)
-    total_marks = questions.aggregate(total=Sum('marks'))['total'] or 0
+    answer_key = get_answer_key(course.id)
+    if 0 < course.question_number < len(answer_key):
+        # Each student gets question_number questions drawn from the pool
+        total_questions = course.question_number
+        total_marks = course.total_marks
+    else:
+        total_questions = len(answer_key)
+        total_marks = answer_key.total_marks
     duration = course.duration  # Duration in minutes
 
     context = {
@@ -84,41 +99,88 @@ def take_exam_view(request, pk):
 @user_passes_test(is_student)
 def start_exam_view(request, pk):
     """
-    View to start the exam. Checks if the student has already attempted the exam.
+    View to start or resume the exam. Checks if the student has already attempted the exam.
     """
     course = get_object_or_404(QMODEL.Course, id=pk)
-    student = get_object_or_404(models.Student, user=request.user)
+    student = get_student(request)
     
     # Check if the student has already attempted the exam
     if QMODEL.ExamAttempt.objects.filter(exam=course, student=student, completed=True).exists():
         messages.info(request, "You have already attempted this exam.")
         return redirect('view-result')
     
-    questions = QMODEL.Question.objects.filter(course=course)
     duration = course.duration  # Duration in minutes
     
-    # Create an ExamAttempt entry if not exists
-    attempt, created = QMODEL.ExamAttempt.objects.get_or_create(student=student, exam=course)
-    if not created and not attempt.completed:
-        messages.info(request, "You have already started this exam.")
-        return redirect('take-exam', pk=course.id)
-    elif not created and attempt.completed:
+    # Create an ExamAttempt entry if not exists, drawing its paper from the questions there are now
+    pool = get_answer_key(course.id).question_ids
+    attempt, created = QMODEL.ExamAttempt.objects.get_or_create(
+        student=student, exam=course, defaults={'question_bound': pool[-1] if pool else 0}
+    )
+    if not created and attempt.completed:
         messages.info(request, "You have already attempted this exam.")
         return redirect('view-result')
-    
+
+    saved_answers = {}
+    if not created:
+        # Resume the attempt with its autosaved answers
+        saved_answers = {
+            str(question_id): OPTION_VALUES[index - 1]
+            for question_id, index in get_saved_answers(attempt.id).items() if index
+        }
+        messages.info(request, "Resuming your exam. Your saved answers have been restored.")
+
+    # The clock runs from the first start, so resuming does not extend the exam
+    elapsed = (timezone.now() - attempt.attempt_time).total_seconds()
+    remaining_seconds = max(0, int(duration * 60 - elapsed))
+
     # Record the exam start time and duration in the session
-    request.session['exam_start_time'] = timezone.now().isoformat()
+    request.session['exam_start_time'] = attempt.attempt_time.isoformat()
     request.session['exam_duration'] = duration
     request.session['course_id'] = course.id  # Store course_id in session
+    request.session['attempt_id'] = attempt.id
+
+    # Draw this attempt's questions and option order (None when everyone gets the whole paper)
+    question_ids, option_orders = draw_exam_paper(course, attempt)
     
     context = {
         'course': course,
-        'questions': questions,
+        'paper': get_exam_paper(course.id, question_ids, option_orders),
         'duration': duration,
+        'remaining_seconds': remaining_seconds,
+        'saved_answers': saved_answers,
     }
     
     return render(request, 'student/start_exam.html', context)
 
+@login_required(login_url='studentlogin')
+@user_passes_test(is_student)
+def autosave_exam_view(request):
+    """
+    Receives the answers changed since the last autosave of the exam in progress
+    and saves them, through the shared cache's buffer when there is one.
+    """
+    attempt_id = request.session.get('attempt_id')
+    course_id = request.session.get('course_id')
+    if request.method != 'POST' or not attempt_id or not course_id:
+        return JsonResponse({'error': "No exam in progress."}, status=400)
+    # Past the deadline the attempt is graded as it stands; later answers must not reach it
+    exam_end_time = (
+        datetime.datetime.fromisoformat(request.session['exam_start_time'])
+        + datetime.timedelta(minutes=request.session['exam_duration'])
+    )
+    if timezone.now() > exam_end_time:
+        return JsonResponse({'error': "The time for this exam is up."}, status=403)
+
+    # Grading reads the attempt's paper alone, so the course's questions are enough to filter on here
+    question_ids = set(get_answer_key(course_id).question_ids)
+    deltas = {}
+    for name, value in request.POST.items():
+        if name.isdigit() and int(name) in question_ids:
+            deltas[int(name)] = option_index(value)
+    if not buffer_answers(attempt_id, deltas):
+        return JsonResponse({'error': "Another save of this exam is in progress."}, status=503)
+    return JsonResponse({'saved': len(deltas)})
+
 # View to calculate and record marks
 @login_required(login_url='studentlogin')
 @user_passes_test(is_student)
@@ -159,21 +221,11 @@ def calculate_marks_view(request):
             messages.warning(request, "You have exceeded the allotted time for this exam.")
             # You can choose to handle late submissions differently here
 
-        # Proceed to calculate marks
-        total_marks_obtained = 0
-        questions = QMODEL.Question.objects.filter(course=course)
-
-        for question in questions:
-            # Retrieve the student's selected answer for each question
-            selected_answer = request.POST.get(str(question.id))
-            if selected_answer and selected_answer == question.answer:
-                total_marks_obtained += question.marks
-
         # Record the exam attempt within a transaction to ensure data integrity
         try:
             with transaction.atomic():
                 # Fetch the student profile
-                student = models.Student.objects.get(user=request.user)
+                student = get_student(request)
 
                 # Fetch the active exam attempt
                 exam_attempt = QMODEL.ExamAttempt.objects.get(
@@ -182,11 +234,24 @@ def calculate_marks_view(request):
                     completed=False
                 )
 
+                # Calculate marks against the cached answer key, on the attempt's paper as the sweeper does
+                with profile_section('grade_exam'):
+                    answer_key = get_attempt_answer_key(course, exam_attempt)
+                    answer_indexes = answer_key.answer_indexes(request.POST)
+                    total_marks_obtained = answer_key.score(answer_indexes)
+
                 # Update the exam attempt with the obtained marks and mark it as completed
                 exam_attempt.marks_obtained = total_marks_obtained
                 exam_attempt.completed = True
                 exam_attempt.submission_time = timezone.now()
                 exam_attempt.save()
+
+                # Keep the answers so the attempt can be re-graded later
+                discard_autosave(exam_attempt.id)
+                QMODEL.ExamResponse.objects.update_or_create(
+                    attempt=exam_attempt,
+                    defaults=pack_responses(answer_key.question_ids, answer_indexes)
+                )
         except QMODEL.ExamAttempt.DoesNotExist:
             messages.error(request, "No active exam attempt found or you have already completed the exam.")
             return redirect('student-dashboard')
@@ -196,7 +261,7 @@ def calculate_marks_view(request):
             return redirect('student-dashboard')
 
         # Clear the exam-related session data
-        for key in ['course_id', 'exam_start_time', 'exam_duration']:
+        for key in ['course_id', 'attempt_id', 'exam_start_time', 'exam_duration']:
             if key in request.session:
                 del request.session[key]
 
@@ -217,8 +282,8 @@ def view_result_view(request):
     """
     View to display all completed exam attempts and their results for the logged-in student.
     """
-    student = get_object_or_404(models.Student, user=request.user)
-    attempts = QMODEL.ExamAttempt.objects.filter(student=student, completed=True)
+    student = get_student(request)
+    attempts = QMODEL.ExamAttempt.objects.filter(student=student, completed=True).select_related('exam')
     
     context = {
         'attempts': attempts,
@@ -230,7 +295,7 @@ def view_result_view(request):
 @user_passes_test(is_student)
 def check_marks_view(request,pk):
     course=QMODEL.Course.objects.get(id=pk)
-    student = models.Student.objects.get(user_id=request.user.id)
+    student = get_student(request)
     results= QMODEL.ExamAttempt.objects.all().filter(exam=course).filter(student=student)
     return render(request,'student/check_marks.html',{'results':results})
 
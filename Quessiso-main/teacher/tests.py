@@ -1,3 +1,155 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from assignment.models import Assignment, Submission
+from exam.models import Course, ExamAttempt, Question
+from exam.tests import TEST_CACHES
+from exam.utils import GRADEBOOK_HEADER, get_counters, reconcile_counters
+from student.models import Student
+from .models import Teacher
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TeacherCounterTests(TestCase):
+    """Approving or removing a teacher moves the dashboard counts by one, without recounting."""
+
+    def setUp(self):
+        cache.clear()
+        reconcile_counters()
+
+    def counts(self):
+        counters = get_counters()
+        return counters['teacher'], counters['pending_teacher']
+
+    def test_counts_follow_approval(self):
+        teachers = [
+            Teacher.objects.create(user=User.objects.create_user(f'teacher{n}'), address='x', mobile='1')
+            for n in range(3)
+        ]
+        self.assertEqual(self.counts(), (0, 3))
+
+        teacher = Teacher.objects.get(id=teachers[0].id)
+        teacher.status = True
+        # The save and one update of each count
+        with self.assertNumQueries(3):
+            teacher.save()
+        self.assertEqual(self.counts(), (1, 2))
+        # Saving again without a change leaves the counts alone
+        with self.assertNumQueries(1):
+            teacher.save()
+
+        Teacher.objects.only('id', 'user').get(id=teachers[1].id).delete()
+        teacher.delete()
+        self.assertEqual(self.counts(), (0, 1))
+        self.assertEqual(reconcile_counters(), [])
+
+    def test_admin_removals_count_once(self):
+        teacher, pending = (
+            Teacher.objects.create(user=User.objects.create_user(f'teacher{n}'), address='x', mobile='1', status=status)
+            for n, status in enumerate((True, False))
+        )
+        student = Student.objects.create(user=User.objects.create_user('student'), address='x', mobile='1')
+        self.client.force_login(User.objects.create_superuser('admin'))
+
+        self.client.get(f'/delete-teacher/{teacher.id}')
+        self.client.get(f'/reject-teacher/{pending.id}')
+        self.client.get(f'/delete-student/{student.id}')
+        self.assertEqual(self.counts(), (0, 0))
+        self.assertEqual(get_counters()['student'], 0)
+        self.assertEqual(reconcile_counters(), [])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class QuestionImportTests(TestCase):
+    """A malformed question bank is reported, not a server error."""
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('teacher')
+        user.groups.add(Group.objects.get_or_create(name='TEACHER')[0])
+        Teacher.objects.create(user=user, address='x', mobile='1', status=True)
+        self.course = Course.objects.create(course_name='Physics', question_number=3, total_marks=3)
+        self.client.force_login(user)
+
+    def upload(self, name, content):
+        response = self.client.post('/teacher/teacher-import-question', {
+            'courseID': self.course.id, 'file': SimpleUploadedFile(name, content),
+        })
+        self.assertEqual(response.status_code, 200)
+        return response.context['result']
+
+    def test_bad_csv_row_and_undecodable_tail(self):
+        row = b'1,Q?,a,b,c,d,Option1\n'
+        content = b'marks,question,option1,option2,option3,option4,answer\n' + row + b'1,Q\0,a,b,c,d,Option1\n' + row
+        result = self.upload('bank.csv', content + b'1,Q\xff,a,b,c,d,Option1\n' + row)
+        self.assertEqual((result['created'], result['failed']), (2, 2))
+        self.assertEqual([line for line, error in result['errors']], [3, 5])
+        self.assertEqual(Question.objects.count(), 2)
+
+    def test_undecodable_jsonl(self):
+        row = json.dumps({
+            'marks': 1, 'question': 'Q?', 'option1': 'a', 'option2': 'b', 'option3': 'c', 'option4': 'd',
+            'answer': 'Option1',
+        }).encode() + b'\n'
+        result = self.upload('bank.jsonl', row + b'\xff\xfe\n' + row)
+        self.assertEqual((result['created'], result['failed']), (1, 1))
+
+
+@override_settings(CACHES=TEST_CACHES, MEDIA_ROOT=tempfile.mkdtemp())
+class GradebookExportTests(TestCase):
+    """The gradebook CSV lists exam attempts and submissions; a teacher's only their own assignments'."""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher, other = (self.new_teacher(name) for name in ('teacher', 'other'))
+        student = User.objects.create_user('pupil', first_name='Ada', last_name='Lovelace')
+        course = Course.objects.create(course_name='Physics', question_number=2, total_marks=10)
+        self.submitted = timezone.now()
+        ExamAttempt.objects.create(
+            student=Student.objects.create(user=student, address='x', mobile='1'), exam=course, completed=True,
+            marks_obtained=7, submission_time=self.submitted,
+        )
+        for owner, title, grade in ((self.teacher, 'Essay, part 1', 8.5), (other, 'Other essay', None)):
+            assignment = Assignment.objects.create(
+                title=title, description='d', due_date=timezone.now() + timedelta(days=1), created_by=owner, marks=10,
+            )
+            Submission.objects.create(
+                assignment=assignment, student=student, grade=grade,
+                file=SimpleUploadedFile('essay.docx', title.encode()),
+            )
+
+    def new_teacher(self, username):
+        user = User.objects.create_user(username)
+        user.groups.add(Group.objects.get_or_create(name='TEACHER')[0])
+        Teacher.objects.create(user=user, address='x', mobile='1', status=True)
+        return user
+
+    def export(self, user, url):
+        self.client.force_login(user)
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="gradebook.csv"')
+        return list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_teacher_sees_their_assignments(self):
+        rows = self.export(self.teacher, '/teacher/teacher-export-gradebook')
+        self.assertEqual(rows, [
+            list(GRADEBOOK_HEADER),
+            ['Exam', 'pupil', 'Ada Lovelace', 'Physics', '7', '10', 'Completed', self.submitted.isoformat()],
+            ['Assignment', 'pupil', 'Ada Lovelace', 'Essay, part 1', '8.5', '10', 'Graded', rows[2][7]],
+        ])
+
+    def test_admin_sees_every_assignment(self):
+        rows = self.export(User.objects.create_superuser('admin'), '/admin-export-gradebook')
+        self.assertEqual([row[3] for row in rows[1:]], ['Physics', 'Essay, part 1', 'Other essay'])
+        self.assertEqual(rows[3][4:7], ['', '10', 'Pending'])
 
-# Create your tests here.
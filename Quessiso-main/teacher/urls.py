@@ -15,12 +15,14 @@ path('teacher-add-exam', views.teacher_add_exam_view,name='teacher-add-exam'),
 path('teacher-view-exam', views.teacher_view_exam_view,name='teacher-view-exam'),
 path('delete-exam/<int:pk>', views.delete_exam_view,name='delete-exam'),
 path('teacher-view-student-marks/', views.teacher_view_student_marks_view, name='teacher-view-student-marks'),
+path('teacher-export-gradebook', views.teacher_export_gradebook_view, name='teacher-export-gradebook'),
 path('teacher-view-marks/<int:pk>/', views.teacher_view_marks_view, name='teacher-view-marks'),
 path('teacher-check-marks/<int:pk>/', views.teacher_check_marks_view, name='teacher-check-marks'),
 
 
 path('teacher-question', views.teacher_question_view,name='teacher-question'),
 path('teacher-add-question', views.teacher_add_question_view,name='teacher-add-question'),
+path('teacher-import-question', views.teacher_import_question_view,name='teacher-import-question'),
 path('teacher-view-question', views.teacher_view_question_view,name='teacher-view-question'),
 path('see-question/<int:pk>', views.see_question_view,name='see-question'),
 path('remove-question/<int:pk>', views.remove_question_view,name='remove-question'),
@@ -31,6 +33,7 @@ path('teacher-add-assignment', assignment_views.teacher_add_assignment_view, nam
 path('teacher-view-assignment', assignment_views.teacher_view_assignment_view, name='teacher-view-assignment'),
 path('teacher-delete-assignment/<int:pk>/', assignment_views.teacher_delete_assignment_view,name='teacher-delete-assignment'),
 path('teacher-view-submissions', assignment_views.teacher_view_submissions_view, name='teacher-view-submissions'),
+path('teacher-search-submissions', assignment_views.teacher_search_submissions_view, name='teacher-search-submissions'),
 
 
 
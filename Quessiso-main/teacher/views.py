@@ -11,7 +11,10 @@ from datetime import date, timedelta
 from exam import models as QMODEL
 from student import models as SMODEL
 from exam import forms as QFORM
-from assignment.models import Assignment
+from exam.utils import (
+    PERSON_SEARCH_FIELDS, PERSON_SORTS, TEACHER, assignment_counter, delete_course, get_counters,
+    gradebook_response, import_question_bank, keyset_page, resolve_role
+)
 
 
 
@@ -43,17 +46,18 @@ def teacher_signup_view(request):
 
 
 def is_teacher(user):
-    return user.groups.filter(name='TEACHER').exists()
+    return resolve_role(user).name == TEACHER
 
 @login_required(login_url='teacherlogin')
 @user_passes_test(is_teacher)
 def teacher_dashboard_view(request):
+    counters=get_counters()
     dict={
     
-    'total_course':QMODEL.Course.objects.all().count(),
-    'total_question':QMODEL.Question.objects.all().count(),
-    'total_student':SMODEL.Student.objects.all().count(),
-    'total_assignment' : Assignment.objects.filter(created_by=request.user).count(),
+    'total_course':counters['course'],
+    'total_question':counters['question'],
+    'total_student':counters['student'],
+    'total_assignment' : counters.get(assignment_counter(request.user.id), 0),
     }
     return render(request,'teacher/teacher_dashboard.html',context=dict)
 
@@ -95,7 +99,7 @@ def teacher_view_exam_view(request):
 @user_passes_test(is_teacher)
 def delete_exam_view(request,pk):
     course=QMODEL.Course.objects.get(id=pk)
-    course.delete()
+    delete_course(course)
     return HttpResponseRedirect('/teacher/teacher-view-exam')
 
 @login_required(login_url='adminlogin')
@@ -118,6 +122,17 @@ def teacher_add_question_view(request):
         return HttpResponseRedirect('/teacher/teacher-view-question')
     return render(request,'teacher/teacher_add_question.html',{'questionForm':questionForm})
 
+@login_required(login_url='teacherlogin')
+@user_passes_test(is_teacher)
+def teacher_import_question_view(request):
+    bankForm=QFORM.QuestionBankForm()
+    result=None
+    if request.method=='POST':
+        bankForm=QFORM.QuestionBankForm(request.POST,request.FILES)
+        if bankForm.is_valid():
+            result=import_question_bank(bankForm.cleaned_data['file'],bankForm.cleaned_data['courseID'])
+    return render(request,'teacher/teacher_import_question.html',{'bankForm':bankForm,'result':result})
+
 @login_required(login_url='teacherlogin')
 @user_passes_test(is_teacher)
 def teacher_view_question_view(request):
@@ -140,8 +155,15 @@ def remove_question_view(request,pk):
 @login_required(login_url='teacherlogin')
 @user_passes_test(is_teacher)
 def teacher_view_student_marks_view(request):
-    students = SMODEL.Student.objects.all()  # Retrieve all students
-    return render(request, 'teacher/teacher_view_student_marks.html', {'students': students})
+    students = SMODEL.Student.objects.select_related('user').only('profile_pic', 'user__first_name', 'user__last_name')
+    page = keyset_page(request, students, PERSON_SORTS, PERSON_SEARCH_FIELDS)
+    return render(request, 'teacher/teacher_view_student_marks.html', {'students': page.items, 'page': page})
+
+
+@login_required(login_url='teacherlogin')
+@user_passes_test(is_teacher)
+def teacher_export_gradebook_view(request):
+    return gradebook_response(assignment_owner=request.user)
 
 
 @login_required(login_url='teacherlogin')